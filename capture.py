@@ -0,0 +1,76 @@
+# capture.py
+"""
+트래픽 캡처 파일 기록/읽기
+
+서버가 받은 모든 줄을 연결 ID, 타임스탬프와 함께 바이너리 파일에 남긴다.
+replay.py가 이 파일을 읽어 같은 트래픽을 다시 보낸다.
+
+파일 구조
+    MAGIC(8바이트) + 레코드 반복
+    레코드 = RECORD 헤더(kind u8, conn_id u32, ts f64, length u32) + payload(utf-8)
+
+kind: OPEN(연결 시작), LINE(수신한 한 줄), CLOSE(연결 종료)
+ts  : 캡처 시작 시점 기준 경과 초 (monotonic)
+"""
+
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple
+
+MAGIC = b"NPCAP01\n"
+RECORD = struct.Struct("<BIdI")
+BUFFER_SIZE = 1 << 20  # 파일 쓰기 버퍼 (1MiB)
+
+KIND_OPEN = 0
+KIND_LINE = 1
+KIND_CLOSE = 2
+
+
+class Record(NamedTuple):
+    kind: int
+    conn_id: int
+    ts: float
+    payload: str
+
+
+class CaptureWriter:
+    """여러 연결 스레드가 동시에 호출해도 안전한 버퍼링 기록기"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: BinaryIO = open(path, "wb", buffering=BUFFER_SIZE)
+        self._file.write(MAGIC)
+        self._start = time.monotonic()
+        self.records = 0
+
+    def write(self, kind: int, conn_id: int, payload: str = "", ts: float | None = None):
+        data = payload.encode("utf-8")
+        if ts is None:
+            ts = time.monotonic()
+        header = RECORD.pack(kind, conn_id, ts - self._start, len(data))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(header)
+            self._file.write(data)
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_capture(f: BinaryIO) -> Iterator[Record]:
+    """캡처 파일 레코드를 순서대로 읽는다"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not an npchat capture file")
+    while True:
+        header = f.read(RECORD.size)
+        if len(header) < RECORD.size:
+            return
+        kind, conn_id, ts, length = RECORD.unpack(header)
+        payload = f.read(length).decode("utf-8")
+        yield Record(kind, conn_id, ts, payload)
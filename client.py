@@ -9,26 +9,91 @@ NP-Chat 프로토콜 클라이언트 예제
 /nick alice          -> 0|NICK|alice
 /create study        -> 0|CREATE_ROOM|study
 /join lobby          -> 0|JOIN|lobby
+/sub news            -> 0|SUB|news      (현재 방은 그대로 두고 news도 같이 받기)
+/unsub news          -> 0|UNSUB|news
+/switch news         -> (로컬) 이후 일반 입력을 1|ROOM_MSG|...|news 로 보냄
 /dm bob 안녕         -> 1|DM|bob|안녕
 /list                -> 2|LIST_USER
+/watch lobby         -> 2|WATCH_MEMBERS|lobby (멤버 목록 한 번 + 이후 변경만 받아 state["members"]에 유지)
+/unwatch lobby       -> 2|UNWATCH_MEMBERS|lobby
+/search 회의 자료     -> 2|SEARCH|회의 자료
 /quit                -> 0|QUIT
 
 서버에서 오는 메시지는 있는 그대로 한 줄씩 출력한다.
+
+접속하면 0|CAPS|SEQ로 방 메시지 번호를 받는다. 번호가 건너뛰면(서버가 느린 수신자에게 가는
+메시지를 버린 경우 등) 2|FETCH|방|from|to로 빠진 메시지를 받아 채우고, 이미 받은 번호는
+다시 출력하지 않는다. --no-seq로 끈다.
+
+헤드리스(봇) 모드
+-----------------
+--script 로 명령 스크립트(위 형식, 한 줄에 하나)를 주면 입력/출력 없이
+--conns 개의 연결이 각자 스크립트를 --rate(연결당 초당 명령 수)로 보낸다.
+응답을 기다리지 않고 파이프라인으로 보내며, 응답 줄(is_reply_line)이 오면
+명령별 지연을 기록한다. 스크립트의 {i}는 연결 번호로 바뀐다.
+
+    python client.py --script bots.txt --conns 2000 --rate 2
+    cat bots.txt | python client.py --script - --conns 100 --rate 0   # 0 = 최대 속도
+
+--socket-profile(sockopts.py)은 서버와 같은 형식으로 소켓 옵션과 recv 크기를 정한다.
 """
 
+import argparse
+import heapq
+import random
+import selectors
 import socket
 import threading
+import time
 import sys
+from collections import deque
+
+import sockopts
+from metrics import Histogram
 
 HOST = "127.0.0.1"
 PORT = 5004
-BUF_SIZE = 1024
+BUF_SIZE = 65536  # 한 번에 최대한 많이 읽어 소켓 버퍼가 차지 않게 한다
+SOCKET_PROFILE = sockopts.PROFILES["default"]  # main에서 --socket-profile로 덮어씀
+# 화면 출력 설정: 틱마다 한 번에 쓰고, 틱당 줄 수를 넘는 방 메시지는 "N개 더"로 접는다
+RENDER_INTERVAL = 0.05
+RENDER_MAX_LINES = 200
+RENDER_MIN_LINES = 20
+# 재접속: 지수 백오프 + full jitter (0 ~ min(CAP, BASE * 2^시도) 사이 임의 대기)
+RECONNECT_BASE = 0.5
+RECONNECT_CAP = 30.0
+RESUME_TIMEOUT = 10.0  # RESUME 응답 대기 시간
 ENCODING = "utf-8"
+# 서버가 선택 기능(CAPS)으로 줄 끝에 덧붙이는 key=value 필드: (기능, 키, 붙는 줄 종류)
+# 서버는 srv_ts 다음에 seq를 붙이므로 줄 끝에서부터 이 순서로 뗀다
+EXTRA_FIELDS = (
+    ("SEQ", "seq", ("ROOM_MSG",)),
+    ("SRV_TS", "srv_ts", ("ROOM_MSG", "DM")),
+)
+CLIENT_CAPS = "SEQ"  # 접속 때 요청하는 선택 기능
+SEQ_MAX_GAP = 500    # 한 번에 FETCH로 채우는 최대 번호 수 (서버 FETCH_MAX, 보관 한도 이하)
 # 여기서부터는 클라이언트가 프로토콜 문자열을 만들고, 서버 응답을 읽어 표시하는 로직이다.
 
-def format_server_line(line: str) -> str:
-    """서버 메시지를 보기 쉽게 변환 (알 수 없으면 그대로)"""
-    parts = line.split("|")
+def split_extra_fields(parts: list[str], caps: str | None) -> tuple[list[str], dict[str, str]]:
+    """
+    줄 끝에서 서버가 덧붙인 선택 기능 필드(srv_ts=... 등)만 떼어내 본문 필드와 분리.
+    켠 기능(caps, 콤마 구분)만, 종류마다 최대 한 개씩 떼므로 본문이 'seq=1'이어도 본문은 남는다.
+    """
+    extras: dict[str, str] = {}
+    enabled = caps.split(",") if caps else ()
+    for cap, key, kinds in EXTRA_FIELDS:
+        if cap not in enabled or parts[0] not in kinds or len(parts) < 2:
+            continue
+        name, sep, value = parts[-1].partition("=")
+        if sep and name == key:
+            extras[key] = value
+            parts = parts[:-1]
+    return parts, extras
+
+
+def format_server_line(line: str, caps: str | None = None) -> str:
+    """서버 메시지를 보기 쉽게 변환 (알 수 없으면 그대로, caps는 접속 때 요청한 선택 기능)"""
+    parts, _ = split_extra_fields(line.split("|"), caps)
     if not parts:
         return line
 
@@ -42,12 +107,28 @@ def format_server_line(line: str) -> str:
         if parts[0] == "SYSTEM" and len(parts) >= 3:
             level, msg = parts[1], "|".join(parts[2:])
             return f"[SYSTEM/{level}] {msg}"
+        if parts[0] == "RESUME_OK" and len(parts) >= 3:
+            nick, room = parts[1], parts[2] or "(방 없음)"
+            missed = f", 놓친 메시지 {parts[3]}개" if len(parts) >= 4 else ""
+            return f"[RESUME] {nick} / {room}{missed}"
         if parts[0] == "USER_LIST" and len(parts) >= 3:
             room, users = parts[1], parts[2]
             return f"[USER_LIST {room}] {users or '(empty)'}"
+        if parts[0] == "MEMBERS" and len(parts) >= 5:
+            room, owner, users = parts[1], parts[3], parts[4]
+            return f"[MEMBERS {room}] 방장 {owner or '(없음)'} / {users or '(empty)'}"
+        if parts[0] in MEMBER_EVENTS and len(parts) >= 4:
+            return f"[MEMBERS {parts[1]}] {MEMBER_EVENTS[parts[0]]} {parts[3] or '(없음)'}"
         if parts[0] == "USER_LIST_ALL" and len(parts) >= 2:
             users = parts[1]
             return f"[USER_LIST_ALL] {users or '(empty)'}"
+        if parts[0] == "SEARCH_RESULT" and len(parts) >= 5:
+            room, ts, sender, msg = parts[1], float(parts[2]), parts[3], "|".join(parts[4:])
+            return f"[SEARCH {room} {time.strftime('%m-%d %H:%M:%S', time.localtime(ts))}] {sender}: {msg}"
+        if parts[0] == "FETCH_END" and len(parts) >= 5:
+            return f"[FETCH {parts[1]}] {parts[2]}~{parts[3]}번 중 {parts[4]}개 다시 받음"
+        if parts[0] == "SEARCH_END" and len(parts) >= 3:
+            return f"[SEARCH {parts[1]}] {parts[2]}건"
     except Exception:
         # 파싱 실패 시 원문 반환
         return line
@@ -55,64 +136,440 @@ def format_server_line(line: str) -> str:
     return line
 
 
-def update_state_from_server(line: str, state: dict):
-    """서버 응답을 보고 닉/방 상태 업데이트"""
+# 멤버 목록 구독 중 오는 변경 줄 -> 표시 문구
+MEMBER_EVENTS = {"MEMBER_ADD": "입장", "MEMBER_DEL": "퇴장", "OWNER_CHANGE": "방장"}
+
+# 내가 보낸 명령에 대한 직접 응답으로 오는 줄의 첫 필드
+REPLY_PREFIXES = (
+    "ERROR", "SUCCESS", "CAPS_OK", "NICK_OK", "RESUME_OK", "CREATE_ROOM_OK", "JOIN_OK",
+    "LEAVE_OK", "DELETE_ROOM_OK", "SUB_OK", "UNSUB_OK", "USER_LIST", "USER_LIST_ALL", "PROFILE_OK", "TRACE_OK",
+    "STATS_END", "FILTER_RELOAD_OK", "SEARCH_END", "MEMBERS", "UNWATCH_OK", "FETCH_END",
+)
+
+
+def is_reply_line(line: str, nick: str | None) -> bool:
+    """
+    서버 줄이 내 명령 하나에 대한 응답(명령당 정확히 한 줄)인지 판단.
+
+    방 메시지는 보낸 사람에게도 브로드캐스트되므로 내 닉의 ROOM_MSG를 응답으로 본다.
+    다른 사람의 메시지/시스템 알림, STATS 본문 줄 등은 응답이 아니다.
+    """
+    head, _, rest = line.partition("|")
+    if head in REPLY_PREFIXES:
+        return True
+    if head == "ROOM_MSG":
+        parts = rest.split("|")
+        return len(parts) >= 2 and parts[1] == nick
+    return line == "SYSTEM|INFO|Bye"
+
+
+def update_state_from_server(line: str, state: dict) -> bool:
+    """서버 응답을 보고 닉/방 상태 업데이트. 출력할 줄이면 True (이미 받은 번호의 방 메시지는 False)"""
+    with state["lock"]:
+        show = _apply_server_line(line, state)
+    _send_outbox(state)
+    return show
+
+
+def update_state_batch(lines: list[str], state: dict) -> list[str]:
+    """여러 줄을 락 한 번으로 반영 (수신 스레드용), 출력할 줄만 반환"""
+    with state["lock"]:
+        shown = [line for line in lines if _apply_server_line(line, state)]
+    _send_outbox(state)
+    return shown
+
+
+def _send_outbox(state: dict):
+    # 상태 반영 중 서버에 다시 보내야 할 줄(멤버 목록 다시 맞추기)은 락 밖에서 전송
+    with state["lock"]:
+        lines, state["outbox"] = state["outbox"], []
+        sock = state["sock"]
+    if lines and sock is not None:
+        try:
+            sock.sendall("".join(line + "\n" for line in lines).encode(ENCODING))
+        except OSError:
+            pass  # 끊긴 연결은 재접속 후 resume_session이 구독을 다시 보낸다
+
+
+def _apply_server_line(line: str, state: dict) -> bool:
+    # state["lock"]을 잡은 상태에서 호출, 화면에 출력할 줄이면 True
     parts = line.split("|")
     if not parts:
-        return
+        return True
 
+    if parts[0] == "ROOM_MSG" and len(parts) >= 4:
+        parts, extras = split_extra_fields(parts, state["caps"])
+        if "seq" in extras:
+            try:
+                seq = int(extras["seq"])
+            except ValueError:
+                return True  # 번호가 깨진 줄은 번호 확인 없이 출력
+            return _track_seq(state, parts[1], seq)
+    elif parts[0] == "NICK_OK" and len(parts) >= 2:
+        state["nick"] = parts[1]
+    elif parts[0] == "RESUME_TOKEN" and len(parts) >= 2:
+        # 재접속 시 닉/방 복구용 토큰 보관
+        state["resume_token"] = parts[1]
+    elif parts[0] == "RESUME_OK" and len(parts) >= 3:
+        # 서버는 현재 방만 복구한다 (구독은 resume_session이 다시 보낸다)
+        state["nick"] = parts[1]
+        state["room"] = parts[2] or None
+        state["subs"] = []
+        state["active"] = None
+        # 놓친 메시지가 있으면 번호 기록을 남겨 다음 메시지 때 빈 번호를 FETCH로 채운다
+        kept = state["seq"].get(state["room"]) if len(parts) >= 4 and parts[3] not in ("", "0") else None
+        state["seq"] = {state["room"]: kept} if kept else {}
+    elif parts[0] in ("CREATE_ROOM_OK", "JOIN_OK") and len(parts) >= 2:
+        if parts[1] in state["subs"]:
+            state["subs"].remove(parts[1])
+        if parts[1] != state["room"]:
+            state["seq"].pop(parts[1], None)
+        state["room"] = parts[1]
+        state["active"] = None
+    elif parts[0] == "SUB_OK" and len(parts) >= 2:
+        room = parts[1]
+        if room != state["room"] and room not in state["subs"]:
+            state["seq"].pop(room, None)
+        if state["room"] is None:
+            state["room"] = room
+        elif room != state["room"] and room not in state["subs"]:
+            state["subs"].append(room)
+    elif parts[0] in ("DELETE_ROOM_OK", "LEAVE_OK", "UNSUB_OK"):
+        _drop_room(state, parts[1] if len(parts) >= 2 else state["room"])
+    elif parts[0] == "SYSTEM" and len(parts) >= 3:
+        # 방이 삭제되어 내가 밖으로 나온 경우만 room 상태 초기화.
+        # 다른 사람의 입장/퇴장 알림("X 님이 방을 나갔습니다.", 큰 방의 "N명 입장, M명 퇴장 (...)")은
+        # 내 상태와 무관하다
+        if "방이 사라져 나갔습니다" in parts[2]:
+            _drop_room(state, state["room"])
+    elif parts[0] == "MEMBERS" and len(parts) >= 5:
+        # 멤버 목록 전체 (구독 직후 또는 다시 맞춘 결과)
+        state["members"][parts[1]] = {
+            "version": int(parts[2]), "owner": parts[3],
+            "nicks": dict.fromkeys(n for n in parts[4].split(",") if n), "resync": False,
+        }
+    elif parts[0] in MEMBER_EVENTS and len(parts) >= 4:
+        _apply_member_event(state, parts[0], parts[1], int(parts[2]), parts[3])
+    elif parts[0] in ("WATCH_END", "UNWATCH_OK") and len(parts) >= 2:
+        state["members"].pop(parts[1], None)
+    elif parts[0] == "FETCH_END" and len(parts) >= 5:
+        # 요청 구간에서 끝내 안 온 번호는 보관 한도를 넘어 밀려난 것 -> 더 기다리지 않는다
+        track = state["seq"].get(parts[1])
+        if track is not None:
+            first, last = int(parts[2]), int(parts[3])
+            track["missing"] = {n for n in track["missing"] if not first <= n <= last}
+    elif parts[0] == "ERROR":
+        # 오류가 나더라도 상태는 그대로 둔다
+        pass
+    elif parts[0] == "USER_LIST_ALL":
+        # 전체 사용자 목록은 상태에 영향 없음
+        pass
+    return True
+
+
+def _track_seq(state: dict, room: str, seq: int) -> bool:
+    """
+    방 메시지 번호 확인. 건너뛴 번호는 FETCH로 요청해 두고, 그 번호가 (FETCH로든 늦게 도착한
+    실시간 전달로든) 처음 오면 출력, 이미 받은 번호면 출력하지 않는다.
+    """
+    track = state["seq"].get(room)
+    if track is None:
+        state["seq"][room] = {"last": seq, "missing": set()}
+        return True
+    last = track["last"]
+    if seq > last:
+        if seq > last + 1:
+            first = max(last + 1, seq - SEQ_MAX_GAP)
+            track["missing"].update(range(first, seq))
+            state["outbox"].append(f"2|FETCH|{room}|{first}|{seq - 1}")
+        track["last"] = seq
+        return True
+    if seq in track["missing"]:
+        track["missing"].discard(seq)
+        return True
+    return False
+
+
+def _apply_member_event(state: dict, kind: str, room: str, version: int, value: str):
+    """
+    멤버 변경 한 줄 반영. 같은 묶음의 줄은 같은 version이고 다음 묶음은 +1이므로
+    그보다 크게 건너뛰면 중간 묶음을 놓친 것 -> 전체 목록을 다시 요청하고 올 때까지 변경은 무시
+    """
+    view = state["members"].get(room)
+    if view is None or view["resync"] or version < view["version"]:
+        return
+    if version > view["version"] + 1:
+        view["resync"] = True
+        state["outbox"].append(f"2|WATCH_MEMBERS|{room}")
+        return
+    view["version"] = version
+    if kind == "OWNER_CHANGE":
+        view["owner"] = value
+        return
+    for nick in value.split(","):
+        if kind == "MEMBER_ADD":
+            view["nicks"][nick] = None
+        else:
+            view["nicks"].pop(nick, None)
+
+
+def _drop_room(state: dict, room: str | None):
+    # 서버와 같은 규칙: 현재 방이 빠지면 가장 먼저 구독한 방이 현재 방이 된다
+    state["seq"].pop(room, None)  # 방이 지워졌다 다시 생기면 번호가 1부터 다시 시작
+    if room == state["room"]:
+        state["room"] = state["subs"].pop(0) if state["subs"] else None
+    elif room in state["subs"]:
+        state["subs"].remove(room)
+    if state["active"] == room:
+        state["active"] = None
+
+
+def switch_room(state: dict, room: str) -> str:
+    """일반 입력을 보낼 방을 로컬에서 바꾼다 (현재 방이나 구독 중인 방만). 안내 문구 반환"""
     with state["lock"]:
-        if parts[0] == "NICK_OK" and len(parts) >= 2:
-            state["nick"] = parts[1]
-        elif parts[0] in ("CREATE_ROOM_OK", "JOIN_OK") and len(parts) >= 2:
-            state["room"] = parts[1]
-        elif parts[0] == "DELETE_ROOM_OK":
-            state["room"] = None
-        elif parts[0] == "LEAVE_OK":
-            state["room"] = None
-        elif parts[0] == "SYSTEM" and len(parts) >= 3:
-            # 방에서 나갔다면 room 상태 초기화
-            if "나갔습니다" in parts[2]:
-                state["room"] = None
-        elif parts[0] == "ERROR":
-            # 오류가 나더라도 상태는 그대로 둔다
-            pass
-        elif parts[0] == "USER_LIST_ALL":
-            # 전체 사용자 목록은 상태에 영향 없음
+        if room and room not in state["subs"] and room != state["room"]:
+            return f"구독 중인 방이 아닙니다: {room} (/sub {room} 먼저)"
+        state["active"] = room if room and room != state["room"] else None
+        joined = [r for r in [state["room"], *state["subs"]] if r]
+    return f"보낼 방: {room or state['room']} (받는 방: {', '.join(joined) or '없음'})"
+
+
+class Renderer:
+    """
+    서버 줄을 모아 두었다가 틱(RENDER_INTERVAL)마다 한 번의 write로 출력하는 스레드.
+
+    수신 스레드는 push만 하고 바로 다음 recv로 돌아가므로 화면 출력이 느려도
+    소켓을 네트워크 속도로 비울 수 있다. 한 틱에 쌓인 줄이 한도를 넘으면
+    방 메시지는 최신 것만 남기고 나머지는 "N개 더" 한 줄로 접는다.
+    (오류/응답/시스템 줄은 접지 않는다)
+    """
+
+    def __init__(self, out=None, interval: float = RENDER_INTERVAL, max_lines: int = RENDER_MAX_LINES,
+                 caps: str | None = None):
+        self.out = out or sys.stdout
+        self.caps = caps  # 줄 끝 선택 기능 필드를 뗄 때 쓰는, 접속 때 요청한 기능
+        self.interval = interval
+        self.max_lines = max_lines
+        self.budget = max_lines  # 터미널이 밀리면 줄이고, 따라오면 다시 늘린다
+        self.collapsed = 0
+        self._pending: list[tuple[bool, str]] = []  # (서버 줄 여부, 텍스트)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="render", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def push(self, lines: list[str]):
+        with self._cond:
+            self._pending.extend((True, line) for line in lines)
+            self._cond.notify()
+
+    def notice(self, text: str):
+        """클라이언트 자체 안내 문구 (형식 변환 없이 출력)"""
+        with self._cond:
+            self._pending.append((False, text))
+            self._cond.notify()
+
+    def close(self):
+        """남은 줄을 모두 출력하고 스레드 종료"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        last = 0.0
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._closed:
+                    # 출력 빈도 제한: 틱 사이에 들어온 줄은 다음 틱에 같이 쓴다
+                    delay = last + self.interval - time.monotonic()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            if batch:
+                started = time.monotonic()
+                self._write(batch)
+                last = time.monotonic()
+                self._adjust_budget(last - started)
+            if closed:
+                with self._cond:
+                    if not self._pending:
+                        return
+
+    def _adjust_budget(self, write_time: float):
+        # 쓰기가 한 틱보다 오래 걸렸으면 터미널이 못 따라오는 것
+        if write_time > self.interval:
+            self.budget = max(RENDER_MIN_LINES, self.budget // 2)
+        elif self.budget < self.max_lines:
+            self.budget = min(self.max_lines, self.budget * 2)
+
+    def _write(self, batch: list[tuple[bool, str]]):
+        drop = 0
+        if len(batch) > self.budget:
+            chat = sum(1 for is_server, line in batch if is_server and line.startswith("ROOM_MSG|"))
+            drop = min(chat, len(batch) - self.budget)
+        out = []
+        if drop:
+            self.collapsed += drop
+            out.append(f"[CLIENT] ... 메시지 {drop}개 더 (출력이 밀려 생략)\n")
+        skipped = 0
+        for is_server, line in batch:
+            if is_server:
+                if skipped < drop and line.startswith("ROOM_MSG|"):
+                    # 오래된 방 메시지부터 생략
+                    skipped += 1
+                    continue
+                out.append(f"[SERVER] {format_server_line(line, self.caps)}\n")
+            else:
+                out.append(line + "\n")
+        try:
+            self.out.write("".join(out))
+            self.out.flush()
+        except (OSError, ValueError):
             pass
 
 
-def recv_loop(sock: socket.socket, state: dict):
-    """서버에서 오는 메시지 수신 스레드"""
-    buffer = ""
+def split_lines(buffer: bytes) -> tuple[list[str], bytes]:
+    """완성된 줄 목록과 남은 조각 (줄 단위로 자른 뒤 디코딩하므로 한글이 recv 경계에서 잘려도 안전)"""
+    *chunks, rest = buffer.split(b"\n")
+    return [line for line in (c.decode(ENCODING, "replace").strip() for c in chunks) if line], rest
+
+
+def recv_loop(sock: socket.socket, state: dict, renderer: Renderer, buffer: bytes = b""):
+    """
+    서버에서 오는 메시지 수신 (연결이 끊기면 반환)
+
+    받을 수 있는 만큼 읽어 완성된 줄을 모두 꺼낸 뒤, 상태 반영은 락 한 번으로,
+    출력은 Renderer에 넘겨 수신 스레드가 화면 출력 때문에 멈추지 않게 한다.
+    """
     try:
         while True:
             data = sock.recv(BUF_SIZE)
             if not data:
-                print("서버와 연결이 끊어졌습니다.")
+                if not state.get("quitting"):
+                    renderer.notice("서버와 연결이 끊어졌습니다.")
                 break
-            buffer += data.decode(ENCODING)
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                line = line.strip()
-                if line:
-                    update_state_from_server(line, state)
-                    print(f"[SERVER] {format_server_line(line)}")
+            buffer += data
+            if b"\n" not in data:
+                continue
+            lines, buffer = split_lines(buffer)
+            if lines:
+                renderer.push(update_state_batch(lines, state))
     except Exception as e:
-        print("수신 스레드 에러:", e)
+        if not state.get("quitting"):
+            renderer.notice(f"수신 스레드 에러: {e}")
     finally:
         try:
             sock.close()
         except Exception:
             pass
-        print("수신 스레드 종료")
 
 
-def build_protocol_line(cmd: str) -> str | None:
+def backoff_delay(attempt: int) -> float:
+    """full jitter: 모든 클라이언트가 같은 순간에 다시 몰리지 않도록 구간 전체에서 임의로 고른다"""
+    return random.uniform(0, min(RECONNECT_CAP, RECONNECT_BASE * (2 ** min(attempt, 16))))
+
+
+def resume_session(sock: socket.socket, state: dict, renderer: Renderer) -> bytes:
+    """
+    새 연결에서 RESUME 한 번으로 닉/방 복구. 토큰이 없거나 거절되면 NICK/JOIN을 다시 보낸다.
+
+    RESUME 응답까지 받은 줄은 처리하고, 그 뒤에 이미 받은 조각을 반환한다 (recv_loop로 이어감).
+    """
+    with state["lock"]:
+        token, nick, room = state["resume_token"], state["nick"], state["room"]
+        subs, active = list(state["subs"]), state["active"]
+        watched = list(state["members"])
+        state["subs"] = []
+        state["members"] = {}
+    # 끊기기 전 구독(방/멤버 목록)은 복구(또는 다시 입장) 뒤에 다시 보낸다
+    resubscribe = [f"0|SUB|{r}" for r in subs] + [f"2|WATCH_MEMBERS|{r}" for r in watched]
+    # 선택 기능은 연결마다 새로 요청 (RESUME보다 먼저 보내 복구 직후 메시지부터 번호가 붙게)
+    caps = f"0|CAPS|{state['caps']}\n" if state["caps"] else ""
+    buffer = b""
+    if token is not None:
+        sock.sendall(f"{caps}0|RESUME|{token}\n".encode(ENCODING))
+        sock.settimeout(RESUME_TIMEOUT)
+        reply = None
+        while reply is None:
+            data = sock.recv(BUF_SIZE)
+            if not data:
+                raise ConnectionError("closed during resume")
+            lines, buffer = split_lines(buffer + data)
+            renderer.push(update_state_batch(lines, state))
+            reply = next((line for line in lines if is_reply_line(line, nick) and not line.startswith("CAPS_OK")), None)
+        sock.settimeout(None)
+        if reply.startswith("RESUME_OK|"):
+            if resubscribe:
+                sock.sendall("".join(line + "\n" for line in resubscribe).encode(ENCODING))
+                with state["lock"]:
+                    state["active"] = active
+            return buffer
+    # 재접속 토큰을 못 쓰면 예전처럼 닉/방을 다시 설정
+    fallback = [caps.strip()] if caps and token is None else []
+    if nick:
+        fallback.append(f"0|NICK|{nick}")
+        if room:
+            fallback.append(f"0|JOIN|{room}")
+        fallback += resubscribe
+    if fallback:
+        sock.sendall("".join(line + "\n" for line in fallback).encode(ENCODING))
+    return buffer
+
+
+def reconnect(state: dict, renderer: Renderer, host: str, port: int):
+    """백오프하며 다시 접속하고 세션 복구. (소켓, 남은 수신 조각) 또는 그만둘 때 (None, b"")"""
+    attempt = 0
+    while not state.get("quitting"):
+        delay = backoff_delay(attempt)
+        attempt += 1
+        renderer.notice(f"{delay:.1f}초 뒤 재접속 시도 ({attempt}번째)")
+        time.sleep(delay)
+        sock = None
+        try:
+            sock = sockopts.connect((host, port), SOCKET_PROFILE, timeout=RESUME_TIMEOUT)
+            sock.settimeout(None)
+            buffer = resume_session(sock, state, renderer)
+        except OSError:
+            if sock is not None:
+                sock.close()
+            continue
+        renderer.notice(f"서버에 다시 접속했습니다: {host}:{port}")
+        return sock, buffer
+    return None, b""
+
+
+def session_loop(state: dict, renderer: Renderer, host: str, port: int, auto_reconnect: bool):
+    """수신 스레드: 연결이 끊기면 (QUIT이 아니라면) 재접속해서 계속 받는다"""
+    buffer = b""
+    while True:
+        with state["lock"]:
+            sock = state["sock"]
+        recv_loop(sock, state, renderer, buffer)
+        if state.get("quitting") or not auto_reconnect:
+            break
+        with state["lock"]:
+            state["sock"] = None
+        sock, buffer = reconnect(state, renderer, host, port)
+        if sock is None:
+            break
+        with state["lock"]:
+            state["sock"] = sock
+    renderer.notice("수신 스레드 종료")
+
+
+def build_protocol_line(cmd: str, active_room: str | None = None) -> str | None:
     """
     콘솔에 입력한 문자열을 프로토콜 한 줄로 변환.
 
     /로 시작하는 건 명령어, 아니면 그냥 ROOM_MSG로 처리한다.
+    active_room은 /switch로 고른, 현재 방이 아닌 구독 방 (None이면 현재 방).
     """
     cmd = cmd.strip()
     if not cmd:
@@ -144,6 +601,12 @@ def build_protocol_line(cmd: str) -> str | None:
                 return None
             return f"0|JOIN|{tail}"
 
+        if op in ("/sub", "/unsub"):
+            if not tail:
+                print(f"사용법: {op} <방이름>")
+                return None
+            return f"0|{op[1:].upper()}|{tail}"
+
         if op == "/delete":
             return "0|DELETE_ROOM"
 
@@ -168,20 +631,34 @@ def build_protocol_line(cmd: str) -> str | None:
         if op == "/listall":
             return f"2|LIST_ALL{('|' + tail) if tail else ''}"
 
+        if op in ("/watch", "/unwatch"):
+            if not tail:
+                print(f"사용법: {op} <방이름>")
+                return None
+            return f"2|{op[1:].upper()}_MEMBERS|{tail}"
+
+        if op == "/search":
+            if not tail:
+                print("사용법: /search <검색어> (from:닉 으로 보낸 사람 제한)")
+                return None
+            return f"2|SEARCH|{tail}"
+
         print("알 수 없는 명령어 혹은 형식 오류입니다.")
-        print("사용 가능 명령: /nick, /create, /join, /dm, /list, /listall, /leave, /delete, /quit")
+        print("사용 가능 명령: /nick, /create, /join, /sub, /unsub, /switch, /dm, /list, /watch, /unwatch, /listall, /search, /leave, /delete, /quit")
         return None
 
-    # 그냥 일반 텍스트 입력이면 방 메시지로 취급
+    # 그냥 일반 텍스트 입력이면 방 메시지로 취급 (/switch로 고른 방이 있으면 그 방으로)
+    if active_room:
+        return f"1|ROOM_MSG|{cmd}|{active_room}"
     return f"1|ROOM_MSG|{cmd}"
-    
+
 
 
 def build_prompt(state: dict) -> str:
     """현재 닉/방 상태를 프롬프트에 표시"""
     with state["lock"]:
         nick = state.get("nick")
-        room = state.get("room")
+        room = state.get("active") or state.get("room")
     # 닉이나 방이 설정되지 않았다면 표시하지 않고 점진적으로 채운다.
     if nick and room:
         return f"[NICK_{nick}/ROOM_{room}] > "
@@ -190,22 +667,293 @@ def build_prompt(state: dict) -> str:
     return "> "
 
 
-def main():
+# ---------------------------------------------------------------
+# 헤드리스(봇) 모드
+# ---------------------------------------------------------------
+
+BOT_DRAIN_TIMEOUT = 5.0  # 스크립트를 다 보낸 뒤 남은 응답을 기다리는 최대 시간 (초)
+
+
+def load_script(path: str) -> list[str]:
+    """스크립트 파일('-'면 stdin)을 읽어 프로토콜 줄 템플릿 목록으로 변환"""
+    if path == "-":
+        raw = sys.stdin.read().splitlines()
+    else:
+        with open(path, encoding=ENCODING) as f:
+            raw = f.read().splitlines()
+    script = []
+    for text in raw:
+        if not text.strip() or text.lstrip().startswith("#"):
+            continue
+        # {i}는 그대로 두고 변환만 한 번 해 둔다 (잘못된 줄은 여기서 한 번만 안내)
+        line = build_protocol_line(text)
+        if line is not None:
+            script.append(line)
+    return script
+
+
+def command_kind(line: str) -> str:
+    return "|".join(line.split("|", 2)[:2])
+
+
+class BotConn:
+    """봇 연결 하나: 보낼 버퍼, 받은 버퍼, 응답 대기 중인 명령 FIFO"""
+
+    def __init__(self, index: int, sock: socket.socket):
+        self.index = index
+        self.sock = sock
+        self.nick: str | None = None
+        self.inbuf = b""
+        self.outbuf = bytearray()
+        self.pending: deque[tuple[str, float]] = deque()  # (명령 종류, 보낸 시각)
+        self.next_cmd = 0
+        self.sent_all = False
+        self.closed = False
+
+
+class BotPool:
+    """
+    한 프로세스에서 여러 봇 연결을 selector 하나로 돌린다.
+
+    on_line(conn, line): 서버 줄마다 호출
+    on_reply(conn, kind, latency, line): 명령 응답이 짝지어질 때 호출 (latency는 초)
+    """
+
+    def __init__(self, host: str, port: int, script: list[str], rate: float, loops: int = 1,
+                 on_line=None, on_reply=None, profile: sockopts.SocketProfile | None = None):
+        self.host = host
+        self.port = port
+        self.script = script
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.total_cmds = len(script) * loops
+        self.on_line = on_line
+        self.on_reply = on_reply
+        # 프로파일을 주지 않으면 지연 측정용으로 Nagle만 끈다
+        self.profile = profile or sockopts.PROFILES["default"]._replace(nodelay=True)
+        self.recv_size = self.profile.recv_size or BUF_SIZE
+        self.sel = selectors.DefaultSelector()
+        self.conns: list[BotConn] = []
+        self.schedule: list[tuple[float, int]] = []  # (보낼 시각, 연결 번호) 힙
+        self.latency: dict[str, Histogram] = {}
+        self.sent = 0
+        self.replies = 0
+        self.errors = 0
+
+    def connect(self, count: int, ramp: float = 0.0):
+        """count개 연결 (ramp초에 걸쳐 나눠서), 첫 명령 시각은 간격 안에서 흩뿌린다"""
+        started = time.monotonic()
+        for index in range(count):
+            if ramp > 0:
+                delay = started + ramp * index / count - time.monotonic()
+                if delay > 0:
+                    self.poll(delay)
+            sock = sockopts.connect((self.host, self.port), self.profile)
+            sock.setblocking(False)
+            conn = BotConn(index, sock)
+            self.conns.append(conn)
+            self.sel.register(sock, selectors.EVENT_READ, conn)
+            first = time.monotonic() + random.random() * self.interval
+            heapq.heappush(self.schedule, (first, index))
+
+    def run(self) -> float:
+        """스크립트를 모두 보내고 응답을 기다린 뒤 걸린 시간(초) 반환"""
+        started = time.monotonic()
+        while self.schedule:
+            now = time.monotonic()
+            while self.schedule and self.schedule[0][0] <= now:
+                _, index = heapq.heappop(self.schedule)
+                self._send_next(self.conns[index], now)
+            timeout = max(0.0, self.schedule[0][0] - time.monotonic()) if self.schedule else 0.0
+            self.poll(min(timeout, 0.1))
+
+        deadline = time.monotonic() + BOT_DRAIN_TIMEOUT
+        while self.outstanding() and time.monotonic() < deadline:
+            self.poll(0.1)
+        elapsed = time.monotonic() - started
+        for conn in self.conns:
+            self._close(conn)
+        return elapsed
+
+    def _send_next(self, conn: BotConn, now: float):
+        if conn.closed:
+            return
+        # 최대 속도면 남은 명령을 한 번에 버퍼에 넣는다
+        count = 1 if self.interval else self.total_cmds - conn.next_cmd
+        for _ in range(count):
+            line = self.script[conn.next_cmd % len(self.script)].replace("{i}", str(conn.index))
+            conn.next_cmd += 1
+            conn.outbuf += (line + "\n").encode(ENCODING)
+            conn.pending.append((command_kind(line), time.perf_counter()))
+            self.sent += 1
+        self._flush(conn)
+        if conn.next_cmd < self.total_cmds:
+            heapq.heappush(self.schedule, (now + self.interval, conn.index))
+        else:
+            conn.sent_all = True
+
+    def _flush(self, conn: BotConn):
+        try:
+            n = conn.sock.send(conn.outbuf)
+            del conn.outbuf[:n]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._close(conn)
+            return
+        # 못 보낸 게 남았을 때만 쓰기 이벤트를 기다린다
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outbuf else 0)
+        self.sel.modify(conn.sock, events, conn)
+
+    def poll(self, timeout: float):
+        for key, mask in self.sel.select(timeout):
+            conn: BotConn = key.data
+            if mask & selectors.EVENT_WRITE:
+                self._flush(conn)
+            if mask & selectors.EVENT_READ and not conn.closed:
+                self._read(conn)
+
+    def _read(self, conn: BotConn):
+        try:
+            data = conn.sock.recv(self.recv_size)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+        conn.inbuf += data
+        if b"\n" not in data:
+            return
+        *chunks, conn.inbuf = conn.inbuf.split(b"\n")
+        for chunk in chunks:
+            line = chunk.decode(ENCODING, "replace").strip()
+            if line:
+                self._on_line(conn, line)
+
+    def _on_line(self, conn: BotConn, line: str):
+        if line.startswith(("NICK_OK|", "RESUME_OK|")):
+            conn.nick = line.split("|")[1]
+        if self.on_line is not None:
+            self.on_line(conn, line)
+        if not conn.pending or not is_reply_line(line, conn.nick):
+            return
+        kind, sent_at = conn.pending.popleft()
+        latency = time.perf_counter() - sent_at
+        self.replies += 1
+        if line.startswith("ERROR|"):
+            self.errors += 1
+        hist = self.latency.get(kind)
+        if hist is None:
+            hist = self.latency[kind] = Histogram()
+        hist.record(latency)
+        if self.on_reply is not None:
+            self.on_reply(conn, kind, latency, line)
+
+    def _close(self, conn: BotConn):
+        if conn.closed:
+            return
+        conn.closed = True
+        conn.pending.clear()
+        try:
+            self.sel.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+
+    def outstanding(self) -> int:
+        return sum(len(c.pending) for c in self.conns if not c.closed)
+
+
+def run_headless(args):
+    """--script 모드: 봇 풀을 돌리고 명령별 지연 요약 출력"""
+    script = load_script(args.script)
+    if not script:
+        print("보낼 명령이 없습니다.")
+        sys.exit(1)
+
+    log = open(args.latency_log, "w", encoding=ENCODING) if args.latency_log else None
+
+    def on_reply(conn, kind, latency, line):
+        log.write(f"{conn.index}\t{kind}\t{latency * 1e6:.0f}\n")
+
+    pool = BotPool(args.host, args.port, script, args.rate, args.loops, on_reply=on_reply if log else None,
+                   profile=args.socket_profile)
+    try:
+        pool.connect(args.conns, args.ramp)
+        print(f"{args.conns}개 연결, 연결당 명령 {pool.total_cmds}개 전송 시작")
+        elapsed = pool.run()
+    except KeyboardInterrupt:
+        elapsed = 0.0
+        print("\n사용자 종료")
+    finally:
+        if log is not None:
+            log.close()
+
+    rate = pool.replies / elapsed if elapsed else 0.0
+    print(f"sent={pool.sent} replies={pool.replies} errors={pool.errors} "
+          f"elapsed={elapsed:.2f}s replies/s={rate:.0f}")
+    for kind in sorted(pool.latency):
+        print(f"{kind:18s} {pool.latency[kind].summary()}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NP-Chat 클라이언트")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--script", default=None, help="헤드리스 모드: 명령 스크립트 파일 ('-'면 stdin)")
+    parser.add_argument("--conns", type=int, default=1, help="헤드리스 모드 연결 수")
+    parser.add_argument("--rate", type=float, default=1.0, help="연결당 초당 명령 수 (0이면 최대 속도)")
+    parser.add_argument("--loops", type=int, default=1, help="스크립트 반복 횟수")
+    parser.add_argument("--ramp", type=float, default=0.0, help="연결을 이 시간(초)에 걸쳐 나눠 맺음")
+    parser.add_argument("--latency-log", default=None, help="응답마다 '연결\t명령\t지연us' 기록 파일")
+    parser.add_argument("--no-reconnect", dest="reconnect", action="store_false",
+                        help="연결이 끊겨도 자동 재접속하지 않음")
+    parser.add_argument("--no-seq", dest="seq", action="store_false",
+                        help="방 메시지 번호(SEQ)를 받지 않음 (빠진 메시지 채우기 끔)")
+    parser.add_argument("--socket-profile", default="default",
+                        help=f"소켓 옵션 프로파일 ({', '.join(sockopts.PROFILES)}) 뒤에 ,key=value로 덮어쓰기")
+    args = parser.parse_args(argv)
+    try:
+        args.socket_profile = sockopts.parse_profile(args.socket_profile)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
     """TCP 연결을 맺고 입력을 읽어 서버에 전송"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    global SOCKET_PROFILE, BUF_SIZE
+    args = parse_args(argv)
+    if args.script is not None:
+        run_headless(args)
+        return
+    SOCKET_PROFILE = args.socket_profile
+    BUF_SIZE = SOCKET_PROFILE.recv_size or BUF_SIZE
+
     try:
-        sock.connect((HOST, PORT))
+        sock = sockopts.connect((args.host, args.port), SOCKET_PROFILE)
     except Exception as e:
         print("서버 접속 실패:", e)
         sys.exit(1)
 
-    print(f"서버에 접속했습니다: {HOST}:{PORT}")
-    print("명령 예시: /nick 이름, /create 방이름(생성자만 /delete), /join 방이름, /leave, /dm 닉 메시지, /list, /listall, /quit")
-
-    # 상태: 서버 응답으로 채워지는 닉/방, 그리고 스레드 안전을 위한 락
-    state = {"nick": None, "room": None, "lock": threading.Lock()}
-
-    t = threading.Thread(target=recv_loop, args=(sock, state), daemon=True)
+    print(f"서버에 접속했습니다: {args.host}:{args.port}")
+    print("명령 예시: /nick 이름, /create 방이름(생성자만 /delete), /join 방이름, /sub 방이름, /switch 방이름, /leave, /dm 닉 메시지, /list, /listall, /search 검색어, /quit")
+
+    # 상태: 서버 응답으로 채워지는 닉/방, 현재 소켓(재접속 중이면 None), 그리고 스레드 안전을 위한 락
+    state = {
+        "nick": None, "room": None, "subs": [], "active": None, "resume_token": None,
+        "members": {}, "outbox": [], "seq": {}, "caps": CLIENT_CAPS if args.seq else None,
+        "sock": sock, "quitting": False, "lock": threading.Lock(),
+    }
+    if state["caps"]:
+        sock.sendall(f"0|CAPS|{state['caps']}\n".encode(ENCODING))
+
+    renderer = Renderer(caps=state["caps"])
+    renderer.start()
+    t = threading.Thread(
+        target=session_loop, args=(state, renderer, args.host, args.port, args.reconnect), daemon=True
+    )
     t.start()
 
     try:
@@ -215,27 +963,54 @@ def main():
             except EOFError:
                 break
 
-            line = build_protocol_line(cmd)
+            op, _, arg = cmd.strip().partition(" ")
+            if op.lower() == "/switch":
+                # 서버에 보내지 않는 로컬 명령
+                print(switch_room(state, arg.strip()))
+                continue
+
+            with state["lock"]:
+                active = state["active"]
+            line = build_protocol_line(cmd, active)
             if line is None:
                 continue
 
+            if line.startswith("0|QUIT"):
+                state["quitting"] = True
+            with state["lock"]:
+                sock = state["sock"]
+            if sock is None:
+                if state["quitting"] or not t.is_alive():
+                    break
+                print("재접속 중입니다. 잠시 후 다시 입력해 주세요.")
+                continue
+
             # '\n' 붙여서 전송 (프로토콜 한 줄)
             try:
                 sock.sendall((line + "\n").encode(ENCODING))
             except Exception as e:
+                # 끊긴 연결은 수신 스레드가 알아채고 재접속한다
                 print("전송 에러:", e)
-                break
+                if not args.reconnect:
+                    break
 
             if line.startswith("0|QUIT"):
+                # 서버의 Bye 응답이 출력될 때까지 잠깐 기다린다
+                t.join(timeout=1.0)
                 break
 
     except KeyboardInterrupt:
         print("\n사용자 종료")
     finally:
+        state["quitting"] = True
+        with state["lock"]:
+            sock = state["sock"]
         try:
-            sock.close()
+            if sock is not None:
+                sock.close()
         except Exception:
             pass
+        renderer.close()
         print("클라이언트 종료")
 
 
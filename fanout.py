@@ -0,0 +1,144 @@
+# fanout.py
+"""
+큰 방 브로드캐스트용 전달 워커 풀
+
+멤버가 많은 방의 메시지를 보낸 사람의 스레드가 끝까지 send 하면 그 사람의 다음 명령이
+팬아웃이 끝날 때까지 밀린다. submit()은 수신자마다 보낼 바이트를 만들어(이때 수신자별
+대기 바이트를 잡고, 한도를 넘은 수신자는 빠진다) 워커별로 나눠 큐에 넣고 바로 돌아오며,
+각 워커는 자기 몫만 보낸다.
+
+- 수신자는 conn_id % 워커 수로 항상 같은 워커에 배정되므로, 풀을 거치는 메시지끼리는
+  수신자별 순서가 유지된다. 직접 전송과 섞일 때의 순서는 prepare 쪽(서버는 수신자별 대기 큐에
+  submit 시점에 넣는다)이 정한다. in_flight()로 방의 작업이 남았는지 볼 수 있다.
+- 큐는 워커마다 max_queue개까지, 차 있으면 submit이 자리가 날 때까지 기다린다.
+- 완료 지연: submit 시각부터 마지막 워커가 자기 몫을 다 보낸 시각까지 (Histogram).
+  trace를 넘기면 그 시각에 "send"를 찍고 finish_trace로 넘긴다.
+- 큐 깊이: 워커 큐에 쌓인 작업 수 (관측 최대값은 가장 깊은 워커 기준)
+"""
+
+import queue
+import threading
+import time
+from typing import Callable
+
+from metrics import Histogram, MessageTrace
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 10_000
+
+
+class FanoutJob:
+    """메시지 하나의 팬아웃 (워커 여러 개가 나눠 처리, 마지막 워커가 완료 기록)"""
+
+    __slots__ = ("room", "submitted", "remaining", "lock", "trace")
+
+    def __init__(self, room: str, parts: int, trace: MessageTrace | None):
+        self.room = room
+        self.submitted = time.monotonic()
+        self.remaining = parts
+        self.lock = threading.Lock()
+        self.trace = trace
+
+
+class FanoutPool:
+    def __init__(self, prepare: Callable, send: Callable, workers: int = DEFAULT_WORKERS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, finish_trace: Callable | None = None):
+        # prepare(client, text, srv_ts, seq): 보낼 바이트 (대기 바이트를 잡아 둔 것, None이면 이 수신자는 버림)
+        # send(client, data): prepare가 만든 것을 전송 (잡아 둔 대기 바이트도 여기서 푼다)
+        self.prepare = prepare
+        self.send = send
+        self.workers = workers
+        self.max_queue = max_queue
+        self.finish_trace = finish_trace
+        self.queues: list[queue.Queue] = []
+        self.completion = Histogram()
+        self._lock = threading.Lock()
+        self._rooms: dict[str, int] = {}  # room -> 아직 다 보내지 않은 작업 수
+        self.jobs = 0
+        self.done = 0
+        self.recipients = 0
+        self.max_depth = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self.queues)
+
+    def start(self, workers: int | None = None):
+        if self.running:
+            return
+        if workers is not None:
+            self.workers = workers
+        self.queues = [queue.Queue(self.max_queue) for _ in range(self.workers)]
+        for i, q in enumerate(self.queues):
+            threading.Thread(target=self._run, args=(q,), name=f"fanout-{i}", daemon=True).start()
+
+    def submit(self, room: str, members, text: str, srv_ts: float | None = None, seq: int | None = None,
+               trace: MessageTrace | None = None) -> bool:
+        """
+        수신자를 워커별로 나눠 넘기고 반환 (members는 호출 뒤 바뀌지 않는 복사본).
+        보낼 수신자가 하나도 없으면 False (trace는 호출한 쪽이 마무리).
+        """
+        n = len(self.queues)
+        parts: list[list] = [[] for _ in range(n)]
+        prepare = self.prepare
+        for c in members:
+            data = prepare(c, text, srv_ts, seq)
+            if data is not None:
+                parts[c.conn_id % n].append((c, data))
+        busy = [(q, part) for q, part in zip(self.queues, parts) if part]
+        if not busy:
+            return False
+        if trace is not None:
+            trace.deferred = True  # 마지막 워커가 finish_trace로 마무리
+        job = FanoutJob(room, len(busy), trace)
+        with self._lock:
+            self.jobs += 1
+            self.recipients += sum(len(part) for _, part in busy)
+            self._rooms[room] = self._rooms.get(room, 0) + 1
+        for q, part in busy:
+            q.put((job, part))
+        depth = max(q.qsize() for q in self.queues)
+        with self._lock:
+            if depth > self.max_depth:
+                self.max_depth = depth
+        return True
+
+    def in_flight(self, room: str) -> bool:
+        """room의 작업이 아직 큐나 워커에 남아 있는지"""
+        with self._lock:
+            return room in self._rooms
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def idle(self) -> bool:
+        """넘겨받은 작업을 모든 워커가 다 보냈는지"""
+        with self._lock:
+            return self.done >= self.jobs
+
+    def _run(self, q: queue.Queue):
+        send = self.send
+        while True:
+            job, part = q.get()
+            for c, data in part:
+                try:
+                    send(c, data)
+                except Exception as e:
+                    print("팬아웃 전송 에러:", e)
+            with job.lock:
+                job.remaining -= 1
+                done = job.remaining == 0
+            if not done:
+                continue
+            with self._lock:
+                self.done += 1
+                left = self._rooms[job.room] - 1
+                if left:
+                    self._rooms[job.room] = left
+                else:
+                    del self._rooms[job.room]
+            self.completion.record(time.monotonic() - job.submitted)
+            if job.trace is not None:
+                job.trace.mark("send")
+                if self.finish_trace is not None:
+                    self.finish_trace(job.trace)
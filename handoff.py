@@ -0,0 +1,70 @@
+# handoff.py
+"""
+무중단 재시작용 소켓/상태 넘기기 (Unix 도메인 소켓 + SCM_RIGHTS)
+
+실행 중인 서버가 --handoff-socket 경로에서 기다리다가 새 프로세스가 --takeover로
+접속해 오면, 리슨 소켓과 클라이언트 소켓의 파일 디스크립터, 그리고 클라이언트/방 상태
+(JSON)를 넘긴다. fd는 커널이 새 프로세스에 복제해 주므로 TCP 연결은 끊기지 않는다.
+
+메시지 순서
+    이전 -> 새 : 헤더 !II (본문 길이, fd 수) + zlib 압축 JSON 본문
+    이전 -> 새 : fd 묶음마다 !I (이번 묶음 fd 수) 4바이트 + SCM_RIGHTS (최대 FDS_PER_MSG개)
+    새 -> 이전 : ACK 1바이트 (다 받았음)
+이전 프로세스는 ACK를 받으면 바로 종료(또는 리슨 소켓만 넘긴 경우 연결을 닫고 drain)하고,
+새 프로세스는 이 연결이 닫히는 것(EOF)을 본 뒤에야 클라이언트 소켓을 읽기 시작한다.
+두 프로세스가 같은 소켓을 동시에 읽지 않게 하기 위해서다.
+"""
+
+import json
+import socket
+import struct
+import zlib
+
+FDS_PER_MSG = 250  # 리눅스 SCM_MAX_FD(253) 이하
+ACK = b"K"
+
+_HEADER = struct.Struct("!II")
+_COUNT = struct.Struct("!I")
+
+
+def supported() -> bool:
+    """SCM_RIGHTS로 fd를 넘길 수 있는 플랫폼인지 (Unix + Python 3.9 이상)"""
+    return hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds")
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("handoff connection closed")
+        data += chunk
+    return data
+
+
+def send_state(conn: socket.socket, state: dict, fds: list[int]):
+    """상태와 fd 목록 전송 (fds 순서는 state 안의 목록 순서와 맞춘다)"""
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    body = zlib.compress(raw, 1)
+    conn.sendall(_HEADER.pack(len(body), len(fds)) + body)
+    for i in range(0, len(fds), FDS_PER_MSG):
+        batch = fds[i:i + FDS_PER_MSG]
+        socket.send_fds(conn, [_COUNT.pack(len(batch))], batch)
+
+
+def recv_state(conn: socket.socket) -> tuple[dict, list[int]]:
+    """send_state로 보낸 (상태, fd 목록) 받기"""
+    size, count = _HEADER.unpack(_recv_exact(conn, _HEADER.size))
+    state = json.loads(zlib.decompress(_recv_exact(conn, size)).decode("utf-8"))
+    fds: list[int] = []
+    while len(fds) < count:
+        msg, batch, flags, _ = socket.recv_fds(conn, _COUNT.size, FDS_PER_MSG)
+        if flags & getattr(socket, "MSG_CTRUNC", 0):
+            raise OSError("file descriptors truncated (fd limit?)")
+        if len(msg) < _COUNT.size:
+            msg += _recv_exact(conn, _COUNT.size - len(msg))
+        expected, = _COUNT.unpack(msg)
+        if len(batch) != expected:
+            raise OSError(f"expected {expected} fds, got {len(batch)}")
+        fds.extend(batch)
+    return state, fds
@@ -0,0 +1,82 @@
+# heavyhitters.py
+"""
+스트리밍 상위 K개(heavy hitters) 추적 - Space-Saving 알고리즘
+
+방/사용자별 카운터 dict를 두면 방 수만큼 계속 커진다. Space-Saving은 카운터를
+capacity개만 유지하고, 꽉 찼을 때 새 키가 오면 가장 작은 카운터를 빼앗아
+(그 값 + 가중치)로 시작한다. 빼앗긴 값은 err로 남겨 두어 실제 값이
+count - err 이상 count 이하임을 보장한다. 가중치 합의 1/capacity보다 큰 키는
+반드시 목록에 남는다.
+
+- 최솟값은 항상 capacity개짜리 힙으로 찾는다. 기존 키의 증가는 힙을 건드리지 않고
+  (값이 커지기만 하므로 힙의 값은 실제 이하), 교체할 때 힙 맨 앞 값이 낡았으면
+  고쳐 넣고 다시 본다. 갱신은 분할 상환 O(log capacity), 메모리는 capacity에 비례한다.
+- window초마다 모든 값을 반으로 줄여 최근 트래픽 위주로 순위가 바뀌게 한다.
+"""
+
+import heapq
+import threading
+import time
+
+DEFAULT_CAPACITY = 64
+DEFAULT_WINDOW = 60.0
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, window: float = DEFAULT_WINDOW):
+        self.capacity = capacity
+        self.window = window
+        self._lock = threading.Lock()
+        self._counts: dict[str, list[int]] = {}  # key -> [count, err]
+        self._heap: list[tuple[int, str]] = []    # (count, key), count는 실제 이하일 수 있음
+        self._decay_at = time.monotonic() + window
+        self.total = 0
+
+    def update(self, key: str, weight: int = 1):
+        with self._lock:
+            if self.window and time.monotonic() >= self._decay_at:
+                self._decay()
+            self.total += weight
+            entry = self._counts.get(key)
+            if entry is not None:
+                entry[0] += weight
+                return
+            if len(self._counts) < self.capacity:
+                self._counts[key] = [weight, 0]
+                heapq.heappush(self._heap, (weight, key))
+                return
+            # 가장 작은 카운터를 찾아 새 키에 넘긴다 (낡은 힙 값은 고쳐 넣고 다시 확인)
+            heap = self._heap
+            while True:
+                count, old = heap[0]
+                actual = self._counts[old][0]
+                if actual == count:
+                    break
+                heapq.heapreplace(heap, (actual, old))
+            del self._counts[old]
+            self._counts[key] = [count + weight, count]
+            heapq.heapreplace(heap, (count + weight, key))
+
+    def _decay(self):
+        # 모든 값을 반으로 (순서는 유지되지만 힙 값이 바뀌므로 다시 만든다)
+        for entry in self._counts.values():
+            entry[0] //= 2
+            entry[1] //= 2
+        self._heap = [(entry[0], key) for key, entry in self._counts.items()]
+        heapq.heapify(self._heap)
+        self.total //= 2
+        self._decay_at = time.monotonic() + self.window
+
+    def top(self, n: int | None = None) -> list[tuple[str, int, int]]:
+        """(key, count, err) 목록, count 큰 순"""
+        with self._lock:
+            items = [(key, entry[0], entry[1]) for key, entry in self._counts.items()]
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items[:n] if n is not None else items
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self._heap.clear()
+            self.total = 0
+            self._decay_at = time.monotonic() + self.window
@@ -0,0 +1,97 @@
+# history.py
+"""
+방별 최근 메시지 보관 (ring buffer)
+
+방마다 최근 maxlen개의 ROOM_MSG만 deque에 남긴다. 오래된 메시지는 자동으로 밀려난다.
+방별 바이트 합이 max_bytes를 넘어도 오래된 것부터 밀어낸다.
+서버 전역 lock과 별개인 자체 락을 써서 채팅 처리와 조회가 서로 막지 않는다.
+
+메모리 계정용으로 방별/보낸 사람별 보관 바이트(UTF-8 기준 닉+본문)를 같이 센다.
+항목마다 방별 ROOM_MSG 번호(seq)를 같이 두어 번호 구간으로 다시 꺼낼 수 있다 (FETCH).
+"""
+
+import threading
+from collections import deque
+from typing import NamedTuple
+
+DEFAULT_MAXLEN = 200
+DEFAULT_MAX_BYTES = 1 << 20
+
+
+class HistoryEntry(NamedTuple):
+    ts: float       # 서버 수신 시각 (epoch 초)
+    nick: str
+    msg: str
+    seq: int = 0    # 방별 ROOM_MSG 번호 (번호 없이 보관된 이전 항목은 0)
+
+
+def entry_size(nick: str, msg: str) -> int:
+    return len(nick.encode("utf-8")) + len(msg.encode("utf-8"))
+
+
+class RoomHistory:
+    def __init__(self, maxlen: int = DEFAULT_MAXLEN, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.maxlen = maxlen
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._rooms: dict[str, deque[HistoryEntry]] = {}
+        self._room_bytes: dict[str, int] = {}
+        self._nick_bytes: dict[str, int] = {}
+
+    def append(self, room: str, nick: str, msg: str, ts: float, seq: int = 0) -> HistoryEntry:
+        entry = HistoryEntry(ts, nick, msg, seq)
+        size = entry_size(nick, msg)
+        with self._lock:
+            buf = self._rooms.get(room)
+            if buf is None:
+                buf = self._rooms[room] = deque()
+            buf.append(entry)
+            total = self._room_bytes.get(room, 0) + size
+            self._nick_bytes[nick] = self._nick_bytes.get(nick, 0) + size
+            while len(buf) > self.maxlen or (total > self.max_bytes and len(buf) > 1):
+                total -= self._forget(buf.popleft())
+            self._room_bytes[room] = total
+        return entry
+
+    def _forget(self, entry: HistoryEntry) -> int:
+        # 밀려난 항목의 보낸 사람 바이트 차감 (self._lock 안에서 호출)
+        size = entry_size(entry.nick, entry.msg)
+        left = self._nick_bytes.get(entry.nick, 0) - size
+        if left > 0:
+            self._nick_bytes[entry.nick] = left
+        else:
+            self._nick_bytes.pop(entry.nick, None)
+        return size
+
+    def get(self, room: str) -> list[HistoryEntry]:
+        with self._lock:
+            return list(self._rooms.get(room, ()))
+
+    def fetch(self, room: str, first: int, last: int) -> list[HistoryEntry]:
+        """seq가 first..last인 보관 항목 (번호순, 밀려난 번호는 빠진다)"""
+        with self._lock:
+            buf = self._rooms.get(room, ())
+            # 여러 스레드가 번호를 받은 뒤 보관하므로 deque 순서가 번호순과 조금 다를 수 있다
+            found = [e for e in buf if first <= e.seq <= last]
+        found.sort(key=lambda e: e.seq)
+        return found
+
+    def drop(self, room: str):
+        with self._lock:
+            for entry in self._rooms.pop(room, ()):
+                self._forget(entry)
+            self._room_bytes.pop(room, None)
+
+    def nick_bytes(self, nick: str | None) -> int:
+        """이 닉이 보낸 메시지 중 아직 보관 중인 바이트 (락 없이 읽는 근사값)"""
+        return self._nick_bytes.get(nick, 0) if nick else 0
+
+    def room_usage(self) -> list[tuple[str, int, int]]:
+        """(room, bytes, entries) 목록"""
+        with self._lock:
+            return [(room, self._room_bytes.get(room, 0), len(buf)) for room, buf in self._rooms.items()]
+
+    def copy(self) -> dict[str, list[HistoryEntry]]:
+        """스냅샷용 전체 복사 (deque -> list)"""
+        with self._lock:
+            return {room: list(buf) for room, buf in self._rooms.items()}
@@ -0,0 +1,137 @@
+# memberwatch.py
+"""
+방 멤버 목록 변경 구독 (LIST_USER 주기 조회 대신)
+
+2|WATCH_MEMBERS|room 을 보낸 연결은 처음에 전체 목록 한 줄을 받고, 그 뒤로는 바뀐 것만 받는다.
+
+    MEMBERS|room|version|owner|nick1,nick2,...   (구독 직후 / 다시 맞출 때 전체 목록)
+    MEMBER_DEL|room|version|nick1,nick2,...
+    MEMBER_ADD|room|version|nick1,nick2,...
+    OWNER_CHANGE|room|version|nick               (방장이 없어지면 nick은 빈 문자열)
+
+변경은 방마다 모아 두었다가 flush 때 한 묶음(최대 세 줄, 위 순서)으로 보낸다. 같은 묶음 안에서
+들어왔다 나간 사람은 상쇄된다. version은 묶음마다 1씩 늘고 같은 묶음의 줄은 같은 version을 쓴다.
+클라이언트는 version이 (알고 있던 값 + 1)보다 크면 중간 묶음을 놓친 것이므로 다시 구독해 전체 목록을 받는다.
+
+멤버 목록과 어긋나지 않도록 모든 메서드는 서버 전역 lock 안에서 호출한다 (자체 락 없음).
+구독자가 없는 방은 기록하지 않으므로 구독이 없으면 비용이 거의 없다.
+"""
+
+from typing import Hashable
+
+
+class _Delta:
+    __slots__ = ("added", "removed", "owner")
+
+    def __init__(self):
+        self.added: dict[str, None] = {}
+        self.removed: dict[str, None] = {}
+        self.owner: str | None = None  # 바뀐 방장 (None이면 변경 없음)
+
+
+class MemberWatch:
+    def __init__(self):
+        self.watchers: dict[str, dict[Hashable, None]] = {}  # room -> 구독 연결 (구독 순서)
+        self.versions: dict[str, int] = {}                  # room -> 마지막으로 보낸 묶음 번호
+        self._by_client: dict[Hashable, set[str]] = {}      # 연결 -> 구독 중인 방
+        self._pending: dict[str, _Delta] = {}
+        self.events = 0     # 기록한 변경 수
+        self.cancelled = 0  # 같은 묶음 안에서 상쇄된 수
+        self.batches = 0    # 보낸 묶음 수
+
+    def changed(self, room: str | None, nick: str | None, added: bool):
+        """room 멤버에 nick이 들어왔거나(added) 나갔다"""
+        if room not in self.watchers or not nick:
+            return
+        delta = self._pending.get(room)
+        if delta is None:
+            delta = self._pending[room] = _Delta()
+        here, other = (delta.added, delta.removed) if added else (delta.removed, delta.added)
+        self.events += 1
+        if nick in other:
+            del other[nick]
+            self.cancelled += 1
+        else:
+            here[nick] = None
+
+    def owner_changed(self, room: str, nick: str):
+        if room not in self.watchers:
+            return
+        delta = self._pending.get(room)
+        if delta is None:
+            delta = self._pending[room] = _Delta()
+        self.events += 1
+        delta.owner = nick
+
+    def take(self, room: str | None = None) -> list[tuple[list, list[str]]]:
+        """
+        모아 둔 변경을 꺼내 [(구독 연결 목록, 보낼 줄 목록)]으로 (room을 주면 그 방만).
+        실제 전송은 락 밖에서, 묶음 순서가 섞이지 않게 한 스레드씩 한다.
+        """
+        if room is None:
+            pending, self._pending = self._pending, {}
+        else:
+            delta = self._pending.pop(room, None)
+            pending = {room: delta} if delta is not None else {}
+        out = []
+        for r, delta in pending.items():
+            watchers = self.watchers.get(r)
+            if not watchers or not (delta.added or delta.removed or delta.owner is not None):
+                continue
+            version = self.versions[r] = self.versions.get(r, 0) + 1
+            lines = []
+            if delta.removed:
+                lines.append(f"MEMBER_DEL|{r}|{version}|{','.join(delta.removed)}")
+            if delta.added:
+                lines.append(f"MEMBER_ADD|{r}|{version}|{','.join(delta.added)}")
+            if delta.owner is not None:
+                lines.append(f"OWNER_CHANGE|{r}|{version}|{delta.owner}")
+            self.batches += 1
+            out.append((list(watchers), lines))
+        return out
+
+    def watch(self, room: str, client: Hashable, nicks: list[str], owner: str) -> str:
+        """
+        구독 추가(이미 구독 중이면 다시 맞추기) 후 전체 목록 줄 반환.
+        그 방에 모아 둔 변경은 먼저 take(room)으로 꺼내 보내야 목록과 version이 맞는다.
+        """
+        self.watchers.setdefault(room, {})[client] = None
+        self._by_client.setdefault(client, set()).add(room)
+        version = self.versions.setdefault(room, 0)
+        return f"MEMBERS|{room}|{version}|{owner}|{','.join(nicks)}"
+
+    def unwatch(self, room: str, client: Hashable) -> bool:
+        watchers = self.watchers.get(room)
+        if watchers is None or client not in watchers:
+            return False
+        del watchers[client]
+        if not watchers:
+            self._forget_room(room)
+        rooms = self._by_client.get(client)
+        if rooms is not None:
+            rooms.discard(room)
+            if not rooms:
+                del self._by_client[client]
+        return True
+
+    def drop_client(self, client: Hashable):
+        """연결 종료: 그 연결의 구독을 모두 해제"""
+        for room in list(self._by_client.get(client, ())):
+            self.unwatch(room, client)
+
+    def drop_room(self, room: str) -> list:
+        """방 삭제: 구독을 모두 해제하고 알려 줄 구독 연결 목록 반환"""
+        watchers = list(self.watchers.get(room, ()))
+        for client in watchers:
+            self.unwatch(room, client)
+        self._forget_room(room)
+        return watchers
+
+    def rooms_of(self, client: Hashable) -> list[str]:
+        return sorted(self._by_client.get(client, ()))
+
+    def _forget_room(self, room: str):
+        # 구독자가 없으면 번호/대기 변경도 버린다 (다시 구독하면 0부터 전체 목록)
+        self.watchers.pop(room, None)
+        self.versions.pop(room, None)
+        self._pending.pop(room, None)
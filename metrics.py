@@ -0,0 +1,143 @@
+# metrics.py
+"""
+서버 계측용 간단한 지표 모음
+
+- Histogram: 마이크로초 단위 지연 시간을 2의 거듭제곱 버킷에 누적
+- RateMeter: 최근 몇 초 동안의 초당 이벤트 수
+- MessageTrace / LatencyTracer: 샘플링된 메시지의 단계별 타임스탬프를 기록하고
+  인접 단계 사이 지연을 히스토그램으로 모은다.
+
+모든 타임스탬프는 time.monotonic() 기준(초)이다.
+"""
+
+import random
+import threading
+import time
+
+NUM_BUCKETS = 32  # 1us ~ 2^31us(약 35분)
+
+
+class Histogram:
+    """log2 버킷 지연 히스토그램 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record(self, seconds: float):
+        us = int(seconds * 1_000_000)
+        if us < 0:
+            us = 0
+        idx = min(us.bit_length(), NUM_BUCKETS - 1)
+        with self._lock:
+            self.buckets[idx] += 1
+            self.count += 1
+            self.total_us += us
+            if us > self.max_us:
+                self.max_us = us
+
+    def percentile(self, pct: float) -> int:
+        """pct(0~100) 분위수의 버킷 상한 (us)"""
+        with self._lock:
+            if self.count == 0:
+                return 0
+            target = self.count * pct / 100.0
+            seen = 0
+            for idx, n in enumerate(self.buckets):
+                seen += n
+                if seen >= target:
+                    return min((1 << idx) - 1 if idx else 0, self.max_us)
+            return self.max_us
+
+    def summary(self) -> str:
+        """'count=..,avg_us=..,p50_us=..' 형태 한 줄 요약"""
+        avg = self.total_us // self.count if self.count else 0
+        return (
+            f"count={self.count},avg_us={avg},p50_us={self.percentile(50)},"
+            f"p90_us={self.percentile(90)},p99_us={self.percentile(99)},max_us={self.max_us}"
+        )
+
+
+class RateMeter:
+    """1초 단위 버킷으로 최근 window초의 평균 초당 발생 횟수를 계산"""
+
+    def __init__(self, window: int = 10):
+        self._lock = threading.Lock()
+        self.window = window
+        self._buckets = [0] * window
+        self._seconds = [0] * window  # 각 버킷이 어느 초(second)의 값인지
+        self.total = 0
+
+    def add(self, n: int = 1):
+        sec = int(time.monotonic())
+        idx = sec % self.window
+        with self._lock:
+            if self._seconds[idx] != sec:
+                self._seconds[idx] = sec
+                self._buckets[idx] = 0
+            self._buckets[idx] += n
+            self.total += n
+
+    def rate(self) -> float:
+        now = int(time.monotonic())
+        with self._lock:
+            recent = sum(
+                n for n, sec in zip(self._buckets, self._seconds) if now - self.window < sec <= now
+            )
+        return recent / self.window
+
+
+# 메시지 처리 단계 (순서대로)
+STAGES = ("recv", "parse", "lock", "enqueue", "send")
+
+
+class MessageTrace:
+    """메시지 하나가 각 단계를 지난 시각 기록"""
+
+    __slots__ = ("marks", "deferred")
+
+    def __init__(self, recv_ts: float):
+        self.marks = {"recv": recv_ts}
+        self.deferred = False  # 전달 워커가 "send"를 찍고 마무리한다 (명령 처리 스레드는 finish 안 함)
+
+    def mark(self, stage: str):
+        # 같은 단계가 여러 번 찍히면(여러 번 락 획득 등) 첫 시각을 유지
+        if stage not in self.marks:
+            self.marks[stage] = time.monotonic()
+
+
+class LatencyTracer:
+    """샘플링 비율에 따라 MessageTrace를 만들고 단계별 히스토그램을 유지"""
+
+    def __init__(self, sample_rate: float = 0.0):
+        self.sample_rate = sample_rate
+        self.histograms: dict[str, Histogram] = {}
+        for prev, cur in zip(STAGES, STAGES[1:]):
+            self.histograms[f"{prev}_{cur}"] = Histogram()
+        self.histograms["total"] = Histogram()
+
+    def maybe_start(self, recv_ts: float) -> MessageTrace | None:
+        rate = self.sample_rate
+        if rate <= 0.0 or (rate < 1.0 and random.random() >= rate):
+            return None
+        return MessageTrace(recv_ts)
+
+    def finish(self, trace: MessageTrace):
+        """기록된 단계끼리만 구간 지연을 누적 (빠진 단계는 건너뜀)"""
+        marks = trace.marks
+        prev_stage = None
+        for stage in STAGES:
+            if stage not in marks:
+                continue
+            if prev_stage is not None and self._is_adjacent(prev_stage, stage):
+                self.histograms[f"{prev_stage}_{stage}"].record(marks[stage] - marks[prev_stage])
+            prev_stage = stage
+        if "send" in marks:
+            self.histograms["total"].record(marks["send"] - marks["recv"])
+
+    @staticmethod
+    def _is_adjacent(prev: str, cur: str) -> bool:
+        return STAGES.index(cur) - STAGES.index(prev) == 1
@@ -0,0 +1,79 @@
+# presence.py
+"""
+큰 방 입장/퇴장 알림 묶기
+
+멤버가 많은 방에서 입장/퇴장마다 "X 님이 방에 입장했습니다." 한 줄을 모두에게 보내면
+재접속 폭주 때 (입장 수 × 멤버 수) 줄이 나간다. 여기서는 방마다 window초 동안 입장/퇴장한
+닉을 모았다가 "N명 입장, M명 퇴장 (입장: a, b 외 K명 / 퇴장: ...)" 한 줄로 보낸다.
+
+- 같은 window 안에서 나갔다 다시 들어온 사람(재접속 등)은 서로 상쇄되어 알림이 없다.
+- 실제 전송은 flush(room, text) 콜백이 한다 (서버의 broadcast_to_room).
+"""
+
+import threading
+import time
+from typing import Callable
+
+DEFAULT_WINDOW = 1.0
+SHOWN_NAMES = 5  # 요약 줄에 이름을 보여 주는 최대 인원 (입장/퇴장 각각)
+
+
+def summary(joined: list[str], left: list[str], shown: int = SHOWN_NAMES) -> str:
+    """입장/퇴장 닉 목록을 한 줄 요약으로"""
+    counts = []
+    names = []
+    for label, nicks in (("입장", joined), ("퇴장", left)):
+        if not nicks:
+            continue
+        counts.append(f"{len(nicks)}명 {label}")
+        more = f" 외 {len(nicks) - shown}명" if len(nicks) > shown else ""
+        names.append(f"{label}: {', '.join(nicks[:shown])}{more}")
+    return f"{', '.join(counts)} ({' / '.join(names)})"
+
+
+class PresenceBatcher:
+    def __init__(self, flush: Callable[[str, str], None], window: float = DEFAULT_WINDOW):
+        self.flush_fn = flush
+        self.window = window
+        self._lock = threading.Lock()
+        # room -> (입장 닉, 퇴장 닉), 순서 유지용 dict
+        self._pending: dict[str, tuple[dict[str, None], dict[str, None]]] = {}
+        self.running = False
+        self.events = 0    # 모은 입장/퇴장 수
+        self.cancelled = 0  # 나갔다 들어와 상쇄된 수
+        self.lines = 0     # 실제로 보낸 요약 줄 수 (방 하나당 한 줄)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        threading.Thread(target=self._run, name="presence", daemon=True).start()
+
+    def add(self, room: str, nicks: list[str], joined: bool):
+        with self._lock:
+            joins, leaves = self._pending.setdefault(room, ({}, {}))
+            here, other = (joins, leaves) if joined else (leaves, joins)
+            for nick in nicks:
+                self.events += 1
+                if nick in other:
+                    del other[nick]
+                    self.cancelled += 1
+                else:
+                    here[nick] = None
+
+    def flush(self):
+        """모아 둔 알림을 방마다 한 줄씩 보낸다"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for room, (joins, leaves) in pending.items():
+            if joins or leaves:
+                self.lines += 1
+                self.flush_fn(room, summary(list(joins), list(leaves)))
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                print("입장/퇴장 알림 전송 에러:", e)
@@ -0,0 +1,116 @@
+# profiler.py
+"""
+런타임에 켜고 끄는 샘플링 프로파일러 / 메모리 할당 추적기
+
+- 꺼져 있을 때는 샘플링 스레드 자체가 없으므로 오버헤드가 없다.
+- 켜지면 별도 스레드가 일정 주기로 sys._current_frames()를 읽어
+  모든 연결 스레드의 스택을 모은다.
+- 결과는 flamegraph 도구가 읽는 collapsed-stack 형식
+  (root;...;leaf count) 으로 파일에 기록한다.
+- 옵션으로 tracemalloc 스냅샷을 함께 저장한다.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+DEFAULT_INTERVAL = 0.005   # 샘플링 주기 (초)
+MAX_DEPTH = 64             # 스택 최대 깊이
+TRACEMALLOC_FRAMES = 16    # 할당 위치별로 보관할 프레임 수
+
+
+class SamplingProfiler:
+    """모든 스레드를 주기적으로 샘플링해서 스택별 횟수를 센다"""
+
+    def __init__(self, out_dir: str = "."):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._counts: dict[str, int] = {}
+        self._labels: dict[object, str] = {}  # code 객체 -> 프레임 라벨 캐시
+        self._trace_memory = False
+        self._started_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = DEFAULT_INTERVAL, trace_memory: bool = False) -> bool:
+        """샘플링 시작. 이미 실행 중이면 False"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._counts = {}
+            self._stop.clear()
+            self._trace_memory = trace_memory
+            self._started_at = time.time()
+            if trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._thread = threading.Thread(
+                target=self._run, args=(interval,), name="profiler", daemon=True
+            )
+            self._thread.start()
+        return True
+
+    def stop(self) -> list[str]:
+        """샘플링 중지 후 결과 파일 경로 목록 반환 (실행 중이 아니면 빈 목록)"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return []
+            self._stop.set()
+            thread.join()
+            self._thread = None
+            return self._dump()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = os.path.basename(code.co_filename)
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _run(self, interval: float):
+        me = threading.get_ident()
+        counts = self._counts
+        while not self._stop.wait(interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+
+    def _dump(self) -> list[str]:
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started_at))
+        stamp += f"-{int(self._started_at * 1000) % 1000:03d}"
+        paths = []
+
+        folded = os.path.join(self.out_dir, f"profile-{stamp}.folded")
+        with open(folded, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self._counts.items()):
+                f.write(f"{stack} {count}\n")
+        paths.append(folded)
+
+        if self._trace_memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            raw = os.path.join(self.out_dir, f"memory-{stamp}.tracemalloc")
+            snapshot.dump(raw)
+            paths.append(raw)
+            top = os.path.join(self.out_dir, f"memory-{stamp}.txt")
+            with open(top, "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+            paths.append(top)
+        return paths
@@ -0,0 +1,225 @@
+# replay.py
+"""
+캡처 파일 재생 도구
+
+server.py --capture 로 기록한 트래픽을 서버에 다시 보내고 처리량/지연을 잰다.
+캡처의 연결 ID마다 소켓을 하나씩 열어 같은 순서로 줄을 보낸다.
+
+    python replay.py traffic.cap                       # 원래 속도(1x)
+    python replay.py traffic.cap --speed 10            # 10배속
+    python replay.py traffic.cap --speed 0             # 최대 속도
+    python replay.py traffic.cap --save-baseline base.json
+    python replay.py traffic.cap --baseline base.json  # 회귀 시 종료 코드 1
+
+지연은 명령을 보낸 시각부터 그 명령의 응답 줄(client.is_reply_line)이 올 때까지다.
+같은 연결 안에서는 서버가 명령을 순서대로 처리하므로 응답도 순서대로 짝지어진다.
+"""
+
+import argparse
+import json
+import selectors
+import socket
+import sys
+import time
+from collections import deque
+
+from capture import KIND_CLOSE, KIND_LINE, KIND_OPEN, read_capture
+from client import is_reply_line
+
+HOST = "127.0.0.1"
+PORT = 5005
+ENCODING = "utf-8"
+DRAIN_TIMEOUT = 5.0  # 모두 보낸 뒤 남은 응답을 기다리는 최대 시간 (초)
+
+
+class ReplayConn:
+    """캡처 연결 하나에 대응하는 재생용 소켓"""
+
+    def __init__(self, conn_id: int, sock: socket.socket):
+        self.conn_id = conn_id
+        self.sock = sock
+        self.nick: str | None = None
+        self.buffer = ""
+        self.pending: deque[tuple[str, float]] = deque()  # (명령 종류, 보낸 시각)
+        self.closed = False
+
+
+def command_kind(line: str) -> str:
+    parts = line.split("|", 2)
+    return "|".join(parts[:2])
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+class Replayer:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.sel = selectors.DefaultSelector()
+        self.conns: dict[int, ReplayConn] = {}
+        self.latencies: dict[str, list[float]] = {}
+        self.sent = 0
+        self.replies = 0
+
+    def open(self, conn_id: int):
+        sock = socket.create_connection((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = ReplayConn(conn_id, sock)
+        self.conns[conn_id] = conn
+        self.sel.register(sock, selectors.EVENT_READ, conn)
+
+    def send(self, conn_id: int, line: str):
+        conn = self.conns.get(conn_id)
+        if conn is None:
+            # OPEN 레코드 없이 시작된 캡처(서버 실행 중 캡처 시작 등) 대비
+            self.open(conn_id)
+            conn = self.conns[conn_id]
+        if conn.closed or not line.strip():
+            return
+        conn.pending.append((command_kind(line.strip()), time.perf_counter()))
+        conn.sock.sendall((line + "\n").encode(ENCODING))
+        self.sent += 1
+
+    def close(self, conn_id: int):
+        conn = self.conns.get(conn_id)
+        if conn is None or conn.closed:
+            return
+        # 쓰기만 닫고 남은 응답은 계속 읽는다
+        try:
+            conn.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def poll(self, timeout: float):
+        for key, _ in self.sel.select(timeout):
+            conn: ReplayConn = key.data
+            try:
+                data = conn.sock.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                self._finish(conn)
+                continue
+            conn.buffer += data.decode(ENCODING, errors="replace")
+            while "\n" in conn.buffer:
+                line, conn.buffer = conn.buffer.split("\n", 1)
+                self._on_line(conn, line.strip())
+
+    def _on_line(self, conn: ReplayConn, line: str):
+        if line.startswith(("NICK_OK|", "RESUME_OK|")):
+            conn.nick = line.split("|")[1]
+        if not conn.pending or not is_reply_line(line, conn.nick):
+            return
+        kind, sent_at = conn.pending.popleft()
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - sent_at)
+        self.replies += 1
+
+    def _finish(self, conn: ReplayConn):
+        conn.closed = True
+        self.sel.unregister(conn.sock)
+        conn.sock.close()
+
+    def outstanding(self) -> int:
+        return sum(len(c.pending) for c in self.conns.values() if not c.closed)
+
+
+def run(args) -> dict:
+    replayer = Replayer(args.host, args.port)
+    with open(args.capture, "rb") as f:
+        records = list(read_capture(f))
+
+    started = time.perf_counter()
+    for rec in records:
+        if args.speed > 0:
+            due = started + rec.ts / args.speed
+            while True:
+                wait = due - time.perf_counter()
+                if wait <= 0:
+                    break
+                replayer.poll(wait)
+        if rec.kind == KIND_OPEN:
+            replayer.open(rec.conn_id)
+        elif rec.kind == KIND_LINE:
+            replayer.send(rec.conn_id, rec.payload)
+        elif rec.kind == KIND_CLOSE:
+            replayer.close(rec.conn_id)
+        if args.speed <= 0:
+            replayer.poll(0)
+    send_done = time.perf_counter()
+
+    deadline = send_done + DRAIN_TIMEOUT
+    while replayer.outstanding() and time.perf_counter() < deadline:
+        replayer.poll(0.05)
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [v for values in replayer.latencies.values() for v in values]
+    result = {
+        "records": len(records),
+        "connections": len(replayer.conns),
+        "sent": replayer.sent,
+        "replies": replayer.replies,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_per_s": round(replayer.sent / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 3),
+        "by_command": {
+            kind: {"count": len(v), "p50_ms": round(percentile(v, 50) * 1000, 3),
+                   "p99_ms": round(percentile(v, 99) * 1000, 3)}
+            for kind, v in sorted(replayer.latencies.items())
+        },
+    }
+    for conn in replayer.conns.values():
+        if not conn.closed:
+            conn.sock.close()
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """기준치보다 나빠진 항목 설명 목록 (비어 있으면 통과)"""
+    problems = []
+    if result["throughput_per_s"] < baseline["throughput_per_s"] * (1 - tolerance):
+        problems.append(f"throughput {result['throughput_per_s']}/s < baseline {baseline['throughput_per_s']}/s")
+    for key in ("p50_ms", "p99_ms"):
+        if result[key] > baseline[key] * (1 + tolerance):
+            problems.append(f"{key} {result[key]} > baseline {baseline[key]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NP-Chat capture replay")
+    parser.add_argument("capture", help="server.py --capture 로 만든 파일")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--speed", type=float, default=1.0, help="재생 배속 (0이면 최대 속도)")
+    parser.add_argument("--baseline", help="비교할 기준 결과 JSON")
+    parser.add_argument("--save-baseline", help="이번 결과를 기준 JSON으로 저장")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="허용 악화 비율 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"baseline saved: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.tolerance)
+        if problems:
+            print("REGRESSION:")
+            for p in problems:
+                print(" -", p)
+            sys.exit(1)
+        print("no regression against baseline")
+
+
+if __name__ == "__main__":
+    main()
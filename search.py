@@ -0,0 +1,136 @@
+# search.py
+"""
+방 메시지 전문 검색용 증분 역색인
+
+- 토큰: 공백으로 나눈 단어를 소문자로 바꾼 뒤 글자 2-gram (한 글자 단어는 그대로).
+  한국어는 띄어쓰기/조사 때문에 단어 단위 색인이 잘 맞지 않아서 n-gram을 쓴다.
+- 색인 키는 (방, gram), 값은 문서 ID deque (ID는 단조 증가라 항상 정렬돼 있음)
+- 전체 문서 수가 max_docs를 넘으면 가장 오래된 문서부터 지우고,
+  그 문서의 gram마다 posting 맨 앞(=가장 오래된 ID)을 빼서 메모리를 일정하게 유지한다.
+- 방을 지우면 그 방의 posting과 문서 본문을 같이 지운다 (같은 이름으로 다시 만든 방에서
+  예전 메시지가 검색되지 않게). 순서 deque에 남은 ID는 밀려날 때 건너뛴다.
+- 검색어 단어 중 NGRAM보다 짧은 것(한 글자)은 색인을 찾지 않고 부분 문자열 검사에만 쓴다.
+  검색어가 모두 짧으면 색인을 쓸 수 없으므로 최근 SHORT_QUERY_SCAN개 문서만 훑는다
+  ("밥"으로 "밥먹자"를 찾되, 오래된 메시지는 빠질 수 있다).
+- 자체 락만 사용하므로 서버 전역 lock과 무관하다.
+"""
+
+import itertools
+import threading
+from collections import deque
+from typing import NamedTuple
+
+DEFAULT_MAX_DOCS = 100_000
+NGRAM = 2
+SHORT_QUERY_SCAN = 20_000  # 짧은 검색어만 있을 때 훑는 최근 문서 수 (전체 기준)
+
+
+class SearchHit(NamedTuple):
+    ts: float
+    nick: str
+    msg: str
+
+
+def tokenize(text: str) -> set[str]:
+    grams = set()
+    for word in text.lower().split():
+        if len(word) < NGRAM:
+            grams.add(word)
+            continue
+        for i in range(len(word) - NGRAM + 1):
+            grams.add(word[i:i + NGRAM])
+    return grams
+
+
+class SearchIndex:
+    def __init__(self, max_docs: int = DEFAULT_MAX_DOCS):
+        self.max_docs = max_docs
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._docs: dict[int, tuple[str, float, str, str]] = {}  # id -> (room, ts, nick, msg)
+        self._order: deque[int] = deque()
+        self._postings: dict[tuple[str, str], deque[int]] = {}
+        self._room_keys: dict[str, set[str]] = {}  # room -> 그 방에서 쓰인 gram (방 삭제용)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, room: str, nick: str, msg: str, ts: float):
+        grams = tokenize(msg)
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._docs[doc_id] = (room, ts, nick, msg)
+            self._order.append(doc_id)
+            keys = self._room_keys.setdefault(room, set())
+            for gram in grams:
+                key = (room, gram)
+                posting = self._postings.get(key)
+                if posting is None:
+                    posting = self._postings[key] = deque()
+                    keys.add(gram)
+                posting.append(doc_id)
+            while len(self._order) > self.max_docs:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        doc_id = self._order.popleft()
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return  # forget_room으로 이미 지운 문서
+        room, _, _, msg = doc
+        for gram in tokenize(msg):
+            key = (room, gram)
+            posting = self._postings.get(key)
+            # 방이 삭제 후 다시 만들어졌다면 posting 맨 앞이 이 문서가 아닐 수 있다
+            if posting and posting[0] == doc_id:
+                posting.popleft()
+                if not posting:
+                    del self._postings[key]
+                    keys = self._room_keys.get(room)
+                    if keys is not None:
+                        keys.discard(gram)
+                        if not keys:
+                            del self._room_keys[room]
+
+    def forget_room(self, room: str):
+        """삭제된 방의 posting과 문서 제거 (gram이 없는 빈 메시지는 검색될 수 없으므로 밀려날 때 지워진다)"""
+        with self._lock:
+            for gram in self._room_keys.pop(room, ()):
+                for doc_id in self._postings.pop((room, gram), ()):
+                    self._docs.pop(doc_id, None)
+
+    def search(self, room: str, query: str, limit: int, nick: str | None = None) -> list[SearchHit]:
+        """방에서 query의 모든 단어를 포함하는 메시지를 최신순으로 최대 limit개"""
+        words = query.lower().split()
+        if not words:
+            return []
+        # 짧은 단어는 gram이 없으므로 아래 부분 문자열 검사로만 거른다
+        grams = tokenize(" ".join(w for w in words if len(w) >= NGRAM))
+        with self._lock:
+            if grams:
+                postings = []
+                for gram in grams:
+                    posting = self._postings.get((room, gram))
+                    if not posting:
+                        return []
+                    postings.append(posting)
+                # 가장 짧은 posting만 최신 문서부터 훑는다. 모든 단어가 부분 문자열로
+                # 들어 있으면 나머지 gram도 당연히 있으므로 교집합을 따로 만들 필요가 없다
+                candidates = reversed(min(postings, key=len))
+            else:
+                candidates = itertools.islice(reversed(self._order), SHORT_QUERY_SCAN)
+            hits = []
+            for doc_id in candidates:
+                doc = self._docs.get(doc_id)
+                if doc is None:
+                    continue
+                doc_room, ts, doc_nick, msg = doc
+                if doc_room != room or (nick is not None and doc_nick != nick):
+                    continue
+                lowered = msg.lower()
+                if all(w in lowered for w in words):
+                    hits.append(SearchHit(ts, doc_nick, msg))
+                    if len(hits) >= limit:
+                        break
+        return hits
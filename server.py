@@ -7,40 +7,232 @@ python ./gimal_server/npchat_server.py
 -------------
 클라이언트 -> 서버
 
+0|CAPS|cap1,cap2,...        (선택 기능 요청, 닉 설정 전에도 가능)
 0|NICK|nick
+0|RESUME|token              (재접속 시 닉/방 복구, 닉 설정 전에만 가능)
 0|CREATE_ROOM|room
 0|JOIN|room
+0|SUB|room                  (현재 방은 그대로 두고 다른 방도 같이 받기)
+0|UNSUB|room
 0|QUIT
 
-1|ROOM_MSG|message
+1|ROOM_MSG|message[|room]   (room을 주면 구독 중인 그 방으로, 없으면 현재 방. 구독이 없으면 현재 방이 아닌 room은 BAD_FORMAT)
 1|DM|toNick|message
 
+2|FETCH|room|from|to        (보관 중인 ROOM_MSG를 번호 구간으로 다시 받기, 현재 방/구독 방만)
 2|LIST_USER
+2|LIST_ALL
+2|WATCH_MEMBERS|room        (멤버 목록 전체 한 번 + 이후 변경만 받기, 다시 보내면 전체 목록부터 다시)
+2|UNWATCH_MEMBERS|room
+2|SEARCH|query[|limit]      (현재 방의 최근 메시지 검색, 'from:닉' 단어로 보낸 사람 제한, 한 글자 단어는 부분 문자열)
+2|PROFILE|start[|mem]      (관리자 전용)
+2|PROFILE|stop             (관리자 전용)
+2|TRACE|rate               (관리자 전용, 지연 추적 샘플링 비율 0.0~1.0)
+2|STATS|latency            (관리자 전용, 단계별 지연 히스토그램)
+2|STATS|accept             (관리자 전용, accept 처리량/거절/백로그 overflow)
+2|STATS|commands           (관리자 전용, 명령별 호출 수/누적 처리 시간)
+2|STATS|hot                (관리자 전용, 실제 전송 수 기준 상위 방/발신자)
+2|STATS|fanout             (관리자 전용, 전달 워커 큐 깊이/완료 지연)
+2|STATS|memory             (관리자 전용, 연결/방별 메모리 사용 상위)
+2|STATS|presence           (관리자 전용, 입장/퇴장 알림 묶기/생략 수)
+2|FILTER_RELOAD            (관리자 전용, 금칙어 목록 다시 읽기)
 
 서버 -> 클라이언트
 
 성공 응답:
+CAPS_OK|cap1,cap2,...
 NICK_OK|nick
+RESUME_TOKEN|token          (첫 NICK_OK 직후 1회 발급)
+RESUME_OK|nick|room|missed  (방이 없으면 room은 빈 문자열, missed는 끊긴 동안 방에 온 메시지 수)
 CREATE_ROOM_OK|room
 JOIN_OK|room
+SUB_OK|room
+UNSUB_OK|room
 SUCCESS|DM|toNick
 USER_LIST|room|nick1,nick2,...
+USER_LIST_ALL|nick1,nick2,...
+MEMBERS|room|version|owner|nick1,nick2,...   (WATCH_MEMBERS 응답)
+UNWATCH_OK|room
+SEARCH_RESULT|room|ts|nick|message  (최신순, 여러 줄) + SEARCH_END|room|count
+ROOM_MSG|room|fromNick|message|seq=N  (FETCH 응답, 번호순 여러 줄) + FETCH_END|room|from|to|count
+PROFILE_OK|started
+PROFILE_OK|stopped|file1,file2,...
+TRACE_OK|rate
+FILTER_RELOAD_OK|words
+STATS|section|name|key=value,...   (여러 줄) + STATS_END|section
 
 브로드캐스트:
 ROOM_MSG|room|fromNick|message
 DM|fromNick|message
 SYSTEM|INFO|text
+MEMBER_DEL|room|version|nick1,...    (WATCH_MEMBERS 구독자에게, 묶음 단위)
+MEMBER_ADD|room|version|nick1,...
+OWNER_CHANGE|room|version|nick
+WATCH_END|room                       (방이 삭제되어 구독 끝)
+
+선택 기능(CAPS):
+SRV_TS  ROOM_MSG/DM 끝에 '|srv_ts=<서버 수신 시각(epoch 초)>' 필드를 덧붙인다.
+SEQ     ROOM_MSG 끝에 '|seq=<방별 번호>' 필드를 덧붙인다 (srv_ts가 있으면 그 뒤).
+        번호는 방마다 1부터 빈틈없이 늘어나므로, 건너뛴 번호는 FETCH로 받아 채울 수 있다.
 
 에러:
 ERROR|CODE|message
-CODE: NEED_NICK, NICK_IN_USE, NOT_IN_ROOM, NO_SUCH_USER,
+CODE: SERVER_FULL (접속 직후 전송 후 연결 종료),
+      NEED_NICK, NICK_IN_USE, NOT_IN_ROOM, NO_SUCH_USER,
       ROOM_ALREADY_EXISTS, INVALID_ROOM_NAME, INVALID_STATE,
-      UNKNOWN_TYPE, UNKNOWN_SUBTYPE, BAD_FORMAT
+      UNKNOWN_TYPE, UNKNOWN_SUBTYPE, BAD_FORMAT, PERMISSION_DENIED,
+      RESUME_FAILED, LINE_TOO_LONG, MEMORY_LIMIT
+
+관리자 기능
+-----------
+--admin 옵션으로 지정한 닉만 관리자 명령(PROFILE 등)을 쓸 수 있다.
+SIGUSR1 시그널로도 프로파일러를 켜고 끌 수 있다 (kill -USR1 <pid>).
+
+지연 추적
+---------
+--trace-sample 비율(또는 2|TRACE|rate)로 켜면 샘플링된 채팅 메시지마다
+recv -> parse -> lock -> enqueue -> send 단계의 monotonic 시각을 기록하고
+인접 단계 간 지연을 히스토그램으로 누적한다 (2|STATS|latency로 조회).
+
+스냅샷 / 웜 재시작
+------------------
+--snapshot 경로를 주면 방/방장/재접속 토큰을 주기적으로 파일에 저장하고
+시작할 때 복원한다. 재시작 후 클라이언트는 받아 둔 토큰으로 0|RESUME|token을
+보내 닉과 방을 되찾는다. 토큰은 접속이 끊긴 뒤(또는 복원 후) RESUME_TTL초(--resume-ttl) 동안만 유효하다.
+방마다 ROOM_MSG 일련번호(room_seq)를 세고 끊길 때의 번호를 토큰에 같이 남겨 두어
+RESUME_OK에 놓친 메시지 수를 알려 준다. 같은 번호는 SEQ 기능을 켠 클라이언트에게
+메시지마다 붙여 보내고, 번호를 받은 메시지는 전달하기 전에 보관해 두어 FETCH로
+언제든(보관 한도 안에서) 다시 꺼낼 수 있다. 번호 매기기/보관/수신자별 대기 큐 넣기는 방마다
+한 메시지씩 해서 번호는 항상 순서대로 도착한다 (실제 전송은 그 밖에서). 느린 수신자에게 가는 메시지를 버려도
+클라이언트가 빈 번호를 채워 결국 모두 받는다. 재시작 직후 몰려드는 RESUME은 전용 스레드가
+큐에서 여러 개씩 꺼내 락 한 번으로 처리하고, 방 입장 알림도 방마다 한 줄로 묶는다.
+
+접속 처리
+---------
+listen 백로그(--backlog)는 재접속 폭주를 견딜 만큼 크게 잡고, accept 루프는
+한 번 깨어날 때마다 대기 중인 연결을 모두 꺼낸다. 동시 접속이 --max-connections에
+도달하면 새 연결에 ERROR|SERVER_FULL을 보내고 바로 닫는다.
+--socket-profile(sockopts.py)로 리슨 소켓과 받은 연결에 TCP_NODELAY, 송수신 버퍼,
+keepalive를 설정하고 recv 크기(BUF_SIZE)도 프로파일 값으로 바꾼다. 기본(default)은 커널
+기본값 그대로다. test/sockopt_sweep.py가 여러 조합의 처리량/지연을 비교한다.
+
+빈 방 정리
+----------
+--room-reclaim-interval초마다 멤버도 방장도 없는 방(마지막 사람이 나간 방, 방장이 접속을
+끊고 재접속 토큰도 만료된 방)을 지운다. 번호/보관 메시지/검색 색인/멤버 구독도 같이 정리하고,
+만료된 재접속 토큰도 이때 버린다. 재접속 토큰이 가리키는 방은 토큰이 만료될 때까지 남기고,
+막 비워진 방에 다시 들어오는 사람과 엇갈리지 않게 두 번 연속 비어 있던 방만 지운다.
+2|STATS|state 로 방/방장/연결 표 크기, 스레드 수, RSS를 본다 (test/soaktest.py).
+
+트래픽 캡처
+-----------
+--capture 경로를 주면 받은 모든 줄을 연결 ID/수신 시각과 함께 바이너리 파일에
+기록한다 (capture.py 형식). replay.py로 같은 트래픽을 다시 보낼 수 있다.
+
+메시지 필터
+-----------
+ROOM_MSG/DM 본문은 전달 전에 message_filters 의 함수들을 차례로 거친다.
+--banned-words 파일을 주면 Aho-Corasick 금칙어 마스킹 필터가 등록되고,
+2|FILTER_RELOAD 또는 SIGHUP으로 서비스 중단 없이 목록을 다시 읽는다.
+
+메시지 보관 / 검색
+------------------
+방마다 최근 ROOM_MSG를 ring buffer(history.py)에 남기고, 같은 메시지를
+글자 n-gram 역색인(search.py)에 증분으로 추가한다. 둘 다 자체 락을 쓰므로
+검색은 전역 lock을 잡지 않는다. 색인은 전체 문서 수 상한을 넘으면 오래된 것부터 지운다.
+
+팬아웃 상위 방/발신자
+---------------------
+broadcast_to_room과 DM 전달 때 실제로 보낸 줄 수를 방/발신자별 Space-Saving
+카운터(heavyhitters.py)에 더한다. 카운터 수가 고정이라 방이 아무리 많아도 메모리가
+늘지 않고, HOT_WINDOW마다 값을 반으로 줄여 최근 트래픽 위주로 순위를 매긴다.
+레이트 리밋/샤드 배치 판단용으로 2|STATS|hot 에서 상위 HOT_TOP개를 보여 준다.
+
+큰 방 팬아웃
+------------
+멤버가 --fanout-threshold 이상인 방의 브로드캐스트는 전달 워커 풀(fanout.py,
+--fanout-workers개)에 넘기고 보낸 사람의 스레드는 바로 다음 명령을 처리한다.
+수신자마다 줄은 연결별 대기 큐에 넣은 순서대로 나가므로, 직접 전송과 워커 전송이 섞여도
+수신자별 순서가 유지된다. 대기 큐는 먼저 send_lock을 잡은 스레드 하나가 비우고, 나머지는
+넣기만 하고 돌아온다 (읽지 않는 수신자 하나에 여러 스레드가 줄 서지 않게).
+
+입장/퇴장 알림
+--------------
+멤버가 --presence-batch-members 미만인 방은 입장/퇴장마다 바로 한 줄씩 알린다.
+그 이상인 방은 --presence-window초 동안 모아 "N명 입장, M명 퇴장 (입장: ...)" 한 줄로
+보내고(presence.py, 그 사이 나갔다 들어온 사람은 상쇄), --presence-max-members를
+넘는 방은 입장/퇴장 알림을 아예 보내지 않는다.
+
+멤버 목록 구독
+--------------
+LIST_USER를 주기적으로 보내는 대신 2|WATCH_MEMBERS|room으로 구독하면 전체 목록을 한 번
+받고, 그 뒤로는 --member-window초마다 모은 변경(MEMBER_DEL/MEMBER_ADD/OWNER_CHANGE)만
+받는다 (memberwatch.py). 묶음마다 version이 1씩 늘어서, 중간 줄이 빠지면(메모리 한도로
+버려지는 등) 클라이언트가 알아채고 WATCH_MEMBERS를 다시 보내 전체 목록으로 맞춘다.
+변경 기록은 전역 lock 안에서 멤버 변경과 같이 하므로 목록과 version이 어긋나지 않는다.
+
+여러 방 구독
+------------
+기본은 연결 하나에 방 하나(JOIN은 방 이동)이다. 0|SUB|room으로 현재 방을 유지한 채
+다른 방의 메시지도 같은 연결로 받는다 (현재 방이 없으면 그 방이 현재 방이 된다).
+현재 방을 나가면(LEAVE/UNSUB/DELETE_ROOM) 가장 먼저 구독한 방이 현재 방이 된다.
+한 사람에게 가는 전달은 직접 전송이든 팬아웃 워커든 연결별 대기 큐/send_lock으로
+한 줄씩 이어지므로, 여러 방의 메시지가 섞여도 줄이 깨지지 않는다.
+재접속(RESUME) 토큰은 현재 방만 기억하므로 구독은 클라이언트가 다시 보낸다.
+
+메모리 한도
+-----------
+연결마다 받는 중인 줄(in)과 보내려고 기다리는 방/DM 메시지(out, 전달 워커 큐에 들어간 것
+포함) 바이트를 센다.
+- 한 줄이 --max-line 바이트를 넘으면 ERROR|LINE_TOO_LONG 후 그 줄은 버린다.
+- 합계가 --mem-soft를 넘으면 그 연결로 가는 방/DM 메시지는 버리고(dropped),
+  그 연결이 보내는 ROOM_MSG는 ERROR|MEMORY_LIMIT으로 거절한다.
+- 합계에 마지막 전송 이후 버린 바이트까지 더해 --mem-hard를 넘으면 연결을 끊는다
+  (읽지 않는 수신자가 전송 스레드/전달 워커를 붙잡고 있지 않게).
+- 한 줄 전송이 --send-timeout초 안에 끝나지 않아도 그 수신자 연결을 끊는다 (보내는 쪽은 그 이상 막히지 않음).
+그 닉이 보낸 보관 메시지(history) 바이트는 STATS|memory에 보여 주기만 하고 한도에는 넣지 않는다.
+방별 보관 메시지는 개수(--history-size)와 바이트(--history-room-bytes)로 제한한다.
+
+무중단 재시작
+-------------
+--handoff-socket 경로를 주고 띄운 서버는 새 프로세스가 --takeover 같은 경로로 접속해 오면
+accept를 멈추고, 핸들러 스레드가 받은 바이트를 처리하지 않고 멈출 때까지(전송 중인 줄도
+다 나갈 때까지) 기다린 뒤 리슨 소켓/클라이언트 소켓 fd와 클라이언트/방 상태를
+SCM_RIGHTS로 넘기고 종료한다 (handoff.py). 클라이언트 입장에서는 연결이 끊기지 않는다.
+핸들러는 소켓과 깨우기 소켓을 같이 기다렸다가 읽을 게 있을 때만 recv 하므로, 멈춘 뒤에는
+걸려 있는 recv가 없어 넘긴 뒤 도착한 바이트는 새 프로세스가 읽는다.
+--handoff-listener-only면 리슨 소켓만 넘기고 기존 연결은 이전 프로세스가 drain한다.
+drain만 쓰려면 SIGUSR2: 새 연결은 받지 않고(리슨 소켓을 닫아 새 서버가 bind할 수 있게)
+기존 연결이 모두 끝나거나 --drain-timeout이 지나면 종료한다.
 """
 
+import argparse
+import itertools
+import os
+import queue
+import selectors
+import signal
 import socket
 import threading
-import random
+import secrets
+import time
+from collections import deque
+from time import perf_counter_ns
+from typing import Callable
+
+import handoff
+import sockopts
+from fanout import FanoutPool
+from heavyhitters import SpaceSaving
+from memberwatch import MemberWatch
+from presence import PresenceBatcher
+from history import RoomHistory
+from search import SearchIndex
+from capture import KIND_CLOSE, KIND_LINE, KIND_OPEN, CaptureWriter
+from metrics import LatencyTracer, MessageTrace, RateMeter
+from profiler import SamplingProfiler
+from snapshot import load_snapshot, save_snapshot
+from wordfilter import WordFilter
 
 HOST = ""        # 모든 인터페이스
 PORT = 5005
@@ -53,6 +245,77 @@ STATE_REGISTERED = "REGISTERED"
 STATE_IN_ROOM = "IN_ROOM"
 STATE_TERMINATED = "TERMINATED"
 
+# 관리자 닉 목록 (main에서 --admin 옵션으로 채운다)
+ADMIN_NICKS: set[str] = set()
+PROFILE_DIR = "profiles"
+
+# 클라이언트가 요청할 수 있는 선택 기능
+CAP_SRV_TS = "SRV_TS"
+CAP_SEQ = "SEQ"
+SUPPORTED_CAPS = (CAP_SRV_TS, CAP_SEQ)
+
+# 스냅샷/재접속 설정 (main에서 옵션으로 덮어씀)
+SNAPSHOT_PATH: str | None = None
+SNAPSHOT_INTERVAL = 30.0  # 초
+RESUME_TTL = 60.0         # 재접속 토큰 유효 시간 (초)
+RESUME_BATCH = 256        # 재접속 처리 스레드가 락 한 번에 처리하는 최대 개수
+RESUME_BATCH_PAUSE = 0.005  # 꽉 찬 배치 사이 쉬는 시간 (채팅 처리가 락을 얻을 틈)
+RESUME_WAIT = 10.0        # 핸들러 스레드가 자기 RESUME 처리를 기다리는 최대 시간
+
+# 접속 처리 설정
+LISTEN_BACKLOG = 4096     # 커널 somaxconn 보다 크면 커널 값으로 잘린다
+MAX_CONNECTIONS = 10000
+SOCKET_PROFILE = sockopts.PROFILES["default"]  # --socket-profile
+
+# 무중단 재시작/drain 설정
+HANDOFF_QUIESCE_TIMEOUT = 5.0  # 핸들러가 멈추고 보내던 줄이 다 나가기를 기다리는 최대 시간 (초)
+HANDOFF_POLL = 0.01
+# 핸들러의 읽기 대기용: 연결마다 fd를 더 쓰지 않는 poll (없는 플랫폼은 select)
+HANDLER_SELECTOR = getattr(selectors, "PollSelector", selectors.SelectSelector)
+ACCEPT_POLL = 0.5              # accept 루프가 drain/handoff 플래그를 확인하는 주기 (초)
+DRAIN_TIMEOUT = 600.0          # drain 중 기존 연결이 끝나기를 기다리는 최대 시간 (초)
+
+# 빈 방 정리 (main에서 옵션으로 덮어씀)
+ROOM_RECLAIM_INTERVAL = 30.0  # 초, 0이면 정리하지 않음
+
+# 메시지 보관/검색 설정
+HISTORY_PER_ROOM = 200      # 방별 보관 메시지 수
+SEARCH_MAX_DOCS = 100_000   # 검색 색인 전체 문서 상한
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+FETCH_MAX = 500             # FETCH 한 번에 돌려주는 최대 번호 수
+
+# 팬아웃 상위 방/발신자 추적 설정
+HOT_CAPACITY = 64     # 추적하는 카운터 수 (이보다 작은 비중의 키는 근사치)
+HOT_WINDOW = 60.0     # 이 주기(초)마다 값을 반감
+HOT_TOP = 10          # STATS|hot 에 보여 줄 개수
+
+# 입장/퇴장 알림 (main에서 옵션으로 덮어씀)
+PRESENCE_WINDOW = 1.0          # 큰 방 알림을 모으는 시간 (초, 0이면 묶지 않음)
+PRESENCE_BATCH_MEMBERS = 50    # 이 인원 이상인 방은 묶어서 요약
+PRESENCE_MAX_MEMBERS = 1000    # 이 인원을 넘는 방은 알림 생략
+presence_suppressed = 0        # 생략한 알림 수 (근사값)
+
+# 멤버 목록 구독: 변경을 모아 보내는 주기 (main에서 옵션으로 덮어씀)
+MEMBER_WINDOW = 0.2
+
+# 연결별 메모리 한도 (main에서 옵션으로 덮어씀)
+MAX_LINE_BYTES = 8 * 1024        # 받는 한 줄 최대 크기
+MEM_SOFT = 256 * 1024            # in + out 합계 (바이트), 넘으면 메시지 버림/거절
+MEM_HARD = 1024 * 1024           # 넘으면 연결 종료
+SEND_TIMEOUT = 10.0              # 한 줄 전송이 이 시간(초) 안에 끝나지 않으면 연결 종료
+HISTORY_ROOM_BYTES = 1024 * 1024  # 방별 보관 메시지 바이트 상한
+MEM_TOP = 10                     # STATS|memory 에 보여 줄 개수
+
+# 큰 방 팬아웃 설정 (main에서 옵션으로 덮어씀)
+FANOUT_THRESHOLD = 200  # 이 인원 이상이면 전달 워커에 넘긴다
+FANOUT_WORKERS = 4
+FANOUT_QUEUE_MAX = 10_000  # 워커당 대기 작업 수, 차면 보내는 쪽이 기다린다
+
+
+# 연결마다 붙는 일련번호 (캡처/로그용)
+_conn_ids = itertools.count(1)
+
 
 class ClientInfo:
     """클라이언트 정보 저장용 클래스"""
@@ -60,309 +323,1129 @@ class ClientInfo:
     def __init__(self, sock: socket.socket, addr):
         self.sock = sock
         self.addr = addr
+        self.conn_id = next(_conn_ids)
         self.nick: str | None = None
         self.state: str = STATE_CONNECTED
         self.room: str | None = None
+        self.subs: dict[str, None] = {}  # 현재 방 외에 구독 중인 방 (구독 순서 유지)
+        self.caps: set[str] = set()
+        # 마지막 recv 시각 (지연 추적/SRV_TS 용)
+        self.recv_ts: float = 0.0     # time.monotonic()
+        self.recv_wall: float = 0.0   # time.time()
+        self.trace: MessageTrace | None = None
+        self.resume_token: str | None = None
+        # 무중단 재시작용: 아직 처리하지 않은 받은 바이트, 핸들러가 recv 없이 멈춰 있는지
+        self.partial = b""
+        self.parked = False
+        # 메모리 계정: 받는 중인 줄 바이트, 보내려고 기다리는 바이트, 한도 때문에 버린 메시지 수
+        self.in_bytes = 0
+        self.out_bytes = 0
+        self.dropped = 0
+        self.stalled = 0  # 마지막으로 전송을 끝낸 뒤 한도 때문에 버린 바이트
+        self.out_lock = threading.Lock()   # out_bytes/dropped/stalled 갱신용
+        self.send_lock = threading.Lock()  # 여러 스레드의 전달이 한 소켓에서 섞이지 않도록
+        # 보낼 차례를 기다리는 줄 (넣은 순서대로, send_lock을 잡은 스레드 하나가 꺼내 보낸다)
+        self.outq: deque[bytes] = deque()
 
 
 # 공유 데이터 구조 (접속자/닉/방 매핑을 모두 여기서 관리)
 clients_by_sock: dict[socket.socket, ClientInfo] = {}
 clients_by_nick: dict[str, ClientInfo] = {}
-rooms: dict[str, set[ClientInfo]] = {}
+# 멤버는 들어온 순서를 유지하는 dict (값은 항상 None), 방장 위임은 가장 먼저 들어온 사람에게
+rooms: dict[str, dict[ClientInfo, None]] = {}
 room_owner: dict[str, str] = {}  # room -> owner nick
+owned_rooms: dict[str, set[str]] = {}  # owner nick -> 방 목록 (room_owner 역색인)
+room_seq: dict[str, int] = {}    # room -> 지금까지 보낸 ROOM_MSG 수 (lock 보호)
+# room -> 번호 매기기/보관/대기 큐 넣기를 한 메시지씩 하게 하는 락 (표는 lock 보호, 잡는 순서는 이 락 → lock)
+room_order: dict[str, threading.Lock] = {}
+# 끊긴 클라이언트의 재접속 토큰: token -> (nick, room, 만료 시각(epoch), 끊길 때 room_seq)
+resume_tokens: dict[str, tuple[str, str | None, float, int | None]] = {}
+# 재접속 요청 큐: (client, token, 완료 이벤트), 처리 스레드가 없으면 호출 스레드에서 바로 처리
+resume_queue: "queue.Queue[tuple[ClientInfo, str, threading.Event]]" = queue.Queue()
+resume_worker_started = False
+
+# 무중단 재시작/drain 상태 플래그
+accept_paused = False      # accept 루프가 잠시 쉰다 (넘기는 중)
+handoff_requested = False  # 핸들러는 받은 바이트를 처리하지 않고 멈춘다
+# 넘기기를 시작할 때 한 바이트를 써서 읽기를 기다리는 핸들러를 깨운다 (취소할 때 다시 읽어 비운다)
+handoff_wake_r, handoff_wake_w = socket.socketpair()
+draining = False           # accept 루프를 끝내고 기존 연결이 끝나기를 기다린다
 
 lock = threading.Lock()
 
+# 방별 최근 메시지와 검색 색인 (각자 락 사용, 전역 lock과 무관)
+room_history = RoomHistory(HISTORY_PER_ROOM, HISTORY_ROOM_BYTES)
+search_index = SearchIndex(SEARCH_MAX_DOCS)
+
+# 실제 전송 수 기준 상위 방/발신자 (자체 락 사용)
+hot_rooms = SpaceSaving(HOT_CAPACITY, HOT_WINDOW)
+hot_senders = SpaceSaving(HOT_CAPACITY, HOT_WINDOW)
+
+# 샘플링 비율 0이면 추적하지 않음
+tracer = LatencyTracer()
+# 큰 방 전달 워커 풀 (main에서 start, 시작 전에는 항상 직접 전송)
+fanout = FanoutPool(
+    lambda c, text, srv_ts, seq: queue_line(c, with_extras(c, text, srv_ts, seq)),
+    lambda c, queued: flush_out(c),
+    FANOUT_WORKERS, FANOUT_QUEUE_MAX, finish_trace=tracer.finish,
+)
+# 멤버 목록 구독 (lock 안에서 갱신), 묶음 전송은 member_send_lock으로 한 번에 하나씩
+member_watch = MemberWatch()
+member_send_lock = threading.Lock()
+presence = PresenceBatcher(lambda room, text: broadcast_to_room(room, f"SYSTEM|INFO|{text}"), PRESENCE_WINDOW)
+
+# 필요할 때만 켜는 샘플링 프로파일러 (꺼져 있으면 스레드 없음)
+profiler = SamplingProfiler(PROFILE_DIR)
+
+# accept 루프 지표 (accept 스레드 하나만 갱신)
+accept_rate = RateMeter()
+accept_stats = {"refused": 0, "batches": 0, "max_batch": 0}
+reclaim_stats = {"rooms": 0, "tokens": 0, "runs": 0}
+
+# 트래픽 캡처 (--capture 지정 시에만 생성)
+capture: CaptureWriter | None = None
+
+# 메시지 본문 필터 파이프라인 (str -> str), 전달 직전에 순서대로 적용
+message_filters: list[Callable[[str], str]] = []
+word_filter: WordFilter | None = None
+
+
+def apply_message_filters(msg: str) -> str:
+    for f in message_filters:
+        msg = f(msg)
+    return msg
+
 
 def send_line(sock: socket.socket, text: str):
     """'\n' 붙여서 한 줄 메시지 전송"""
     try:
         sock.sendall((text + "\n").encode(ENCODING))
+    except TimeoutError:
+        # 읽지 않는 상대: 줄이 반쯤 나갔을 수 있으므로 끊는다 (핸들러가 깨어나 정리)
+        print("send_line 에러: timed out")
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
     except Exception as e:
         print("send_line 에러:", e)
 
 
-def broadcast_to_room(room: str, text: str, exclude: ClientInfo | None = None):
-    """특정 방의 모든 클라이언트에게 메시지 전송 (exclude는 제외)"""
-    with lock:
-        members = rooms.get(room, set()).copy()
-    for c in members:
-        if exclude is not None and c.sock is exclude.sock:
-            continue
-        send_line(c.sock, text)
+def memory_usage(client: ClientInfo) -> int:
+    """연결 하나가 차지하는 바이트 (받는 중 + 보낼 대기 + 보관 메시지, STATS 표시용)"""
+    return client.in_bytes + client.out_bytes + room_history.nick_bytes(client.nick)
+
+
+def reserve_line(client: ClientInfo, text: str) -> bytes | None:
+    """
+    보낼 한 줄을 out_bytes에 잡고 바이트로 반환 (flush_out이 보내고 푼다).
+
+    앞선 전송(대기 큐에 들어간 것 포함)이 밀려 있을 때만 한도를 확인해서, soft를 넘으면
+    이 줄을 버리고(None) 마지막 전송 이후 버린 바이트까지 더해 hard를 넘으면 연결을 끊는다.
+    """
+    data = (text + "\n").encode(ENCODING)
+    size = len(data)
+    with client.out_lock:
+        if not client.out_bytes:
+            client.out_bytes = size
+            return data
+        usage = client.in_bytes + client.out_bytes + size
+        if usage + client.stalled <= MEM_HARD:
+            if usage <= MEM_SOFT:
+                client.out_bytes += size
+                return data
+            client.dropped += 1
+            client.stalled += size
+            return None
+    disconnect_client(client, "outbound over hard limit")
+    return None
+
+
+def queue_line(client: ClientInfo, text: str) -> bytes | None:
+    """한도 안이면 client의 대기 큐 끝에 넣고 그 바이트를 반환 (보내기는 flush_out, 버렸으면 None)"""
+    data = reserve_line(client, text)
+    if data is not None:
+        client.outq.append(data)
+    return data
+
+
+def flush_out(client: ClientInfo):
+    """
+    client의 대기 큐를 넣은 순서대로 보낸다.
+
+    다른 스레드가 이미 보내는 중이면 그 스레드가 이 줄까지 이어서 보내므로 바로 돌아온다.
+    (느린 수신자 하나 때문에 여러 스레드가 줄 서지 않게, 막혀도 SEND_TIMEOUT까지)
+    보내는 스레드가 큐를 비우고 락을 놓는 사이에 들어온 줄은 바깥 루프가 다시 확인한다.
+    """
+    outq = client.outq
+    while outq:
+        if not client.send_lock.acquire(blocking=False):
+            return
+        try:
+            while outq:
+                data = outq.popleft()
+                if not send_queued(client, data):
+                    # 끊긴 연결: 남은 줄은 보내지 않고 잡아 둔 바이트만 푼다
+                    while outq:
+                        release_out(client, len(outq.popleft()), False)
+        finally:
+            client.send_lock.release()
+
+
+def send_queued(client: ClientInfo, data: bytes) -> bool:
+    """대기 큐에서 꺼낸 한 줄 전송 (send_lock을 잡은 상태에서 호출)"""
+    sent = False
+    try:
+        client.sock.sendall(data)
+        sent = True
+    except TimeoutError:
+        # SEND_TIMEOUT 동안 한 줄도 다 못 보냈으면 보내는 스레드를 더 붙잡지 않게 끊는다
+        disconnect_client(client, "send timed out")
+    except Exception as e:
+        print("send_line 에러:", e)
+    finally:
+        release_out(client, len(data), sent)
+    return sent
 
 
-def send_error(client: ClientInfo, code: str, msg: str):
-    send_line(client.sock, f"ERROR|{code}|{msg}")
+def release_out(client: ClientInfo, size: int, sent: bool):
+    with client.out_lock:
+        client.out_bytes -= size
+        if sent:
+            client.stalled = 0
 
-    """TYPE 0: Control 처리 (닉/방 생성/입장/삭제/퇴장/종료)"""
-def handle_control(client: ClientInfo, subtype: str, fields: list[str]):
-    
-    global clients_by_nick, rooms, room_owner
 
-    if subtype == "NICK":
-        # 닉 등록/변경 (중복 닉 방지, 방 소유자 닉 갱신)
-        if len(fields) != 1: #닉은 1개의 필드가 필요함
-            return send_error(client, "BAD_FORMAT", "NICK requires 1 field")
+def deliver(client: ClientInfo, text: str):
+    """방/DM 메시지 한 줄 전달 (메모리 계정 포함, 한도를 넘으면 버리거나 연결을 끊는다)"""
+    if queue_line(client, text) is not None:
+        flush_out(client)
 
-        nick = fields[0].strip()
-        if not nick:
-            return send_error(client, "BAD_FORMAT", "Empty nick not allowed")
 
-        old_nick = client.nick
-        with lock:
-            if nick in clients_by_nick and clients_by_nick[nick].sock is not client.sock:
-                # 닉 중복 사용시 에러
-                return send_error(client, "NICK_IN_USE", "Nick already in use")
+def disconnect_client(client: ClientInfo, reason: str):
+    """메모리 한도 초과/전송 시간 초과 연결 종료 (핸들러 스레드의 recv가 깨어나 정리한다)"""
+    print(f"[MEM] {client.nick or client.addr} disconnected: {reason}")
+    try:
+        client.sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
 
-            # 기존 닉 제거
-            if client.nick in clients_by_nick:
-                del clients_by_nick[client.nick]
 
-            client.nick = nick
-            clients_by_nick[nick] = client
-            if client.state == STATE_CONNECTED:
-                client.state = STATE_REGISTERED
-            # 방 소유자 닉 변경 반영
-            for room, owner in list(room_owner.items()):
-                if owner == old_nick:
-                    room_owner[room] = nick
-        # 성공 응답
-        send_line(client.sock, f"NICK_OK|{nick}")
-        print(f"[NICK] {client.addr} -> {nick}")
+def with_extras(client: ClientInfo, text: str, srv_ts: float | None, seq: int | None = None) -> str:
+    """선택 기능(SRV_TS/SEQ)을 요청한 클라이언트에게만 서버 수신 시각/방 번호 필드를 덧붙인다"""
+    if not client.caps:
+        return text
+    if srv_ts is not None and CAP_SRV_TS in client.caps:
+        text = f"{text}|srv_ts={srv_ts:.6f}"
+    if seq is not None and CAP_SEQ in client.caps:
+        text = f"{text}|seq={seq}"
+    return text
+
+
+def broadcast_to_room(
+    room: str,
+    text: str,
+    exclude: ClientInfo | None = None,
+    trace: MessageTrace | None = None,
+    srv_ts: float | None = None,
+    seq: int | None = None,
+    sender: ClientInfo | None = None,
+    flush: bool = True,
+) -> list[ClientInfo]:
+    """
+    특정 방의 모든 클라이언트에게 메시지 전송 (exclude는 제외, seq는 SEQ 기능을 켠 사람에게만 붙는 번호)
+
+    줄은 먼저 수신자마다 대기 큐에 넣으므로(queue_line) 수신자가 받는 순서는 넣은 순서다.
+    멤버가 FANOUT_THRESHOLD 이상이고 전달 워커가 떠 있으면 보내는 쪽 스레드는
+    sender 자신의 사본만 직접 보내고 나머지는 워커가 보내게 넘긴 뒤 바로 돌아온다.
+    (자기 메시지 에코가 다음 명령 응답보다 늦게 가지 않도록)
+    풀로 넘긴 trace의 "send"는 마지막 워커가 다 보낸 시각에 찍힌다.
+    flush=False면 큐에 넣기까지만 하고 직접 보낼 수신자 목록을 돌려주므로, 호출한 쪽이
+    (잡고 있던 락을 놓은 뒤) flush_out 하고 trace "send"를 찍는다.
+    보낸 줄 수는 방(그리고 sender가 있으면 발신자) 팬아웃 카운터에 더한다.
+    """
+    with lock:
+        if trace is not None:
+            trace.mark("lock")
+        members = rooms.get(room, {}).copy()
+    if exclude is not None:
+        members.pop(exclude, None)
+    if trace is not None:
+        trace.mark("enqueue")
+    sent = len(members)
+    queued = []
+    if fanout.running and sent >= FANOUT_THRESHOLD:
+        if sender is not None and sender in members:
+            del members[sender]
+            if queue_line(sender, with_extras(sender, text, srv_ts, seq)) is not None:
+                queued.append(sender)
+        fanout.submit(room, members, text, srv_ts, seq, trace)
+    else:
+        for c in members:
+            if queue_line(c, with_extras(c, text, srv_ts, seq)) is not None:
+                queued.append(c)
+    if flush:
+        for c in queued:
+            flush_out(c)
+        if trace is not None and not trace.deferred:
+            trace.mark("send")
+    if sent:
+        hot_rooms.update(room, sent)
+        if sender is not None:
+            hot_senders.update(sender.nick or "", sent)
+    return queued
+
+
+def set_room_owner(room: str, nick: str):
+    """방장 지정 + 역색인 갱신 (lock 안에서 호출)"""
+    clear_room_owner(room)
+    room_owner[room] = nick
+    owned_rooms.setdefault(nick, set()).add(room)
+    member_watch.owner_changed(room, nick)
+
+
+def clear_room_owner(room: str):
+    """방장 제거 + 역색인 갱신 (lock 안에서 호출)"""
+    owner = room_owner.pop(room, None)
+    if owner is None:
         return
+    member_watch.owner_changed(room, "")
+    owned = owned_rooms.get(owner)
+    if owned is not None:
+        owned.discard(room)
+        if not owned:
+            del owned_rooms[owner]
+
+
+def pass_room_owner(room: str):
+    """남은 멤버 중 가장 먼저 들어온 사람에게 방장 위임, 아무도 없으면 방장 제거 (lock 안에서 호출)"""
+    first = next(iter(rooms.get(room, ())), None)
+    if first is not None:
+        set_room_owner(room, first.nick or "")
+    else:
+        clear_room_owner(room)
 
-    if subtype == "CREATE_ROOM":
-        # 새 방 생성 후 즉시 입장
-        if len(fields) != 1:
-            return send_error(client, "BAD_FORMAT", "CREATE_ROOM requires room name")
 
-        room = fields[0].strip()
-        if client.state not in (STATE_REGISTERED, STATE_IN_ROOM):
-            return send_error(client, "INVALID_STATE", "Need REGISTERED state")
+def announce_presence(room: str, text: str, nicks: list[str], joined: bool, exclude: ClientInfo | None = None):
+    """
+    입장/퇴장 알림. 작은 방은 text를 바로 보내고, 큰 방은 presence에 모았다가 요약 한 줄로,
+    아주 큰 방은 보내지 않는다 (락 밖에서 호출).
+    """
+    global presence_suppressed
+    with lock:
+        size = len(rooms.get(room, ()))
+    if size > PRESENCE_MAX_MEMBERS:
+        presence_suppressed += len(nicks)
+    elif size >= PRESENCE_BATCH_MEMBERS and presence.running:
+        presence.add(room, nicks, joined)
+    else:
+        broadcast_to_room(room, f"SYSTEM|INFO|{text}", exclude=exclude)
+
+
+def leave_room(client: ClientInfo, room: str):
+    """
+    client를 room 멤버에서 빼고 필요하면 방장 위임 (lock 안에서 호출).
+    현재 방이었다면 가장 먼저 구독한 방을 현재 방으로, 없으면 방 밖(REGISTERED)으로.
+    """
+    members = rooms.get(room)
+    if members is not None and client in members:
+        del members[client]
+        member_watch.changed(room, client.nick, False)
+    if room_owner.get(room) == client.nick:
+        pass_room_owner(room)
+    if client.room != room:
+        client.subs.pop(room, None)
+    elif client.subs:
+        client.room = next(iter(client.subs))
+        del client.subs[client.room]
+    else:
+        client.room = None
+        if client.state != STATE_TERMINATED:
+            client.state = STATE_REGISTERED
 
-        if not room:
-            return send_error(client, "INVALID_ROOM_NAME", "Empty room name")
 
-        with lock:
-            if room in rooms:
-                return send_error(client, "ROOM_ALREADY_EXISTS", "Room already exists")
-
-            # 새 방 생성
-            rooms[room] = set()
-            room_owner[room] = client.nick or ""
-            # 기존 방에서 제거
-            if client.room and client in rooms.get(client.room, set()):
-                rooms[client.room].discard(client)
-            client.room = room
-            client.state = STATE_IN_ROOM
-            rooms[room].add(client)
+def send_error(client: ClientInfo, code: str, msg: str):
+    send_line(client.sock, f"ERROR|{code}|{msg}")
 
-        send_line(client.sock, f"CREATE_ROOM_OK|{room}")
-        print(f"[ROOM] {client.nick} created {room}")
-        # 방에 들어왔다는 SYSTEM 메시지 브로드캐스트 (나 자신 제외)
-        broadcast_to_room(room, f"SYSTEM|INFO|{client.nick} 님이 방을 생성하고 입장했습니다.", exclude=client)
-        return
 
-    if subtype == "JOIN":
-        # 다른 방으로 이동하거나 입장
-        if len(fields) != 1:
-            return send_error(client, "BAD_FORMAT", "JOIN requires room name")
+def is_admin(client: ClientInfo) -> bool:
+    return client.nick is not None and client.nick in ADMIN_NICKS
+
+
+class Command:
+    """
+    (TYPE, SUBTYPE) 하나에 대한 명령 정의.
+
+    arity       : 필드 수. int면 정확히 그 개수, (최소, 최대)면 범위, None이면 검사 안 함
+    states      : 허용 상태 (None이면 검사 안 함), 아니면 state_error 로 응답
+    pre_nick    : 닉 설정 전(CONNECTED)에도 허용하는지
+    state_first : 형식 검사보다 상태 검사를 먼저 할지 (채팅 계열)
+    calls/total_ns : 호출 횟수/누적 처리 시간 (스레드 간 경합 시 근사값)
+    """
+
+    __slots__ = (
+        "type_str", "subtype", "handler", "arity", "format_error", "states", "state_error",
+        "pre_nick", "state_first", "admin", "traced", "calls", "total_ns",
+    )
+
+    def __init__(self, type_str, subtype, handler, arity, format_error, states, state_error,
+                 pre_nick, state_first, admin, traced):
+        self.type_str = type_str
+        self.subtype = subtype
+        self.handler = handler
+        if isinstance(arity, int):
+            arity = (arity, arity)
+        self.arity = arity
+        self.format_error = format_error or f"{subtype} takes {arity} fields"
+        self.states = states
+        self.state_error = state_error
+        self.pre_nick = pre_nick
+        self.state_first = state_first
+        self.admin = admin
+        self.traced = traced
+        self.calls = 0
+        self.total_ns = 0
+
+    def check(self, client: ClientInfo, fields: list[str]) -> tuple[str, str] | None:
+        """검증 실패 시 (에러 코드, 메시지), 통과하면 None"""
+        if self.admin and not is_admin(client):
+            return "PERMISSION_DENIED", "Admin only"
+        arity = self.arity
+        bad_format = arity is not None and not arity[0] <= len(fields) <= arity[1]
+        bad_state = self.states is not None and client.state not in self.states
+        if not (bad_format or bad_state):
+            return None
+        if bad_state and (self.state_first or not bad_format):
+            return self.state_error
+        return "BAD_FORMAT", self.format_error
+
+
+# (TYPE 문자열, SUBTYPE) -> Command. 한 번의 dict 조회로 분배한다.
+COMMANDS: dict[tuple[str, str], Command] = {}
+TYPE_NAMES = {0: "control", 1: "chat", 2: "info"}
+
+NEED_ROOM = ((STATE_IN_ROOM,), ("NOT_IN_ROOM", "You must be in a room"))
+NEED_REGISTERED = ((STATE_REGISTERED, STATE_IN_ROOM), ("INVALID_STATE", "Need REGISTERED state"))
+
+
+def command(type_str: str, subtype: str, arity=None, format_error: str | None = None,
+            require=(None, None), pre_nick: bool = False, state_first: bool = False,
+            admin: bool = False, traced: bool = False):
+    """명령 처리 함수를 COMMANDS에 등록하는 데코레이터"""
+    states, state_error = require
+
+    def register(handler):
+        COMMANDS[(type_str, subtype)] = Command(
+            type_str, subtype, handler, arity, format_error, states, state_error,
+            pre_nick, state_first, admin, traced,
+        )
+        return handler
+    return register
+
+
+# ---------------------------------------------------------------------------
+# TYPE 0: Control 처리 (닉/방 생성/입장/삭제/퇴장/종료)
+# ---------------------------------------------------------------------------
+
+@command("0", "CAPS", arity=1, format_error="CAPS requires cap list", pre_nick=True)
+def cmd_caps(client: ClientInfo, fields: list[str]):
+    # 선택 기능 협상: 지원하는 것만 켜고 실제로 켜진 목록을 응답
+    requested = {c.strip().upper() for c in fields[0].split(",") if c.strip()}
+    client.caps = {c for c in SUPPORTED_CAPS if c in requested}
+    send_line(client.sock, f"CAPS_OK|{','.join(sorted(client.caps))}")
+
+
+@command("0", "NICK", arity=1, format_error="NICK requires 1 field", pre_nick=True)
+def cmd_nick(client: ClientInfo, fields: list[str]):
+    # 닉 등록/변경 (중복 닉 방지, 방 소유자 닉 갱신)
+    nick = fields[0].strip()
+    if not nick:
+        return send_error(client, "BAD_FORMAT", "Empty nick not allowed")
+
+    old_nick = client.nick
+    with lock:
+        if nick in clients_by_nick and clients_by_nick[nick].sock is not client.sock:
+            # 닉 중복 사용시 에러
+            return send_error(client, "NICK_IN_USE", "Nick already in use")
 
-        room = fields[0].strip()
-        # REGISTERED이거나 이미 다른 방(IN_ROOM)에 있어도 이동 가능
-        if client.state not in (STATE_REGISTERED, STATE_IN_ROOM):
-            return send_error(client, "INVALID_STATE", "Need REGISTERED state")
+        # 기존 닉 제거
+        if client.nick in clients_by_nick:
+            del clients_by_nick[client.nick]
 
-        # 이미 같은 방에 있으면 상태 변경/브로드캐스트 없이 즉시 OK 응답
-        if client.state == STATE_IN_ROOM and client.room == room:
-            return send_line(client.sock, f"JOIN_OK|{room}")
+        client.nick = nick
+        clients_by_nick[nick] = client
+        if client.state == STATE_CONNECTED:
+            client.state = STATE_REGISTERED
+        if old_nick != nick:
+            for room in [client.room, *client.subs]:
+                if room:
+                    member_watch.changed(room, old_nick, False)
+                    member_watch.changed(room, nick, True)
+        # 방 소유자 닉 변경 반영 (역색인으로 이 사람이 방장인 방만)
+        owned = owned_rooms.pop(old_nick, None) if old_nick else None
+        if owned:
+            for room in owned:
+                room_owner[room] = nick
+                member_watch.owner_changed(room, nick)
+            owned_rooms.setdefault(nick, set()).update(owned)
+    # 성공 응답
+    send_line(client.sock, f"NICK_OK|{nick}")
+    if client.resume_token is None:
+        # 재접속용 토큰은 처음 닉을 정할 때 한 번만 발급
+        client.resume_token = secrets.token_urlsafe(12)
+        send_line(client.sock, f"RESUME_TOKEN|{client.resume_token}")
+    print(f"[NICK] {client.addr} -> {nick}")
+
+
+@command("0", "RESUME", arity=1, format_error="RESUME requires token", pre_nick=True,
+         require=((STATE_CONNECTED,), ("INVALID_STATE", "RESUME only allowed before NICK")))
+def cmd_resume(client: ClientInfo, fields: list[str]):
+    # 끊기기 전(또는 서버 재시작 전)의 닉/방 복구
+    token = fields[0].strip()
+    if not resume_worker_started:
+        return process_resumes([(client, token, None)])
+    # 처리 스레드에 넘기고, 같은 연결의 다음 명령이 앞지르지 않도록 끝날 때까지 기다린다
+    done = threading.Event()
+    resume_queue.put((client, token, done))
+    if not done.wait(RESUME_WAIT):
+        send_error(client, "RESUME_FAILED", "Resume timed out")
+
+
+def process_resumes(batch: list):
+    """RESUME 요청 여러 개를 락 한 번으로 처리하고, 응답/입장 알림은 락 밖에서 보낸다"""
+    now = time.time()
+    replies = []                              # (client, 응답 줄)
+    joined: dict[str, list[ClientInfo]] = {}  # room -> 복귀한 클라이언트
+    with lock:
+        for client, token, _ in batch:
+            entry = resume_tokens.pop(token, None)
+            if entry is None or entry[2] < now:
+                replies.append((client, "ERROR|RESUME_FAILED|Unknown or expired token"))
+                continue
+            nick, room, _, seen_seq = entry
+            if nick in clients_by_nick:
+                # 그 사이 다른 사람이 닉을 가져갔으면 토큰은 그대로 둔다
+                resume_tokens[token] = entry
+                replies.append((client, "ERROR|NICK_IN_USE|Nick already in use"))
+                continue
 
-        prev_room = client.room
-        with lock:
-            if room not in rooms:
-                return send_error(client, "NO_SUCH_ROOM", "Room does not exist")
+            client.nick = nick
+            client.resume_token = token
+            clients_by_nick[nick] = client
+            client.state = STATE_REGISTERED
+            missed = 0
+            if room is not None and room in rooms:
+                client.room = room
+                client.state = STATE_IN_ROOM
+                rooms[room][client] = None
+                member_watch.changed(room, nick, True)
+                joined.setdefault(room, []).append(client)
+                if seen_seq is not None:
+                    # 방이 지워졌다 다시 생겨 번호가 줄었으면 0
+                    missed = max(0, room_seq.get(room, 0) - seen_seq)
+            else:
+                room = None
+            replies.append((client, f"RESUME_OK|{nick}|{room or ''}|{missed}"))
+
+    for client, text in replies:
+        send_line(client.sock, text)
+        if text.startswith("RESUME_OK|"):
+            print(f"[RESUME] {client.addr} -> {client.nick} ({client.room})")
+    for room, members in joined.items():
+        # 한 명이면 본인 제외, 여러 명이 함께 돌아오면 본인들도 같은 한 줄을 받는다
+        exclude = members[0] if len(members) == 1 else None
+        announce_presence(room, join_notice(members), [c.nick or "" for c in members], True, exclude=exclude)
+    for _, _, done in batch:
+        if done is not None:
+            done.set()
+
+
+def join_notice(members: list[ClientInfo]) -> str:
+    """복귀한 사람들을 한 줄로 묶은 입장 알림 (많으면 앞 몇 명만 이름 표시)"""
+    names = [c.nick or "" for c in members]
+    if len(names) == 1:
+        return f"{names[0]} 님이 방에 입장했습니다."
+    shown = ", ".join(names[:5])
+    more = f" 외 {len(names) - 5}명" if len(names) > 5 else ""
+    return f"{shown}{more} 님이 다시 접속했습니다."
+
+
+def resume_worker():
+    """RESUME 큐를 RESUME_BATCH개씩 묶어 처리 (데몬 스레드)"""
+    while True:
+        batch = [resume_queue.get()]
+        while len(batch) < RESUME_BATCH:
+            try:
+                batch.append(resume_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            process_resumes(batch)
+        except Exception as e:
+            print("재접속 처리 에러:", e)
+            for _, _, done in batch:
+                done.set()
+        if len(batch) == RESUME_BATCH:
+            time.sleep(RESUME_BATCH_PAUSE)
+
+
+@command("0", "CREATE_ROOM", arity=1, format_error="CREATE_ROOM requires room name", require=NEED_REGISTERED)
+def cmd_create_room(client: ClientInfo, fields: list[str]):
+    # 새 방 생성 후 즉시 입장
+    room = fields[0].strip()
+    if not room:
+        return send_error(client, "INVALID_ROOM_NAME", "Empty room name")
 
-            # 기존 방에서 제거
-            if client.room and client in rooms.get(client.room, set()):
-                rooms[client.room].discard(client)
+    with lock:
+        if room in rooms:
+            return send_error(client, "ROOM_ALREADY_EXISTS", "Room already exists")
+
+        # 새 방 생성
+        rooms[room] = {}
+        set_room_owner(room, client.nick or "")
+        # 기존 방에서 제거 (구독 중인 방은 유지)
+        prev_members = rooms.get(client.room) if client.room else None
+        if prev_members is not None and client in prev_members:
+            del prev_members[client]
+            member_watch.changed(client.room, client.nick, False)
+        client.room = room
+        client.state = STATE_IN_ROOM
+        rooms[room][client] = None
+
+    send_line(client.sock, f"CREATE_ROOM_OK|{room}")
+    print(f"[ROOM] {client.nick} created {room}")
+    # 방에 들어왔다는 SYSTEM 메시지 브로드캐스트 (나 자신 제외)
+    broadcast_to_room(room, f"SYSTEM|INFO|{client.nick} 님이 방을 생성하고 입장했습니다.", exclude=client)
+
+
+@command("0", "JOIN", arity=1, format_error="JOIN requires room name", require=NEED_REGISTERED)
+def cmd_join(client: ClientInfo, fields: list[str]):
+    # 다른 방으로 이동하거나 입장 (REGISTERED이거나 이미 다른 방(IN_ROOM)에 있어도 이동 가능)
+    room = fields[0].strip()
+
+    # 이미 같은 방에 있으면 상태 변경/브로드캐스트 없이 즉시 OK 응답
+    if client.state == STATE_IN_ROOM and client.room == room:
+        return send_line(client.sock, f"JOIN_OK|{room}")
+
+    prev_room = client.room
+    with lock:
+        if room not in rooms:
+            return send_error(client, "NO_SUCH_ROOM", "Room does not exist")
+
+        # 기존 방에서 제거 (구독 중인 방은 유지)
+        prev_members = rooms.get(client.room) if client.room else None
+        if prev_members is not None and client in prev_members:
+            del prev_members[client]
+            member_watch.changed(client.room, client.nick, False)
+
+        # 구독 중이던 방이면 이미 멤버이므로 현재 방으로 바꾸기만 한다
+        subscribed = room in client.subs
+        client.subs.pop(room, None)
+        client.room = room
+        client.state = STATE_IN_ROOM
+        rooms[room][client] = None
+        if not subscribed:
+            member_watch.changed(room, client.nick, True)
+
+    send_line(client.sock, f"JOIN_OK|{room}")
+    print(f"[ROOM] {client.nick} joined {room}")
+    if prev_room and prev_room != room:
+        # 이전 방에 있던 멤버들에게 퇴장 알림
+        announce_presence(prev_room, f"{client.nick} 님이 방을 나갔습니다.", [client.nick], False, exclude=client)
+    if not subscribed:
+        announce_presence(room, f"{client.nick} 님이 방에 입장했습니다.", [client.nick], True, exclude=client)
+
+
+@command("0", "SUB", arity=1, format_error="SUB requires room name", require=NEED_REGISTERED)
+def cmd_sub(client: ClientInfo, fields: list[str]):
+    # 현재 방은 그대로 두고 room의 메시지도 받기 (현재 방이 없으면 그 방이 현재 방)
+    room = fields[0].strip()
+    with lock:
+        if room not in rooms:
+            return send_error(client, "NO_SUCH_ROOM", "Room does not exist")
+        already = client in rooms[room]
+        if not already:
+            rooms[room][client] = None
+            member_watch.changed(room, client.nick, True)
+            if client.room is None:
+                client.room = room
+                client.state = STATE_IN_ROOM
+            else:
+                client.subs[room] = None
 
-            client.room = room
-            client.state = STATE_IN_ROOM
-            rooms[room].add(client)
-
-        send_line(client.sock, f"JOIN_OK|{room}")
-        print(f"[ROOM] {client.nick} joined {room}")
-        if prev_room and prev_room != room:
-            # 이전 방에 있던 멤버들에게 퇴장 알림
-            broadcast_to_room(prev_room, f"SYSTEM|INFO|{client.nick} 님이 방을 나갔습니다.", exclude=client)
-        broadcast_to_room(room, f"SYSTEM|INFO|{client.nick} 님이 방에 입장했습니다.", exclude=client)
-        return
+    send_line(client.sock, f"SUB_OK|{room}")
+    if not already:
+        print(f"[ROOM] {client.nick} subscribed {room}")
+        announce_presence(room, f"{client.nick} 님이 방에 입장했습니다.", [client.nick], True, exclude=client)
 
-    if subtype == "DELETE_ROOM":
-        # 현재 방을 삭제하고 모든 멤버를 REGISTERED 상태로 돌린다.
-        if client.state != STATE_IN_ROOM or client.room is None:
-            return send_error(client, "NOT_IN_ROOM", "You must be in a room")
 
-        room = client.room
-        transfer_target_nick: str | None = None
-        had_members = False
-        with lock:
-            owner_nick = room_owner.get(room)
-            if owner_nick != client.nick:
-                return send_error(client, "INVALID_STATE", "Only room creator can delete this room")
-            members = list(rooms.get(room, set()))
-            others = [c for c in members if c.sock is not client.sock]
-            if others:
-                # 다른 멤버가 있으면 삭제 대신 방장 권한을 랜덤으로 위임하고, 요청자는 방에서 나간다.
-                had_members = True
-                target = random.choice(others)
-                transfer_target_nick = target.nick or ""
-                rooms[room].discard(client)
-                client.room = None
-                if client.state != STATE_TERMINATED:
-                    client.state = STATE_REGISTERED
-                room_owner[room] = transfer_target_nick
-            else:
-                # 남은 인원이 없으면 방 삭제
-                if room in rooms:
-                    del rooms[room]
-                if room in room_owner:
-                    del room_owner[room]
-                for c in members:
-                    c.room = None
-                    if c.state != STATE_TERMINATED:
-                        c.state = STATE_REGISTERED
-
-        if had_members:
-            # 요청자에게 안내하고, 남은 멤버에게 방장 위임 사실 알림
-            send_line(client.sock, f"SYSTEM|INFO|방에 다른 인원이 있어 삭제 대신 {transfer_target_nick} 님에게 방장 권한을 넘겼습니다.")
-            send_line(client.sock, f"LEAVE_OK|{room}")
-            # 남은 멤버에게는 방 유지 + 방장 변경 사실만 알린다 (클라이언트가 방 상태를 유지하도록 '나갔습니다' 문구 피함)
-            broadcast_to_room(room, f"SYSTEM|INFO|{client.nick} 님이 방장을 {transfer_target_nick} 님에게 넘기고 방에서 나갔지만 방은 유지됩니다.", exclude=client)
-            print(f"[ROOM] {client.nick} transferred ownership of {room} to {transfer_target_nick} and left")
-        else:
-            # 알림은 락 밖에서 전송
-            for c in members:
-                if c.sock is client.sock:
-                    send_line(c.sock, f"DELETE_ROOM_OK|{room}")
-                else:
-                    # 다른 멤버도 방이 사라졌음을 알리고 상태 초기화 힌트 제공
-                    send_line(c.sock, f"SYSTEM|INFO|{client.nick} 님이 방을 삭제했고 방이 사라져 나갔습니다.")
-            print(f"[ROOM] {client.nick} deleted {room}")
-        return
+@command("0", "UNSUB", arity=1, format_error="UNSUB requires room name", require=NEED_ROOM)
+def cmd_unsub(client: ClientInfo, fields: list[str]):
+    # 구독 해제 (현재 방이면 LEAVE와 같고, 다음 구독 방이 현재 방이 된다)
+    room = fields[0].strip()
+    with lock:
+        if room != client.room and room not in client.subs:
+            return send_error(client, "NOT_IN_ROOM", "Not subscribed to that room")
+        leave_room(client, room)
 
-    if subtype == "LEAVE":
-        # 현재 방에서 나와 REGISTERED 상태로 전환
-        if client.state != STATE_IN_ROOM or client.room is None:
-            return send_error(client, "NOT_IN_ROOM", "You must be in a room")
+    send_line(client.sock, f"UNSUB_OK|{room}")
+    announce_presence(room, f"{client.nick} 님이 방을 나갔습니다.", [client.nick], False, exclude=client)
 
-        with lock:
-            room = client.room
-            if room in rooms:
-                rooms[room].discard(client)
-            # 방장이 나가면 남은 첫 사람에게 소유권 위임, 없으면 제거
-            if room_owner.get(room) == client.nick:
-                remaining = list(rooms.get(room, set()))
-                if remaining:
-                    room_owner[room] = remaining[0].nick or ""
-                else:
-                    room_owner.pop(room, None)
-            client.room = None
-            client.state = STATE_REGISTERED
 
-        send_line(client.sock, f"LEAVE_OK|{room}")
-        broadcast_to_room(room, f"SYSTEM|INFO|{client.nick} 님이 방을 나갔습니다.", exclude=client)
-        return
+@command("0", "DELETE_ROOM", require=NEED_ROOM)
+def cmd_delete_room(client: ClientInfo, fields: list[str]):
+    # 현재 방을 삭제하고 모든 멤버를 REGISTERED 상태로 돌린다.
+    room = client.room
+    transfer_target_nick: str | None = None
+    had_members = False
+    with lock:
+        owner_nick = room_owner.get(room)
+        if owner_nick != client.nick:
+            return send_error(client, "INVALID_STATE", "Only room creator can delete this room")
+        members = rooms.get(room, {})
+        if len(members) > (client in members):
+            # 다른 멤버가 있으면 삭제 대신 가장 오래 있던 멤버에게 방장 권한을 위임하고, 요청자는 방에서 나간다.
+            # members에서 직접 빼지 않아야 leave_room이 요청자의 퇴장(MEMBER_DEL)을 기록한다.
+            had_members = True
+            target = next(c for c in members if c is not client)
+            transfer_target_nick = target.nick or ""
+            set_room_owner(room, transfer_target_nick)
+            leave_room(client, room)
+        else:
+            # 남은 인원이 없으면 방 삭제
+            members = list(rooms.pop(room, ()))
+            clear_room_owner(room)
+            room_seq.pop(room, None)
+            room_order.pop(room, None)
+            for c in members:
+                leave_room(c, room)
+            watchers = member_watch.drop_room(room)
 
-    if subtype == "QUIT":
-        # 클라이언트 종료 로직은 handle_client 안에서 공통 처리
-        send_line(client.sock, "SYSTEM|INFO|Bye")
-        # 이후 실제 정리는 루프 밖에서
-        client.state = STATE_TERMINATED
-        try:
-            client.sock.shutdown(socket.SHUT_RDWR)
-        except Exception:
-            pass
-        client.sock.close()
-        return
+    if had_members:
+        # 요청자에게 안내하고, 남은 멤버에게 방장 위임 사실 알림
+        send_line(client.sock, f"SYSTEM|INFO|방에 다른 인원이 있어 삭제 대신 {transfer_target_nick} 님에게 방장 권한을 넘겼습니다.")
+        send_line(client.sock, f"LEAVE_OK|{room}")
+        # 남은 멤버에게는 방 유지 + 방장 변경 사실만 알린다 (클라이언트가 방 상태를 유지하도록 '나갔습니다' 문구 피함)
+        broadcast_to_room(room, f"SYSTEM|INFO|{client.nick} 님이 방장을 {transfer_target_nick} 님에게 넘기고 방에서 나갔지만 방은 유지됩니다.", exclude=client)
+        print(f"[ROOM] {client.nick} transferred ownership of {room} to {transfer_target_nick} and left")
+    else:
+        # 알림은 락 밖에서 전송
+        for c in members:
+            if c.sock is client.sock:
+                send_line(c.sock, f"DELETE_ROOM_OK|{room}")
+            else:
+                # 다른 멤버도 방이 사라졌음을 알리고 상태 초기화 힌트 제공
+                send_line(c.sock, f"SYSTEM|INFO|{client.nick} 님이 방을 삭제했고 방이 사라져 나갔습니다.")
+        for c in watchers:
+            deliver(c, f"WATCH_END|{room}")
+        room_history.drop(room)
+        search_index.forget_room(room)
+        print(f"[ROOM] {client.nick} deleted {room}")
+
+
+@command("0", "LEAVE", require=NEED_ROOM)
+def cmd_leave(client: ClientInfo, fields: list[str]):
+    # 현재 방에서 나와 REGISTERED 상태로 전환
+    with lock:
+        room = client.room
+        # 방장이 나가면 남은 첫 사람에게 소유권 위임, 없으면 제거 (구독 중인 방이 있으면 그 방으로)
+        leave_room(client, room)
 
-    # 알 수 없는 SUBTYPE
-    send_error(client, "UNKNOWN_SUBTYPE", f"Unknown control subtype: {subtype}")
+    send_line(client.sock, f"LEAVE_OK|{room}")
+    announce_presence(room, f"{client.nick} 님이 방을 나갔습니다.", [client.nick], False, exclude=client)
 
 
-def handle_chat(client: ClientInfo, subtype: str, fields: list[str]):
-    """TYPE 1: Chat 처리"""
-    if client.state != STATE_IN_ROOM:
-        return send_error(client, "NOT_IN_ROOM", "You must be in a room")
+@command("0", "QUIT")
+def cmd_quit(client: ClientInfo, fields: list[str]):
+    # 클라이언트 종료 로직은 handle_client 안에서 공통 처리
+    send_line(client.sock, "SYSTEM|INFO|Bye")
+    # 이후 실제 정리는 루프 밖에서
+    client.state = STATE_TERMINATED
+    try:
+        client.sock.shutdown(socket.SHUT_RDWR)
+    except Exception:
+        pass
+    client.sock.close()
+
+
+# ---------------------------------------------------------------------------
+# TYPE 1: Chat 처리
+# ---------------------------------------------------------------------------
+
+@command("1", "ROOM_MSG", arity=(1, 2), format_error="ROOM_MSG requires message",
+         require=NEED_ROOM, state_first=True, traced=True)
+def cmd_room_msg(client: ClientInfo, fields: list[str]):
+    msg = fields[0]
+    room = client.room
+    if len(fields) == 2 and fields[1] != room:
+        # 구독 중인 다른 방으로 보내기
+        if fields[1] not in client.subs:
+            if not client.subs:
+                # SUB을 쓰지 않는 (방 하나) 연결은 예전처럼 '|'가 든 메시지를 형식 오류로 본다
+                return send_error(client, "BAD_FORMAT", "ROOM_MSG requires message")
+            return send_error(client, "NOT_IN_ROOM", "Not subscribed to that room")
+        room = fields[1]
+    if room is None:
+        return send_error(client, "NOT_IN_ROOM", "No room assigned")
+    if message_filters:
+        msg = apply_message_filters(msg)
+    # 보관 메시지는 방마다 따로 제한하므로 여기서는 아직 못 보낸/못 받은 바이트만 본다
+    if client.in_bytes + client.out_bytes + len(msg.encode(ENCODING)) > MEM_SOFT:
+        return send_error(client, "MEMORY_LIMIT", "Too much of your data pending, try again later")
 
-    if subtype == "ROOM_MSG":
-        if len(fields) != 1:
-            return send_error(client, "BAD_FORMAT", "ROOM_MSG requires message")
+    with lock:
+        order = room_order.get(room)
+        if order is None:
+            order = room_order[room] = threading.Lock()
+    # 번호 순서대로 보관되고 수신자 대기 큐에 들어가도록 방마다 한 메시지씩.
+    # 실제 전송은 락을 놓은 뒤에 하므로 읽지 않는 멤버가 있어도 다른 발신자는 막히지 않는다.
+    with order:
+        with lock:
+            seq = room_seq[room] = room_seq.get(room, 0) + 1
+        # 번호를 본 클라이언트가 바로 FETCH 해도 찾을 수 있게 보관은 전달 전에 (전역 lock 밖)
+        room_history.append(room, client.nick or "", msg, client.recv_wall, seq)
+        # 방 안 모두의 대기 큐에 넣기 (큰 방은 워커에 넘기기까지)
+        queued = broadcast_to_room(
+            room, f"ROOM_MSG|{room}|{client.nick}|{msg}", trace=client.trace, srv_ts=client.recv_wall, seq=seq,
+            sender=client, flush=False,
+        )
+    for c in queued:
+        flush_out(c)
+    trace = client.trace
+    if trace is not None and not trace.deferred:
+        trace.mark("send")
+    # 색인은 전달이 끝난 뒤
+    search_index.add(room, client.nick or "", msg, client.recv_wall)
+    # 굳이 SUCCESS 응답은 생략해도 되지만, 원하면 여기에 추가 가능
+
+
+@command("1", "DM", arity=2, format_error="DM requires toNick and message",
+         require=NEED_ROOM, state_first=True, traced=True)
+def cmd_dm(client: ClientInfo, fields: list[str]):
+    to_nick, msg = fields
+    if message_filters:
+        msg = apply_message_filters(msg)
+    trace = client.trace
+    with lock:
+        if trace is not None:
+            trace.mark("lock")
+        target = clients_by_nick.get(to_nick)
+
+    if target is None:
+        return send_error(client, "NO_SUCH_USER", "No such user")
+
+    # DM 전송
+    if trace is not None:
+        trace.mark("enqueue")
+    deliver(target, with_extras(target, f"DM|{client.nick}|{msg}", client.recv_wall))
+    if trace is not None:
+        trace.mark("send")
+    hot_senders.update(client.nick or "", 1)
+    # 발신자에게도 성공 응답 반환
+    send_line(client.sock, f"SUCCESS|DM|{to_nick}")
+
+
+# ---------------------------------------------------------------------------
+# TYPE 2: Info 처리 (LIST_USER 등)
+# ---------------------------------------------------------------------------
+
+@command("2", "FETCH", arity=3, format_error="FETCH requires room, from and to", require=NEED_ROOM)
+def cmd_fetch(client: ClientInfo, fields: list[str]):
+    # 놓친 번호 구간을 보관 메시지에서 다시 보내기 (보관소 자체 락만 사용, 밀려난 번호는 빠짐)
+    room = fields[0]
+    try:
+        first, last = int(fields[1]), int(fields[2])
+    except ValueError:
+        return send_error(client, "BAD_FORMAT", "FETCH range must be integers")
+    if first < 1 or last < first:
+        return send_error(client, "BAD_FORMAT", "Invalid FETCH range")
+    if room != client.room and room not in client.subs:
+        return send_error(client, "NOT_IN_ROOM", "Not subscribed to that room")
+    last = min(last, first + FETCH_MAX - 1)
+    entries = room_history.fetch(room, first, last)
+    for e in entries:
+        # 요청한 쪽은 번호가 필요하므로 SEQ 기능과 무관하게 붙인다
+        text = with_extras(client, f"ROOM_MSG|{room}|{e.nick}|{e.msg}", e.ts)
+        send_line(client.sock, f"{text}|seq={e.seq}")
+    send_line(client.sock, f"FETCH_END|{room}|{first}|{last}|{len(entries)}")
+
+
+@command("2", "LIST_USER", arity=0, format_error="LIST_USER takes no args", require=NEED_ROOM)
+def cmd_list_user(client: ClientInfo, fields: list[str]):
+    room = client.room
+    with lock:
+        members = rooms.get(room, {})
+        names = [c.nick for c in members if c.nick is not None]
+    users_str = ",".join(names)
+    send_line(client.sock, f"USER_LIST|{room}|{users_str}")
 
-        msg = fields[0]
-        room = client.room
-        if room is None:
-            return send_error(client, "NOT_IN_ROOM", "No room assigned")
 
-        # 방 안 모두에게 브로드캐스트
-        broadcast_to_room(room, f"ROOM_MSG|{room}|{client.nick}|{msg}")
-        # 굳이 SUCCESS 응답은 생략해도 되지만, 원하면 여기에 추가 가능
-        return
+@command("2", "LIST_ALL", arity=0, format_error="LIST_ALL takes no args",
+         require=((STATE_REGISTERED, STATE_IN_ROOM), ("NEED_NICK", "Register nick first")))
+def cmd_list_all(client: ClientInfo, fields: list[str]):
+    # 전체 사용자 목록 (REGISTERED/IN_ROOM) 반환
+    with lock:
+        names = [nick for nick, c in clients_by_nick.items() if c.state in (STATE_REGISTERED, STATE_IN_ROOM)]
+    users_str = ",".join(names)
+    send_line(client.sock, f"USER_LIST_ALL|{users_str}")
 
-    if subtype == "DM":
-        if len(fields) != 2:
-            return send_error(client, "BAD_FORMAT", "DM requires toNick and message")
 
-        to_nick, msg = fields
+@command("2", "WATCH_MEMBERS", arity=1, format_error="WATCH_MEMBERS requires room name", require=NEED_REGISTERED)
+def cmd_watch_members(client: ClientInfo, fields: list[str]):
+    # 멤버 목록 구독: 전체 목록 한 줄 뒤로는 변경 묶음만 (다시 보내면 전체 목록부터 다시 맞춤)
+    room = fields[0].strip()
+    with member_send_lock:
         with lock:
-            target = clients_by_nick.get(to_nick)
+            if room not in rooms:
+                return send_error(client, "NO_SUCH_ROOM", "Room does not exist")
+            # 그 방에 모아 둔 변경을 먼저 내보내야 기존 구독자와 version이 맞는다
+            batches = member_watch.take(room)
+            names = [c.nick for c in rooms[room] if c.nick is not None]
+            snapshot = member_watch.watch(room, client, names, room_owner.get(room, ""))
+        send_member_batches(batches)
+        send_line(client.sock, snapshot)
 
-        if target is None:
-            return send_error(client, "NO_SUCH_USER", "No such user")
 
-        # DM 전송
-        send_line(target.sock, f"DM|{client.nick}|{msg}")
-        # 발신자에게도 성공 응답 반환
-        send_line(client.sock, f"SUCCESS|DM|{to_nick}")
-        return
+@command("2", "UNWATCH_MEMBERS", arity=1, format_error="UNWATCH_MEMBERS requires room name", require=NEED_REGISTERED)
+def cmd_unwatch_members(client: ClientInfo, fields: list[str]):
+    room = fields[0].strip()
+    with lock:
+        watching = member_watch.unwatch(room, client)
+    if not watching:
+        return send_error(client, "BAD_FORMAT", "Not watching that room")
+    send_line(client.sock, f"UNWATCH_OK|{room}")
 
-    send_error(client, "UNKNOWN_SUBTYPE", f"Unknown chat subtype: {subtype}")
 
+def send_member_batches(batches: list):
+    """member_watch.take() 결과 전송 (member_send_lock 안, 전역 lock 밖에서 호출)"""
+    for watchers, lines in batches:
+        text = "\n".join(lines)
+        for c in watchers:
+            deliver(c, text)
 
-def handle_info(client: ClientInfo, subtype: str, fields: list[str]):
-    """TYPE 2: Info 처리 (LIST_USER 등)"""
-    if subtype == "LIST_USER":
-        if fields:
-            return send_error(client, "BAD_FORMAT", "LIST_USER takes no args")
-        if client.state != STATE_IN_ROOM:
-            return send_error(client, "NOT_IN_ROOM", "You must be in a room")
 
-        room = client.room
+def flush_member_events():
+    """모아 둔 멤버 변경을 구독자에게 보낸다"""
+    with member_send_lock:
         with lock:
-            members = rooms.get(room, set())
-            names = [c.nick for c in members if c.nick is not None]
-        users_str = ",".join(names)
-        send_line(client.sock, f"USER_LIST|{room}|{users_str}")
-        return
+            batches = member_watch.take()
+        send_member_batches(batches)
 
-    if subtype == "LIST_ALL":
-        if fields:
-            return send_error(client, "BAD_FORMAT", "LIST_ALL takes no args")
-        if client.state not in (STATE_REGISTERED, STATE_IN_ROOM):
-            return send_error(client, "NEED_NICK", "Register nick first")
-        # 전체 사용자 목록 (REGISTERED/IN_ROOM) 반환
-        with lock:
-            names = [nick for nick, c in clients_by_nick.items() if c.state in (STATE_REGISTERED, STATE_IN_ROOM)]
-        users_str = ",".join(names)
-        send_line(client.sock, f"USER_LIST_ALL|{users_str}")
-        return
 
-    send_error(client, "UNKNOWN_SUBTYPE", f"Unknown info subtype: {subtype}")
+def member_event_loop(interval: float):
+    """MEMBER_WINDOW마다 멤버 변경 묶음 전송 (데몬 스레드)"""
+    while True:
+        time.sleep(interval)
+        try:
+            flush_member_events()
+        except Exception as e:
+            print("멤버 변경 전송 에러:", e)
+
+
+@command("2", "SEARCH", arity=(1, 2), format_error="SEARCH requires query and optional limit", require=NEED_ROOM)
+def cmd_search(client: ClientInfo, fields: list[str]):
+    # 현재 방의 보관 메시지 검색 (색인 자체 락만 사용)
+    limit = SEARCH_DEFAULT_LIMIT
+    if len(fields) == 2:
+        try:
+            limit = int(fields[1])
+        except ValueError:
+            return send_error(client, "BAD_FORMAT", f"Invalid limit: {fields[1]}")
+        if limit <= 0:
+            return send_error(client, "BAD_FORMAT", "Limit must be positive")
+        limit = min(limit, SEARCH_MAX_LIMIT)
+
+    words, from_nick = [], None
+    for word in fields[0].split():
+        if word.startswith("from:") and len(word) > 5:
+            from_nick = word[5:]
+        else:
+            words.append(word)
+    if not words:
+        return send_error(client, "BAD_FORMAT", "Empty search query")
+
+    room = client.room
+    hits = search_index.search(room, " ".join(words), limit, nick=from_nick)
+    for hit in hits:
+        send_line(client.sock, f"SEARCH_RESULT|{room}|{hit.ts:.3f}|{hit.nick}|{hit.msg}")
+    send_line(client.sock, f"SEARCH_END|{room}|{len(hits)}")
+
+
+@command("2", "PROFILE", arity=(1, 2), format_error="PROFILE requires start|stop", admin=True)
+def cmd_profile(client: ClientInfo, fields: list[str]):
+    # 관리자 전용: 샘플링 프로파일러 on/off (mem 옵션 시 tracemalloc 포함)
+    if fields[0] == "start":
+        if len(fields) == 2 and fields[1] != "mem":
+            return send_error(client, "BAD_FORMAT", "PROFILE|start takes optional 'mem'")
+        if not profiler.start(trace_memory=len(fields) == 2):
+            return send_error(client, "INVALID_STATE", "Profiler already running")
+        print(f"[PROFILE] started by {client.nick}")
+        return send_line(client.sock, "PROFILE_OK|started")
+
+    if fields[0] != "stop":
+        return send_error(client, "BAD_FORMAT", "PROFILE requires start|stop")
+    if len(fields) != 1:
+        return send_error(client, "BAD_FORMAT", "PROFILE|stop takes no args")
+    if not profiler.running:
+        return send_error(client, "INVALID_STATE", "Profiler not running")
+    paths = profiler.stop()
+    print(f"[PROFILE] stopped by {client.nick}: {paths}")
+    send_line(client.sock, f"PROFILE_OK|stopped|{','.join(paths)}")
+
+
+@command("2", "TRACE", arity=1, format_error="TRACE requires sample rate", admin=True)
+def cmd_trace(client: ClientInfo, fields: list[str]):
+    # 관리자 전용: 지연 추적 샘플링 비율 변경 (0이면 끔)
+    try:
+        rate = float(fields[0])
+    except ValueError:
+        return send_error(client, "BAD_FORMAT", f"Invalid rate: {fields[0]}")
+    if not 0.0 <= rate <= 1.0:
+        return send_error(client, "BAD_FORMAT", "Rate must be between 0 and 1")
+    tracer.sample_rate = rate
+    send_line(client.sock, f"TRACE_OK|{rate}")
+
+
+@command("2", "FILTER_RELOAD", arity=0, format_error="FILTER_RELOAD takes no args", admin=True)
+def cmd_filter_reload(client: ClientInfo, fields: list[str]):
+    # 관리자 전용: 금칙어 파일 다시 읽기
+    # 새 오토마톤은 요청한 연결의 스레드에서 만들고, 다른 스레드는 그동안 기존 목록으로 계속 필터링한다
+    if word_filter is None:
+        return send_error(client, "INVALID_STATE", "No banned word list configured")
+    try:
+        count = word_filter.reload()
+    except OSError as e:
+        return send_error(client, "BAD_FORMAT", f"Reload failed: {e}")
+    print(f"[FILTER] reloaded {count} words")
+    send_line(client.sock, f"FILTER_RELOAD_OK|{count}")
+
+
+# STATS 섹션 이름 -> (이름, 값) 줄 목록을 만드는 함수
+STATS_SECTIONS: dict[str, Callable[[], list[tuple[str, str]]]] = {}
+
+
+def stats_section(name: str):
+    """2|STATS|name 으로 조회할 지표 함수를 등록하는 데코레이터"""
+    def register(fn):
+        STATS_SECTIONS[name] = fn
+        return fn
+    return register
+
+
+@command("2", "STATS", arity=1, format_error="STATS requires section", admin=True)
+def cmd_stats(client: ClientInfo, fields: list[str]):
+    # 관리자 전용: 내부 지표 조회
+    section = fields[0]
+    rows_fn = STATS_SECTIONS.get(section)
+    if rows_fn is None:
+        return send_error(client, "BAD_FORMAT", f"Unknown stats section: {section}")
+    for name, value in rows_fn():
+        send_line(client.sock, f"STATS|{section}|{name}|{value}")
+    send_line(client.sock, f"STATS_END|{section}")
+
+
+@stats_section("latency")
+def latency_stats_rows() -> list[tuple[str, str]]:
+    return [(name, hist.summary()) for name, hist in tracer.histograms.items()]
+
+
+@stats_section("commands")
+def command_stats_rows() -> list[tuple[str, str]]:
+    rows = []
+    for (type_str, subtype), cmd in COMMANDS.items():
+        avg_ns = cmd.total_ns // cmd.calls if cmd.calls else 0
+        rows.append((f"{type_str}.{subtype}", f"calls={cmd.calls},total_ms={cmd.total_ns / 1e6:.3f},avg_ns={avg_ns}"))
+    return rows
+
+
+@stats_section("hot")
+def hot_stats_rows() -> list[tuple[str, str]]:
+    # sends는 상한, sends-err는 하한 (Space-Saving 오차 범위)
+    rows = [
+        ("total", f"room_sends={hot_rooms.total},sender_sends={hot_senders.total},window_s={HOT_WINDOW:g}"),
+    ]
+    for key, sends, err in hot_rooms.top(HOT_TOP):
+        rows.append((f"room:{key}", f"sends={sends},err={err}"))
+    for key, sends, err in hot_senders.top(HOT_TOP):
+        rows.append((f"sender:{key}", f"sends={sends},err={err}"))
+    return rows
+
+
+@stats_section("fanout")
+def fanout_stats_rows() -> list[tuple[str, str]]:
+    depths = [q.qsize() for q in fanout.queues]
+    return [
+        ("config", f"workers={len(depths)},threshold={FANOUT_THRESHOLD}"),
+        ("jobs", f"jobs={fanout.jobs},recipients={fanout.recipients}"),
+        ("queue_depth", f"total={sum(depths)},max={fanout.max_depth},per_worker={'/'.join(map(str, depths))}"),
+        ("completion", fanout.completion.summary()),
+    ]
+
+
+@stats_section("memory")
+def memory_stats_rows() -> list[tuple[str, str]]:
+    with lock:
+        clients = list(clients_by_sock.values())
+    usage = [(memory_usage(c), c) for c in clients]
+    rooms_usage = room_history.room_usage()
+    rows = [
+        ("limits", f"max_line={MAX_LINE_BYTES},soft={MEM_SOFT},hard={MEM_HARD},history_room={HISTORY_ROOM_BYTES}"),
+        ("total", (
+            f"connections={len(clients)},in={sum(c.in_bytes for c in clients)},"
+            f"out={sum(c.out_bytes for c in clients)},history={sum(b for _, b, _ in rooms_usage)},"
+            f"dropped={sum(c.dropped for c in clients)}"
+        )),
+    ]
+    usage.sort(key=lambda item: item[0], reverse=True)
+    for total, c in usage[:MEM_TOP]:
+        rows.append((
+            f"conn:{c.nick or c.conn_id}",
+            f"in={c.in_bytes},out={c.out_bytes},history={room_history.nick_bytes(c.nick)},"
+            f"total={total},dropped={c.dropped}",
+        ))
+    rooms_usage.sort(key=lambda item: item[1], reverse=True)
+    for room, size, entries in rooms_usage[:MEM_TOP]:
+        rows.append((f"room:{room}", f"history={size},entries={entries}"))
+    return rows
+
+
+@stats_section("presence")
+def presence_stats_rows() -> list[tuple[str, str]]:
+    return [
+        ("config", f"window_s={PRESENCE_WINDOW:g},batch_members={PRESENCE_BATCH_MEMBERS},max_members={PRESENCE_MAX_MEMBERS}"),
+        ("batched", f"events={presence.events},cancelled={presence.cancelled},summary_lines={presence.lines}"),
+        ("suppressed", str(presence_suppressed)),
+    ]
+
+
+@stats_section("members")
+def member_stats_rows() -> list[tuple[str, str]]:
+    with lock:
+        watched = len(member_watch.watchers)
+        watchers = sum(len(w) for w in member_watch.watchers.values())
+    return [
+        ("config", f"window_s={MEMBER_WINDOW:g}"),
+        ("watch", f"rooms={watched},watchers={watchers}"),
+        ("events", f"events={member_watch.events},cancelled={member_watch.cancelled},batches={member_watch.batches}"),
+    ]
+
+
+def unknown_command(client: ClientInfo, type_str: str, subtype: str):
+    """등록되지 않은 (TYPE, SUBTYPE): 예전과 같은 순서로 에러 코드 결정"""
+    try:
+        type_num = int(type_str)
+    except ValueError:
+        return send_error(client, "UNKNOWN_TYPE", f"TYPE must be int: {type_str}")
+    if client.state == STATE_CONNECTED and not (type_num == 0 and subtype in ("NICK", "CAPS", "RESUME")):
+        return send_error(client, "NEED_NICK", "Set nick first")
+    if type_num not in TYPE_NAMES:
+        return send_error(client, "UNKNOWN_TYPE", f"Unknown TYPE: {type_num}")
+    if type_num == 1 and client.state != STATE_IN_ROOM:
+        return send_error(client, "NOT_IN_ROOM", "You must be in a room")
+    send_error(client, "UNKNOWN_SUBTYPE", f"Unknown {TYPE_NAMES[type_num]} subtype: {subtype}")
 
 
 def process_message(client: ClientInfo, line: str):
-    """한 줄 메시지 처리: TYPE 파싱 후 각 핸들러로 분배"""
+    """한 줄 메시지 처리: (TYPE, SUBTYPE)으로 명령을 찾아 검증 후 실행"""
     line = line.strip()
     if not line:
         return
@@ -372,54 +1455,73 @@ def process_message(client: ClientInfo, line: str):
     if len(parts) < 2:
         return send_error(client, "BAD_FORMAT", "Need TYPE and SUBTYPE")
 
-    type_str = parts[0] # 타입 0,1,2 저장하는 곳
-    subtype = parts[1] # 서브타입 NICK, CREATE_ROOM 등 저장하는 곳
-    fields = parts[2:]  # 나머지
-
-    # TYPE을 파싱해서 타입에 맞는 함수 호출
-    try:
-        type_num = int(type_str)
-    except ValueError:
-        return send_error(client, "UNKNOWN_TYPE", f"TYPE must be int: {type_str}")
-
-    # 닉 설정 전에는 NICK 외 명령 차단
-    if client.state == STATE_CONNECTED and not (type_num == 0 and subtype == "NICK"):
-        return send_error(client, "NEED_NICK", "Set nick first")
-
-    if type_num == 0:
-        return handle_control(client, subtype, fields)
-    elif type_num == 1:
-        return handle_chat(client, subtype, fields)
-    elif type_num == 2:
-        return handle_info(client, subtype, fields)
+    cmd = COMMANDS.get((parts[0], parts[1]))
+    if cmd is None:
+        # "00|NICK" 처럼 숫자 표기만 다른 TYPE은 정규화해서 한 번 더 찾는다
+        try:
+            cmd = COMMANDS.get((str(int(parts[0])), parts[1]))
+        except ValueError:
+            pass
+        if cmd is None:
+            return unknown_command(client, parts[0], parts[1])
+    fields = parts[2:]
+
+    started = perf_counter_ns()
+    # 닉 설정 전에는 NICK/CAPS/RESUME 외 명령 차단
+    if client.state == STATE_CONNECTED and not cmd.pre_nick:
+        send_error(client, "NEED_NICK", "Set nick first")
     else:
-        return send_error(client, "UNKNOWN_TYPE", f"Unknown TYPE: {type_num}")
+        error = cmd.check(client, fields)
+        if error is not None:
+            send_error(client, *error)
+        elif not cmd.traced or tracer.sample_rate <= 0.0:
+            cmd.handler(client, fields)
+        else:
+            # 채팅 메시지만 샘플링해서 단계별 지연 추적
+            trace = tracer.maybe_start(client.recv_ts)
+            if trace is not None:
+                trace.mark("parse")
+                client.trace = trace
+            try:
+                cmd.handler(client, fields)
+            finally:
+                if trace is not None:
+                    client.trace = None
+                    if not trace.deferred:
+                        tracer.finish(trace)
+    cmd.calls += 1
+    cmd.total_ns += perf_counter_ns() - started
 
 
 def cleanup_client(client: ClientInfo):
     """클라이언트 종료 시 정리"""
-    room_to_notify = None
+    rooms_to_notify = []
     with lock:
-        if client.room and client in rooms.get(client.room, set()):
-            rooms[client.room].discard(client)
-            room_to_notify = client.room
-            # 방 소유자가 나가면 남은 첫 사람에게 소유권 위임
-            if room_owner.get(client.room) == client.nick:
-                members = list(rooms.get(client.room, set()))
-                if members:
-                    room_owner[client.room] = members[0].nick or ""
-                else:
-                    room_owner.pop(client.room, None)
+        if client.resume_token and client.nick and client.state != STATE_TERMINATED:
+            # QUIT이 아닌 비정상 종료면 잠시 동안 재접속으로 복구할 수 있게 남겨둔다
+            seen_seq = room_seq.get(client.room, 0) if client.room else None
+            resume_tokens[client.resume_token] = (client.nick, client.room, time.time() + RESUME_TTL, seen_seq)
+
+        # 현재 방과 구독 중인 방 모두에서 빠진다 (방장이면 남은 첫 사람에게 위임)
+        for room in [client.room, *client.subs]:
+            if room and client in rooms.get(room, {}):
+                rooms_to_notify.append(room)
+            if room:
+                leave_room(client, room)
 
         if client.nick in clients_by_nick:
             del clients_by_nick[client.nick]
+        member_watch.drop_client(client)
 
         if client.sock in clients_by_sock:
             del clients_by_sock[client.sock]
 
-    if room_to_notify:
+    if capture is not None:
+        capture.write(KIND_CLOSE, client.conn_id)
+
+    for room in rooms_to_notify:
         # 락을 잡지 않은 상태에서 브로드캐스트 (재진입 데드락 방지)
-        broadcast_to_room(room_to_notify, f"SYSTEM|INFO|{client.nick} 님이 방을 나갔습니다.", exclude=client)
+        announce_presence(room, f"{client.nick} 님이 방을 나갔습니다.", [client.nick or ""], False, exclude=client)
 
     try:
         client.sock.close()
@@ -427,50 +1529,705 @@ def cleanup_client(client: ClientInfo):
         pass
 
 
-def handle_client(sock: socket.socket, addr):
-    """각 클라이언트별 스레드 함수"""
-    client = ClientInfo(sock, addr)
-    with lock:
-        clients_by_sock[sock] = client
+def wait_readable(sel: selectors.BaseSelector) -> bool:
+    """소켓에 읽을 게 생기면 True, 넘기기 때문에 깨어났으면 False"""
+    while True:
+        for key, _ in sel.select():
+            if key.fileobj is not handoff_wake_r:
+                return True
+        if handoff_requested:
+            return False
+        time.sleep(HANDOFF_POLL)
 
-    print("연결:", addr)
 
-    buffer = ""
+def park_for_handoff(client: ClientInfo):
+    """넘기기가 끝나거나 취소될 때까지 recv 없이 기다린다 (넘기면 프로세스가 여기서 끝남)"""
+    client.parked = True
+    while handoff_requested:
+        time.sleep(HANDOFF_POLL)
+    client.parked = False
+
+
+def handle_client(client: ClientInfo):
+    """각 클라이언트별 스레드 함수 (client는 admit_connection에서 이미 등록됨)"""
+    sock, addr = client.sock, client.addr
+    print("연결:", addr)
+    if capture is not None:
+        capture.write(KIND_OPEN, client.conn_id, f"{addr[0]}:{addr[1]}")
+
+    buffer = b""
+    discarding = False  # MAX_LINE_BYTES를 넘은 줄의 나머지를 버리는 중
+    # 넘겨받은 연결이면 이전 프로세스가 읽고 처리하지 못한 바이트부터
+    data, client.partial = client.partial, b""
+    # recv는 읽을 게 있을 때만: 넘기기로 멈춘 핸들러가 넘긴 뒤 도착한 바이트를 가져가지 않게
+    sel = HANDLER_SELECTOR()
+    sel.register(sock, selectors.EVENT_READ)
+    sel.register(handoff_wake_r, selectors.EVENT_READ)
 
     try:
         while client.state != STATE_TERMINATED:
-            data = sock.recv(BUF_SIZE)
+            if not data:
+                if not wait_readable(sel):
+                    park_for_handoff(client)
+                    continue
+                data = sock.recv(BUF_SIZE)
+            if handoff_requested:
+                # 넘기는 중에 받은 바이트는 처리하지 않고 새 프로세스에 넘긴다
+                client.partial = buffer + data
+                park_for_handoff(client)
+                client.partial = buffer
             if not data:
                 break
-
-            buffer += data.decode(ENCODING)
-            # '\n' 기준으로 자르기
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                process_message(client, line)
+            client.recv_ts = time.monotonic()
+            client.recv_wall = time.time()
+
+            buffer += data
+            if b"\n" in data:
+                # '\n' 기준으로 자른 뒤 줄마다 디코딩 (한글이 recv 경계에서 잘려도 안전)
+                *raw_lines, buffer = buffer.split(b"\n")
+                for raw in raw_lines:
+                    if discarding:
+                        discarding = False
+                        continue
+                    if len(raw) > MAX_LINE_BYTES:
+                        send_error(client, "LINE_TOO_LONG", f"Line exceeds {MAX_LINE_BYTES} bytes")
+                        continue
+                    line = raw.decode(ENCODING, "replace")
+                    if capture is not None:
+                        capture.write(KIND_LINE, client.conn_id, line, client.recv_ts)
+                    process_message(client, line)
+                    if client.state == STATE_TERMINATED:
+                        break
+            if len(buffer) > MAX_LINE_BYTES:
+                # 줄바꿈 없이 계속 보내는 클라이언트 때문에 버퍼가 커지지 않게 버린다
+                if not discarding:
+                    send_error(client, "LINE_TOO_LONG", f"Line exceeds {MAX_LINE_BYTES} bytes")
+                discarding = True
+                buffer = b""
+            client.in_bytes = len(buffer)
+            client.partial = buffer
+            data = b""
 
     except Exception as e:
         print("클라이언트 처리 중 에러:", e)
+    finally:
+        sel.close()
 
     print("연결 종료:", addr)
     cleanup_client(client)
 
 
-def main():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
-    server.listen(10)
+def read_listen_overflows() -> tuple[int, int] | None:
+    """커널 TcpExt ListenOverflows/ListenDrops 누적값 (리눅스 전용, 시스템 전체 기준)"""
+    try:
+        with open("/proc/net/netstat", encoding="ascii") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for header, values in zip(lines[::2], lines[1::2]):
+        if header.startswith("TcpExt:"):
+            table = dict(zip(header.split()[1:], values.split()[1:]))
+            return int(table.get("ListenOverflows", 0)), int(table.get("ListenDrops", 0))
+    return None
+
+
+def read_rss_kb() -> int | None:
+    """현재 프로세스 RSS (KB, 리눅스 전용)"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+@stats_section("state")
+def state_stats_rows() -> list[tuple[str, str]]:
+    with lock:
+        rows = [
+            ("rooms", str(len(rooms))),
+            ("empty_rooms", str(sum(1 for members in rooms.values() if not members))),
+            ("room_owner", str(len(room_owner))),
+            ("owned_rooms", str(len(owned_rooms))),
+            ("room_seq", str(len(room_seq))),
+            ("room_order", str(len(room_order))),
+            ("clients_by_sock", str(len(clients_by_sock))),
+            ("clients_by_nick", str(len(clients_by_nick))),
+            ("resume_tokens", str(len(resume_tokens))),
+            ("member_watch_rooms", str(len(member_watch.watchers))),
+        ]
+    rows += [
+        ("history_rooms", str(len(room_history.room_usage()))),
+        ("search_docs", str(len(search_index))),
+        ("threads", str(threading.active_count())),
+        ("reclaimed", f"rooms={reclaim_stats['rooms']},tokens={reclaim_stats['tokens']},runs={reclaim_stats['runs']}"),
+    ]
+    rss = read_rss_kb()
+    if rss is not None:
+        rows.append(("rss_kb", str(rss)))
+    return rows
+
+
+@stats_section("accept")
+def accept_stats_rows() -> list[tuple[str, str]]:
+    with lock:
+        active = len(clients_by_sock)
+    rows = [
+        ("accepted", str(accept_rate.total)),
+        ("accept_rate_per_s", f"{accept_rate.rate():.1f}"),
+        ("refused_full", str(accept_stats["refused"])),
+        ("batches", str(accept_stats["batches"])),
+        ("max_batch", str(accept_stats["max_batch"])),
+        ("active", f"{active}/{MAX_CONNECTIONS}"),
+        ("socket_profile", f"{SOCKET_PROFILE.name} ({sockopts.describe(SOCKET_PROFILE)})"),
+        ("recv_size", str(BUF_SIZE)),
+    ]
+    overflows = read_listen_overflows()
+    if overflows is not None:
+        rows.append(("listen_overflows", str(overflows[0])))
+        rows.append(("listen_drops", str(overflows[1])))
+    return rows
+
+
+def admit_connection(client_sock: socket.socket, addr):
+    """접속 수 제한 확인 후 클라이언트 스레드 시작 (초과 시 SERVER_FULL 후 종료)"""
+    with lock:
+        # 스레드가 뜨기 전에 등록해야 폭주 중에도 접속 수를 정확히 센다
+        full = len(clients_by_sock) >= MAX_CONNECTIONS
+        if not full:
+            client = ClientInfo(client_sock, addr)
+            clients_by_sock[client_sock] = client
+    if full:
+        accept_stats["refused"] += 1
+        try:
+            client_sock.setblocking(False)
+            client_sock.send(b"ERROR|SERVER_FULL|Too many connections\n")
+        except OSError:
+            pass
+        client_sock.close()
+        return
+    # 전송은 SEND_TIMEOUT까지만 기다린다 (받기는 핸들러가 읽을 게 있을 때만 recv)
+    client_sock.settimeout(SEND_TIMEOUT)
+    try:
+        sockopts.apply(client_sock, SOCKET_PROFILE)
+    except OSError:
+        pass  # 그 사이 끊긴 연결은 handle_client에서 정리된다
+    t = threading.Thread(target=handle_client, args=(client,), daemon=True)
+    t.start()
+
+
+def accept_loop(server: socket.socket):
+    """리슨 소켓이 읽기 가능해질 때마다 대기 중인 연결을 한꺼번에 accept (drain이면 반환)"""
+    server.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(server, selectors.EVENT_READ)
+    try:
+        while not draining:
+            if not sel.select(ACCEPT_POLL):
+                continue
+            if accept_paused:
+                # 넘기는 중에 온 연결은 백로그에 두고 새 프로세스가 받게 한다
+                time.sleep(HANDOFF_POLL)
+                continue
+            batch = 0
+            while True:
+                try:
+                    client_sock, addr = server.accept()
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError as e:
+                    # EMFILE 등: 이번 배치는 멈추고 다음 깨어날 때 다시 시도
+                    print("accept 에러:", e)
+                    time.sleep(0.01)
+                    break
+                batch += 1
+                admit_connection(client_sock, addr)
+            if batch:
+                accept_rate.add(batch)
+                accept_stats["batches"] += 1
+                if batch > accept_stats["max_batch"]:
+                    accept_stats["max_batch"] = batch
+    finally:
+        sel.close()
+
+
+def wait_for_drain(timeout: float):
+    """기존 연결이 모두 끝나거나 timeout이 지날 때까지 대기"""
+    deadline = time.monotonic() + timeout
+    last_report = 0.0
+    while time.monotonic() < deadline:
+        with lock:
+            active = len(clients_by_sock)
+        if not active:
+            print("[DRAIN] all connections closed")
+            return
+        if time.monotonic() - last_report >= 5.0:
+            print(f"[DRAIN] waiting for {active} connections")
+            last_report = time.monotonic()
+        time.sleep(ACCEPT_POLL)
+    print("[DRAIN] timeout, closing remaining connections")
+
+
+def start_drain(signum=None, frame=None):
+    """SIGUSR2 핸들러: 새 연결은 받지 않고 기존 연결이 끝나면 종료"""
+    global draining
+    draining = True
+
+
+def quiesce_for_handoff() -> bool:
+    """
+    핸들러를 모두 멈추고(parked) 보내던 줄/팬아웃/재접속 처리가 비기를 기다린다.
+    시간 안에 못 하면 원복 후 False
+    """
+    global handoff_requested
+    handoff_requested = True
+    handoff_wake_w.send(b"\0")
+    presence.flush()  # 모아 둔 입장/퇴장 알림, 멤버 변경 묶음은 넘기기 전에 보낸다
+    flush_member_events()
+    deadline = time.monotonic() + HANDOFF_QUIESCE_TIMEOUT
+    while time.monotonic() < deadline:
+        with lock:
+            clients = list(clients_by_sock.values())
+        if (all(c.parked and not c.out_bytes for c in clients)
+                and fanout.idle() and resume_queue.empty()):
+            return True
+        time.sleep(HANDOFF_POLL)
+    cancel_handoff()
+    return False
+
+
+def cancel_handoff():
+    """깨우기 바이트를 비우고 멈춘 핸들러를 다시 돌린다 (넘기기를 시작하지 않았으면 아무것도 안 함)"""
+    global handoff_requested
+    if not handoff_requested:
+        return
+    handoff_wake_r.recv(1)
+    handoff_requested = False
+
+
+def handoff_state() -> tuple[dict, list[socket.socket]]:
+    """넘길 상태(JSON용)와 클라이언트 소켓 목록 (핸들러가 멈춘 뒤 호출)"""
+    with lock:
+        clients = list(clients_by_sock.values())
+        client_rows = [
+            [c.conn_id, list(c.addr), c.nick, c.state, c.room, list(c.subs), sorted(c.caps),
+             c.resume_token, c.partial.decode("latin-1"), member_watch.rooms_of(c)]
+            for c in clients
+        ]
+        room_rows = [
+            [room, room_owner.get(room, ""), room_seq.get(room, 0), [c.conn_id for c in members],
+             member_watch.versions.get(room, 0)]
+            for room, members in rooms.items()
+        ]
+        token_rows = [[token, nick, room, exp, seq] for token, (nick, room, exp, seq) in resume_tokens.items()]
+    history = room_history.copy()
+    state = {
+        "clients": client_rows,
+        "rooms": room_rows,
+        "tokens": token_rows,
+        "history": [[room, [list(e) for e in entries]] for room, entries in history.items()],
+    }
+    return state, [c.sock for c in clients]
+
+
+def serve_handoff(conn: socket.socket, listener: socket.socket, listener_only: bool) -> bool:
+    """새 프로세스 하나에 넘기기. 모두 넘겼으면 (listener_only가 아니면) 프로세스를 끝낸다"""
+    global accept_paused, draining
+    accept_paused = True
+    socks: list[socket.socket] = []
+    try:
+        if listener_only:
+            handoff.send_state(conn, {"clients": [], "rooms": [], "tokens": [], "history": []}, [listener.fileno()])
+        elif quiesce_for_handoff():
+            state, socks = handoff_state()
+            handoff.send_state(conn, state, [listener.fileno()] + [s.fileno() for s in socks])
+        else:
+            raise TimeoutError("handlers did not stop in time")
+        if conn.recv(1) != handoff.ACK:
+            raise ConnectionError("no ack from new process")
+    except Exception as e:
+        # 새 프로세스는 ACK 전에 연결이 끊긴 것을 보고 실패로 끝난다. 이쪽은 하던 대로 계속
+        print("[HANDOFF] failed:", e)
+        cancel_handoff()
+        accept_paused = False
+        return False
+
+    if listener_only:
+        print("[HANDOFF] listener handed over, draining existing connections")
+        conn.close()
+        draining = True
+        return True
+    print(f"[HANDOFF] {len(socks)} connections handed over, exiting")
+    if capture is not None:
+        capture.close()
+    os._exit(0)
+
+
+def handoff_listener(path: str, listener: socket.socket, listener_only: bool):
+    """--handoff-socket 경로에서 새 프로세스를 기다리는 스레드"""
+    if os.path.exists(path):
+        os.unlink(path)
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(path)
+    srv.listen(1)
+    while True:
+        conn, _ = srv.accept()
+        with conn:
+            if serve_handoff(conn, listener, listener_only):
+                break
+    srv.close()
+
+
+def take_over(path: str) -> tuple[socket.socket, list[ClientInfo]]:
+    """
+    실행 중인 서버에서 리슨 소켓/클라이언트/방 상태를 넘겨받는다.
+    이전 프로세스가 끝난(연결이 닫힌) 뒤에 반환하므로, 반환된 클라이언트의 스레드는 바로 시작해도 된다.
+    """
+    global _conn_ids
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(path)
+    state, fds = handoff.recv_state(conn)
+    listener = socket.socket(fileno=fds[0])
+
+    by_id: dict[int, ClientInfo] = {}
+    with lock:
+        watching: list[tuple[ClientInfo, list[str]]] = []
+        for row, fd in zip(state["clients"], fds[1:]):
+            # 구독 목록(마지막 필드)은 이전 버전 서버가 넘기면 없다
+            conn_id, addr, nick, client_state, room, subs, caps, token, partial, *rest = row
+            client = ClientInfo(socket.socket(fileno=fd), tuple(addr))
+            client.conn_id = conn_id
+            client.nick = nick
+            client.state = client_state
+            client.room = room
+            client.subs = dict.fromkeys(subs)
+            client.caps = set(caps)
+            client.resume_token = token
+            client.partial = partial.encode("latin-1")
+            client.sock.settimeout(SEND_TIMEOUT)
+            clients_by_sock[client.sock] = client
+            if nick:
+                clients_by_nick[nick] = client
+            by_id[conn_id] = client
+            if rest and rest[0]:
+                watching.append((client, rest[0]))
+        versions = {}
+        for room, owner, seq, member_ids, *rest in state["rooms"]:
+            rooms[room] = {by_id[i]: None for i in member_ids if i in by_id}
+            if owner:
+                set_room_owner(room, owner)
+            if seq:
+                room_seq[room] = seq
+            if rest:
+                versions[room] = rest[0]
+        # 멤버 목록 구독은 version까지 이어 받아 클라이언트가 다시 맞출 필요가 없게 한다
+        for client, watched in watching:
+            for room in watched:
+                if room in rooms:
+                    member_watch.watch(room, client, [], "")
+                    member_watch.versions[room] = versions.get(room, 0)
+        for token, nick, room, expires_at, seen_seq in state["tokens"]:
+            resume_tokens[token] = (nick, room, expires_at, seen_seq)
+        if by_id:
+            _conn_ids = itertools.count(max(by_id) + 1)
+    for room, entries in state["history"]:
+        for ts, nick, msg, *seq in entries:
+            room_history.append(room, nick, msg, ts, *seq)
+            search_index.add(room, nick, msg, ts)
+
+    conn.sendall(handoff.ACK)
+    # 이전 프로세스가 끝날 때까지 기다린다 (그 전에 읽으면 두 프로세스가 같은 소켓을 읽게 된다)
+    conn.recv(1)
+    conn.close()
+    return listener, list(by_id.values())
+
+
+def take_snapshot(path: str) -> int:
+    """방/방장/토큰 상태를 복사한 뒤 락 밖에서 직렬화해 파일로 저장"""
+    now = time.time()
+    with lock:
+        # 락 안에서는 얕은 복사만 하고 바로 놓는다
+        owners = dict(room_owner)
+        room_names = list(rooms)
+        seqs = dict(room_seq)
+        live = [(c.resume_token, c.nick, c.room) for c in clients_by_nick.values() if c.resume_token]
+        pending = list(resume_tokens.items())
+        for token, (_, _, expires_at, _) in pending:
+            if expires_at < now:
+                del resume_tokens[token]
+    # 메시지 보관소는 자체 락으로 복사
+    history = room_history.copy()
+
+    room_rows = [[room, owners.get(room, ""), seqs.get(room, 0)] for room in room_names]
+    # 접속 중인 클라이언트는 저장 시점의 방 번호까지 본 것으로 친다
+    token_rows = [[token, nick, room, None, seqs.get(room, 0) if room else None] for token, nick, room in live]
+    token_rows += [[token, nick, room, exp, seq] for token, (nick, room, exp, seq) in pending if exp >= now]
+    history_rows = [[room, [list(e) for e in entries]] for room, entries in history.items()]
+    return save_snapshot(path, room_rows, token_rows, history_rows)
+
+
+def restore_snapshot(path: str) -> int:
+    """스냅샷 파일에서 방/방장/토큰 복원. 복원한 방 수 반환"""
+    state = load_snapshot(path)
+    if state is None:
+        return 0
+    now = time.time()
+    with lock:
+        for room, owner, seq in state["rooms"]:
+            rooms.setdefault(room, {})
+            if owner:
+                set_room_owner(room, owner)
+            if seq:
+                room_seq[room] = seq
+        for token, nick, room, expires_at, seen_seq in state["tokens"]:
+            # 저장 당시 접속 중이던 클라이언트는 복원 시점부터 유효 시간을 센다
+            if expires_at is None:
+                expires_at = now + RESUME_TTL
+            if expires_at >= now:
+                resume_tokens[token] = (nick, room, expires_at, seen_seq)
+    for room, entries in state["history"]:
+        for ts, nick, msg, *seq in entries:
+            room_history.append(room, nick, msg, ts, *seq)
+            search_index.add(room, nick, msg, ts)
+    return len(state["rooms"])
+
+
+def snapshot_loop(path: str, interval: float):
+    """주기적으로 스냅샷 저장 (데몬 스레드)"""
+    while True:
+        time.sleep(interval)
+        try:
+            started = time.monotonic()
+            size = take_snapshot(path)
+            print(f"[SNAPSHOT] {path} {size} bytes ({(time.monotonic() - started) * 1000:.1f}ms)")
+        except Exception as e:
+            print("스냅샷 저장 에러:", e)
+
+
+def reclaim_rooms(candidates: set[str]) -> set[str]:
+    """
+    만료된 재접속 토큰을 버리고, 지난번에도 비어 있던(candidates) 방 중 아직도 멤버/방장이
+    없는 방을 지운다. 접속해 있지도 않고 재접속 토큰도 없는 닉이 방장이면 방장이 없는 것으로 본다.
+    이번에 비어 있었지만 지우지 않은 방 집합(다음 호출의 candidates)을 반환.
+    """
+    now = time.time()
+    reclaimed = []  # (room, 알려 줄 멤버 구독 연결)
+    with lock:
+        expired = [token for token, entry in resume_tokens.items() if entry[2] < now]
+        for token in expired:
+            del resume_tokens[token]
+        held_rooms = {entry[1] for entry in resume_tokens.values()}
+        held_nicks = {entry[0] for entry in resume_tokens.values()}
+        empty = set()
+        for room, members in rooms.items():
+            owner = room_owner.get(room)
+            if members or room in held_rooms or (owner and (owner in clients_by_nick or owner in held_nicks)):
+                continue
+            empty.add(room)
+        for room in empty & candidates:
+            del rooms[room]
+            clear_room_owner(room)
+            room_seq.pop(room, None)
+            room_order.pop(room, None)
+            reclaimed.append((room, member_watch.drop_room(room)))
+        reclaim_stats["tokens"] += len(expired)
+        reclaim_stats["rooms"] += len(reclaimed)
+        reclaim_stats["runs"] += 1
+
+    for room, watchers in reclaimed:
+        for c in watchers:
+            deliver(c, f"WATCH_END|{room}")
+        room_history.drop(room)
+        search_index.forget_room(room)
+    if reclaimed:
+        print(f"[ROOM] reclaimed {len(reclaimed)} empty rooms")
+    return empty - {room for room, _ in reclaimed}
+
+
+def reclaim_loop(interval: float):
+    """ROOM_RECLAIM_INTERVAL마다 빈 방/만료 토큰 정리 (데몬 스레드)"""
+    candidates: set[str] = set()
+    while True:
+        time.sleep(interval)
+        try:
+            candidates = reclaim_rooms(candidates)
+        except Exception as e:
+            print("빈 방 정리 에러:", e)
+
+
+def toggle_profiler(signum=None, frame=None):
+    """SIGUSR1 핸들러: 프로파일러가 꺼져 있으면 켜고, 켜져 있으면 끄고 결과 저장"""
+    if profiler.running:
+        # stop()은 샘플러 스레드를 join 하므로 시그널 핸들러 밖에서 실행
+        threading.Thread(target=lambda: print("[PROFILE] stopped:", profiler.stop()), daemon=True).start()
+    else:
+        profiler.start()
+        print("[PROFILE] started (signal)")
+
+
+def reload_word_filter(signum=None, frame=None):
+    """SIGHUP 핸들러: 금칙어 목록 다시 읽기"""
+    if word_filter is not None:
+        word_filter.reload_async(lambda result: print("[FILTER] reloaded:", result))
+
+
+def request_shutdown(signum=None, frame=None):
+    """SIGTERM 핸들러: Ctrl+C와 같은 경로로 정리(스냅샷/캡처 flush) 후 종료"""
+    raise KeyboardInterrupt
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NP-Chat server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--admin", default="", help="관리자 닉 목록 (콤마 구분)")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR, help="프로파일 결과 저장 디렉터리")
+    parser.add_argument("--trace-sample", type=float, default=0.0, help="지연 추적 샘플링 비율 (0.0~1.0)")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH, help="상태 스냅샷 파일 경로 (없으면 저장 안 함)")
+    parser.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL, help="스냅샷 주기 (초)")
+    parser.add_argument("--resume-ttl", type=float, default=RESUME_TTL, help="재접속 토큰 유효 시간 (초)")
+    parser.add_argument("--backlog", type=int, default=LISTEN_BACKLOG, help="listen 백로그 크기")
+    parser.add_argument("--socket-profile", default="default",
+                        help=f"소켓 옵션 프로파일 ({', '.join(sockopts.PROFILES)}) 뒤에 ,key=value로 덮어쓰기")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS, help="최대 동시 접속 수")
+    parser.add_argument("--capture", default=None, help="수신 트래픽 캡처 파일 경로 (replay.py용)")
+    parser.add_argument("--banned-words", default=None, help="금칙어 목록 파일 (한 줄에 하나)")
+    parser.add_argument("--history-size", type=int, default=HISTORY_PER_ROOM, help="방별 보관 메시지 수")
+    parser.add_argument("--search-max-docs", type=int, default=SEARCH_MAX_DOCS, help="검색 색인 문서 수 상한")
+    parser.add_argument("--max-line", type=int, default=MAX_LINE_BYTES, help="받는 한 줄 최대 바이트")
+    parser.add_argument("--mem-soft", type=int, default=MEM_SOFT, help="연결별 메모리 soft 한도 (바이트)")
+    parser.add_argument("--mem-hard", type=int, default=MEM_HARD, help="연결별 메모리 hard 한도 (바이트, 넘으면 종료)")
+    parser.add_argument("--send-timeout", type=float, default=SEND_TIMEOUT,
+                        help="한 줄 전송을 기다리는 최대 시간 (초, 넘으면 그 수신자 연결 종료)")
+    parser.add_argument("--history-room-bytes", type=int, default=HISTORY_ROOM_BYTES, help="방별 보관 메시지 바이트 상한")
+    parser.add_argument("--fanout-threshold", type=int, default=FANOUT_THRESHOLD,
+                        help="이 인원 이상인 방의 브로드캐스트는 전달 워커가 처리")
+    parser.add_argument("--fanout-workers", type=int, default=FANOUT_WORKERS, help="전달 워커 수 (0이면 끔)")
+    parser.add_argument("--presence-window", type=float, default=PRESENCE_WINDOW,
+                        help="큰 방 입장/퇴장 알림을 모으는 시간 (초, 0이면 묶지 않음)")
+    parser.add_argument("--presence-batch-members", type=int, default=PRESENCE_BATCH_MEMBERS,
+                        help="이 인원 이상인 방은 입장/퇴장 알림을 묶어서 요약")
+    parser.add_argument("--presence-max-members", type=int, default=PRESENCE_MAX_MEMBERS,
+                        help="이 인원을 넘는 방은 입장/퇴장 알림 생략")
+    parser.add_argument("--member-window", type=float, default=MEMBER_WINDOW,
+                        help="멤버 목록 구독자에게 변경을 모아 보내는 주기 (초)")
+    parser.add_argument("--room-reclaim-interval", type=float, default=ROOM_RECLAIM_INTERVAL,
+                        help="빈 방/만료된 재접속 토큰 정리 주기 (초, 0이면 끔)")
+    parser.add_argument("--handoff-socket", default=None,
+                        help="새 프로세스에 소켓/상태를 넘겨줄 Unix 소켓 경로 (무중단 재시작)")
+    parser.add_argument("--handoff-listener-only", action="store_true",
+                        help="리슨 소켓만 넘기고 기존 연결은 drain")
+    parser.add_argument("--takeover", default=None, help="이 Unix 소켓 경로의 서버에서 소켓/상태를 넘겨받아 시작")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="drain(SIGUSR2) 중 기존 연결을 기다리는 최대 시간 (초)")
+    args = parser.parse_args(argv)
+    try:
+        args.socket_profile = sockopts.parse_profile(args.socket_profile)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    global PORT, SNAPSHOT_PATH, MAX_CONNECTIONS, FANOUT_THRESHOLD, capture, word_filter, resume_worker_started
+    global MAX_LINE_BYTES, MEM_SOFT, MEM_HARD, SEND_TIMEOUT, HISTORY_ROOM_BYTES
+    global PRESENCE_WINDOW, PRESENCE_BATCH_MEMBERS, PRESENCE_MAX_MEMBERS, MEMBER_WINDOW
+    global SOCKET_PROFILE, BUF_SIZE, ROOM_RECLAIM_INTERVAL, RESUME_TTL
+    args = parse_args(argv)
+    SOCKET_PROFILE = args.socket_profile
+    BUF_SIZE = SOCKET_PROFILE.recv_size or BUF_SIZE
+    PORT = args.port
+    SNAPSHOT_PATH = args.snapshot
+    RESUME_TTL = args.resume_ttl
+    MAX_CONNECTIONS = args.max_connections
+    room_history.maxlen = args.history_size
+    MAX_LINE_BYTES = args.max_line
+    MEM_SOFT = args.mem_soft
+    MEM_HARD = args.mem_hard
+    SEND_TIMEOUT = args.send_timeout
+    HISTORY_ROOM_BYTES = room_history.max_bytes = args.history_room_bytes
+    search_index.max_docs = args.search_max_docs
+    if args.capture:
+        capture = CaptureWriter(args.capture)
+        print(f"[CAPTURE] recording to {args.capture}")
+    if args.banned_words:
+        word_filter = WordFilter(args.banned_words)
+        message_filters.append(word_filter)
+        print(f"[FILTER] {word_filter.automaton.size} banned words loaded")
+    ADMIN_NICKS.update(n.strip() for n in args.admin.split(",") if n.strip())
+    profiler.out_dir = args.profile_dir
+    tracer.sample_rate = args.trace_sample
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, toggle_profiler)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, reload_word_filter)
+    if hasattr(signal, "SIGUSR2"):
+        signal.signal(signal.SIGUSR2, start_drain)
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    server, handed = None, []
+    if args.takeover:
+        started = time.monotonic()
+        server, handed = take_over(args.takeover)
+        print(f"[HANDOFF] took over {len(handed)} connections, {len(rooms)} rooms "
+              f"({(time.monotonic() - started) * 1000:.1f}ms)")
+
+    if SNAPSHOT_PATH:
+        if not handed:
+            started = time.monotonic()
+            restored = restore_snapshot(SNAPSHOT_PATH)
+            print(f"[SNAPSHOT] restored {restored} rooms ({(time.monotonic() - started) * 1000:.1f}ms)")
+        threading.Thread(target=snapshot_loop, args=(SNAPSHOT_PATH, args.snapshot_interval), daemon=True).start()
+
+    threading.Thread(target=resume_worker, name="resume", daemon=True).start()
+    resume_worker_started = True
+    FANOUT_THRESHOLD = args.fanout_threshold
+    if args.fanout_workers > 0:
+        fanout.start(args.fanout_workers)
+    PRESENCE_WINDOW = presence.window = args.presence_window
+    PRESENCE_BATCH_MEMBERS = args.presence_batch_members
+    PRESENCE_MAX_MEMBERS = args.presence_max_members
+    if PRESENCE_WINDOW > 0:
+        presence.start()
+    MEMBER_WINDOW = max(args.member_window, 0.01)
+    threading.Thread(target=member_event_loop, args=(MEMBER_WINDOW,), name="members", daemon=True).start()
+    ROOM_RECLAIM_INTERVAL = args.room_reclaim_interval
+    if ROOM_RECLAIM_INTERVAL > 0:
+        threading.Thread(target=reclaim_loop, args=(ROOM_RECLAIM_INTERVAL,), name="reclaim", daemon=True).start()
+
+    if server is None:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # 리슨 소켓에 건 버퍼 크기는 accept된 연결이 물려받아 handshake의 window scale에 반영된다
+        sockopts.apply(server, SOCKET_PROFILE)
+        server.bind((HOST, PORT))
+        server.listen(args.backlog)
+    for client in handed:
+        threading.Thread(target=handle_client, args=(client,), daemon=True).start()
+    if args.handoff_socket:
+        if handoff.supported():
+            threading.Thread(
+                target=handoff_listener, args=(args.handoff_socket, server, args.handoff_listener_only),
+                name="handoff", daemon=True,
+            ).start()
+        else:
+            print("[HANDOFF] SCM_RIGHTS not supported on this platform, use SIGUSR2 drain instead")
     print(f"서버 대기중... ({HOST or '0.0.0.0'}:{PORT})")
 
     try:
-        while True:
-            client_sock, addr = server.accept()
-            t = threading.Thread(target=handle_client, args=(client_sock, addr), daemon=True)
-            t.start()
+        accept_loop(server)
+        # drain: 리슨 소켓을 먼저 닫아 새 서버가 같은 포트를 쓸 수 있게 한다
+        server.close()
+        print("[DRAIN] stopped accepting")
+        wait_for_drain(args.drain_timeout)
     except KeyboardInterrupt:
         print("서버 종료 요청")
     finally:
         server.close()
+        if SNAPSHOT_PATH:
+            take_snapshot(SNAPSHOT_PATH)
+        if capture is not None:
+            capture.close()
+            print(f"[CAPTURE] {capture.records} records -> {capture.path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+# snapshot.py
+"""
+서버 상태 스냅샷 저장/복원
+
+방 목록, 방장, 재접속(resume) 토큰, 방별 최근 메시지를 zlib 압축 JSON 한 파일로 저장한다.
+저장은 임시 파일에 쓴 뒤 os.replace 로 교체하므로 중간에 죽어도
+이전 스냅샷이 깨지지 않는다.
+
+파일 구조 (압축 해제 후)
+    {"version": 1, "saved_at": epoch초,
+     "rooms": [[room, owner, seq], ...],
+     "tokens": [[token, nick, room, expires_at|null, seen_seq|null], ...],
+     "history": [[room, [[ts, nick, msg, seq], ...]], ...]}
+
+expires_at 이 null 이면 저장 시점에 접속 중이던 클라이언트의 토큰이고,
+복원 시점부터 유효 시간을 다시 센다. seq는 방별 ROOM_MSG 일련번호,
+seen_seq는 토큰 주인이 끊길 때까지 본 번호, 보관 메시지의 seq는 그 메시지의 번호다
+(이전 형식 파일은 0/null로 채운다).
+"""
+
+import json
+import os
+import time
+import zlib
+
+SNAPSHOT_VERSION = 1
+COMPRESS_LEVEL = 1  # 속도 우선 (방 이름/닉 위주라 1로도 충분히 작아진다)
+
+
+def save_snapshot(path: str, rooms: list, tokens: list, history: list | None = None) -> int:
+    """스냅샷 파일 기록 후 바이트 수 반환"""
+    state = {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "rooms": rooms,
+        "tokens": tokens,
+        "history": history or [],
+    }
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    data = zlib.compress(raw, COMPRESS_LEVEL)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(data)
+
+
+def load_snapshot(path: str) -> dict | None:
+    """스냅샷 파일 읽기 (없거나 버전이 다르면 None)"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    state = json.loads(zlib.decompress(data).decode("utf-8"))
+    if state.get("version") != SNAPSHOT_VERSION:
+        return None
+    state.setdefault("history", [])  # history 항목이 없던 이전 스냅샷 호환
+    state["history"] = [[room, [(e + [0])[:4] for e in entries]] for room, entries in state["history"]]
+    state["rooms"] = [(row + [0])[:3] for row in state["rooms"]]
+    state["tokens"] = [(row + [None])[:5] for row in state["tokens"]]
+    return state
@@ -0,0 +1,491 @@
+"""
+프로세스 안에서 명령 처리 경로만 재는 마이크로 벤치마크.
+
+실제 TCP 대신 보낸 바이트를 메모리에 쌓는 FakeSocket을 ClientInfo에 끼워 넣고
+server.process_message에 파싱된 명령을 대량으로 넣어 SUBTYPE별 ns/op를 잽니다.
+네트워크/sleep 없이 파싱, 락 처리, 팬아웃 비용의 회귀를 잡는 용도입니다.
+
+    python test/bench_handlers.py                  # 표로 출력
+    python test/bench_handlers.py -n 1000000 -k ROOM_MSG
+    python -m pytest test/bench_handlers.py        # pytest-benchmark 형식 (없으면 간이 fixture)
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import server  # noqa: E402
+from history import RoomHistory  # noqa: E402
+from memberwatch import MemberWatch  # noqa: E402
+from metrics import Histogram  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from wordfilter import AhoCorasick  # noqa: E402
+
+try:
+    import pytest
+except ImportError:  # 스크립트로만 실행할 때는 pytest 없어도 됨
+    pytest = None
+
+DEFAULT_OPS = 200_000
+DEFAULT_FANOUT_THRESHOLD = server.FANOUT_THRESHOLD
+BANNED_WORDS = 5000
+OWNER_ROOMS = 100_000   # 방장 역색인 비교용 전체 방 수
+FANOUT_ROOM = 5000   # 큰 방 팬아웃 비교용 인원
+FANOUT_MSGS = 50
+FANOUT_SLOW_EVERY = 100   # 이 중 한 명은 소켓 버퍼가 찬 느린 수신자
+FANOUT_SLOW_DELAY = 0.001
+PRESENCE_ROOM = 2000   # 입장/퇴장 알림 비교용 인원
+PRESENCE_CHURN = 100   # 들어왔다 나가는 인원
+MEMBERS_ROOM = 500     # 멤버 목록 조회/구독 비교용 인원
+MEMBERS_WATCHERS = 50  # 그중 목록을 보는 사람 (사이드바)
+MEMBERS_SECONDS = 60   # 흉내 내는 시간: 초마다 1명 입장 + 1명 퇴장
+MEMBERS_POLL = 2.0     # LIST_USER 조회 주기 (초)
+SAMPLE_MESSAGE = "오늘 회의는 세 시에 시작합니다 please bring the quarterly report and 커피"
+
+
+class FakeSocket:
+    """sendall로 받은 바이트를 메모리에 모으는 가짜 소켓"""
+
+    def __init__(self):
+        self.sent = bytearray()
+        self.sends = 0
+        self.total = 0  # 지금까지 보낸 바이트 (sent는 주기적으로 비움)
+
+    def sendall(self, data: bytes):
+        self.sent += data
+        self.sends += 1
+        self.total += len(data)
+        if len(self.sent) > 1 << 20:
+            # 벤치마크 동안 메모리가 계속 늘지 않도록 주기적으로 비운다
+            del self.sent[:]
+
+    def send(self, data: bytes) -> int:
+        self.sendall(data)
+        return len(data)
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+    def lines(self) -> list[str]:
+        return self.sent.decode(server.ENCODING).splitlines()
+
+
+class SlowSocket(FakeSocket):
+    """소켓 송신 버퍼가 차서 sendall이 잠깐 막히는 수신자 흉내 (sleep 동안 GIL을 놓는다)"""
+
+    def sendall(self, data: bytes):
+        time.sleep(FANOUT_SLOW_DELAY)
+        super().sendall(data)
+
+
+def reset_state():
+    server.clients_by_sock.clear()
+    server.clients_by_nick.clear()
+    server.rooms.clear()
+    server.room_owner.clear()
+    server.owned_rooms.clear()
+    server.resume_tokens.clear()
+    server.message_filters.clear()
+    server.room_history = RoomHistory(server.HISTORY_PER_ROOM)
+    server.search_index = SearchIndex(server.SEARCH_MAX_DOCS)
+    server.hot_rooms.clear()
+    server.hot_senders.clear()
+    server.member_watch = MemberWatch()
+
+
+def make_client(nick: str, room: str | None = None) -> server.ClientInfo:
+    """등록(+방 입장)까지 끝난 가짜 클라이언트"""
+    client = server.ClientInfo(FakeSocket(), ("fake", 0))
+    client.nick = nick
+    client.state = server.STATE_REGISTERED
+    server.clients_by_sock[client.sock] = client
+    server.clients_by_nick[nick] = client
+    if room is not None:
+        if room not in server.rooms:
+            server.rooms[room] = {}
+            server.set_room_owner(room, nick)
+        server.rooms[room][client] = None
+        client.room = room
+        client.state = server.STATE_IN_ROOM
+    return client
+
+
+def build_room(room: str, size: int) -> server.ClientInfo:
+    """size명이 들어 있는 방을 만들고 첫 번째 멤버(방장)를 반환"""
+    owner = make_client(f"{room}_0", room)
+    for i in range(1, size):
+        make_client(f"{room}_{i}", room)
+    return owner
+
+
+def case_nick(n):
+    c = build_room("r", 1)
+    return c, ["0|NICK|bench_a", "0|NICK|bench_b"]
+
+
+def fill_rooms(count: int):
+    """다른 사람이 방장인 빈 방 count개 (방장 관련 명령이 전체 방 수에 영향받는지 보기용)"""
+    for i in range(count):
+        room = f"other_{i}"
+        server.rooms[room] = {}
+        server.set_room_owner(room, f"owner_{i % 1000}")
+
+
+def case_nick_many_rooms(n):
+    c = build_room("r", 1)
+    fill_rooms(OWNER_ROOMS)
+    return c, ["0|NICK|bench_a", "0|NICK|bench_b"]
+
+
+def case_owner_leave(n):
+    # 방장이 나갔다 들어오기를 반복 (나갈 때마다 가장 먼저 들어온 멤버에게 위임)
+    c = build_room("r", 100)
+    fill_rooms(OWNER_ROOMS)
+    return c, ["0|LEAVE", "0|JOIN|r"]
+
+
+def case_create_delete(n):
+    c = make_client("creator")
+    fill_rooms(OWNER_ROOMS)
+    return c, ["0|CREATE_ROOM|tmp", "0|DELETE_ROOM"]
+
+
+def case_join(n):
+    c = build_room("r", 10)
+    build_room("r2", 10)
+    return c, ["0|JOIN|r2", "0|JOIN|r"]
+
+
+def case_create_room(n):
+    c = make_client("creator")
+    return c, [f"0|CREATE_ROOM|room_{i}" for i in range(n)]
+
+
+def case_room_msg(size):
+    def setup(n):
+        c = build_room("r", size)
+        return c, ["1|ROOM_MSG|hello world"]
+    return setup
+
+
+def case_dm(n):
+    c = build_room("r", 2)
+    return c, ["1|DM|r_1|hello"]
+
+
+def case_list_user(n):
+    c = build_room("r", 100)
+    return c, ["2|LIST_USER"]
+
+
+def case_list_all(n):
+    c = build_room("r", 100)
+    return c, ["2|LIST_ALL"]
+
+
+def case_bad_format(n):
+    c = build_room("r", 1)
+    return c, ["garbage"]
+
+
+def case_unknown_type(n):
+    c = build_room("r", 1)
+    return c, ["x|ROOM_MSG|hi"]
+
+
+def banned_words(n: int) -> list[str]:
+    """재현 가능한 가짜 금칙어 목록 (한글/영문 섞어서 3~6글자)"""
+    rng = random.Random(42)
+    alphabet = "abcdefghijklmnopqrstuvwxyz가나다라마바사아자차카타파하"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(3, 6))) for _ in range(n)]
+
+
+def case_room_msg_filtered(size):
+    def setup(n):
+        c = build_room("r", size)
+        server.message_filters.append(AhoCorasick(banned_words(BANNED_WORDS)).mask)
+        return c, [f"1|ROOM_MSG|{SAMPLE_MESSAGE}"]
+    return setup
+
+
+def case_search(docs):
+    def setup(n):
+        c = build_room("r", 2)
+        rng = random.Random(7)
+        words = SAMPLE_MESSAGE.split()
+        for i in range(docs):
+            msg = " ".join(rng.sample(words, 4))
+            server.search_index.add("r", f"r_{i % 2}", msg, float(i))
+        return c, ["2|SEARCH|회의", "2|SEARCH|quarterly report", "2|SEARCH|커피 from:r_1"]
+    return setup
+
+
+CASES = {
+    "0|NICK": case_nick,
+    "0|NICK(100k rooms)": case_nick_many_rooms,
+    "0|LEAVE+JOIN owner(100k rooms)": case_owner_leave,
+    "0|CREATE+DELETE(100k rooms)": case_create_delete,
+    "0|JOIN(10)": case_join,
+    "0|CREATE_ROOM": case_create_room,
+    "1|ROOM_MSG(1)": case_room_msg(1),
+    "1|ROOM_MSG(10)": case_room_msg(10),
+    "1|ROOM_MSG(100)": case_room_msg(100),
+    "1|ROOM_MSG(10)+filter": case_room_msg_filtered(10),
+    "1|DM": case_dm,
+    "2|LIST_USER(100)": case_list_user,
+    "2|LIST_ALL(100)": case_list_all,
+    "2|SEARCH(10k docs)": case_search(10_000),
+    "BAD_FORMAT": case_bad_format,
+    "UNKNOWN_TYPE": case_unknown_type,
+}
+
+# 케이스별로 각 명령을 한 번씩 보냈을 때 보낸 사람이 받아야 하는 응답 (순서대로, 줄 앞부분)
+EXPECTED = {
+    "0|NICK": ["NICK_OK|bench_a", "NICK_OK|bench_b"],
+    "0|NICK(100k rooms)": ["NICK_OK|bench_a", "NICK_OK|bench_b"],
+    "0|LEAVE+JOIN owner(100k rooms)": ["LEAVE_OK|r", "JOIN_OK|r"],
+    "0|CREATE+DELETE(100k rooms)": ["CREATE_ROOM_OK|tmp", "DELETE_ROOM_OK|tmp"],
+    "0|JOIN(10)": ["JOIN_OK|r2", "JOIN_OK|r"],
+    "0|CREATE_ROOM": ["CREATE_ROOM_OK|room_0", "CREATE_ROOM_OK|room_1"],
+    "1|ROOM_MSG(1)": ["ROOM_MSG|r|r_0|hello world"],
+    "1|ROOM_MSG(10)": ["ROOM_MSG|r|r_0|hello world"],
+    "1|ROOM_MSG(100)": ["ROOM_MSG|r|r_0|hello world"],
+    "1|ROOM_MSG(10)+filter": ["ROOM_MSG|r|r_0|오늘 회의는 세 시에 시작합니다 please bring the ***"],
+    "1|DM": ["SUCCESS|DM|r_1"],
+    "2|LIST_USER(100)": ["USER_LIST|r|r_0,r_1,"],
+    "2|LIST_ALL(100)": ["USER_LIST_ALL|r_0,r_1,"],
+    "2|SEARCH(10k docs)": ["SEARCH_RESULT|r|", "SEARCH_END|r|", "SEARCH_RESULT|r|", "SEARCH_END|r|",
+                           "SEARCH_RESULT|r|", "SEARCH_END|r|"],
+    "BAD_FORMAT": ["ERROR|BAD_FORMAT|"],
+    "UNKNOWN_TYPE": ["ERROR|UNKNOWN_TYPE|"],
+}
+
+
+def run_case(name: str, n: int) -> float:
+    """케이스 하나를 n번 실행하고 ns/op 반환"""
+    reset_state()
+    client, lines = CASES[name](n)
+    if len(lines) < n:
+        lines = (lines * (n // len(lines) + 1))[:n]
+    process = server.process_message
+    # 서버 로그 print는 벤치마크 출력에서 제외
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter_ns()
+        for line in lines:
+            process(client, line)
+        elapsed = time.perf_counter_ns() - started
+    return elapsed / n
+
+
+def case_replies(name: str) -> list[str]:
+    """케이스의 명령을 한 번씩만 보내고 보낸 사람 FakeSocket에 쌓인 응답 줄 반환"""
+    reset_state()
+    client, lines = CASES[name](2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for line in lines:
+            server.process_message(client, line)
+    return client.sock.lines()
+
+
+def bench_filter(n: int) -> tuple[float, float]:
+    """메시지 하나당 금칙어 검사 비용: (Aho-Corasick ns, 단어별 `in` 검사 ns)"""
+    words = banned_words(BANNED_WORDS)
+    automaton = AhoCorasick(words)
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        automaton.mask(SAMPLE_MESSAGE)
+    ac_ns = (time.perf_counter_ns() - started) / n
+
+    naive_n = max(1, n // 100)
+    started = time.perf_counter_ns()
+    for _ in range(naive_n):
+        lowered = SAMPLE_MESSAGE.lower()
+        for w in words:
+            if w in lowered:
+                pass
+    naive_ns = (time.perf_counter_ns() - started) / naive_n
+    return ac_ns, naive_ns
+
+
+def bench_fanout(size: int, msgs: int) -> tuple[float, float, str]:
+    """
+    큰 방 ROOM_MSG 한 건당 보낸 사람 스레드가 묶이는 시간: (직접 전송 ns, 워커 풀 ns, 완료 지연 요약)
+    """
+    reset_state()
+    client = build_room("big", size)
+    for i, member in enumerate(server.rooms["big"]):
+        if member is not client and i % FANOUT_SLOW_EVERY == 0:
+            member.sock = SlowSocket()
+    line = "1|ROOM_MSG|hello world"
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.FANOUT_THRESHOLD = size + 1  # 직접 전송
+        started = time.perf_counter_ns()
+        for _ in range(msgs):
+            server.process_message(client, line)
+        direct_ns = (time.perf_counter_ns() - started) / msgs
+
+        server.fanout.start()
+        server.fanout.completion = Histogram()
+        server.FANOUT_THRESHOLD = 1
+        started = time.perf_counter_ns()
+        for _ in range(msgs):
+            server.process_message(client, line)
+        pooled_ns = (time.perf_counter_ns() - started) / msgs
+        while not server.fanout.idle():
+            time.sleep(0.01)
+    server.FANOUT_THRESHOLD = DEFAULT_FANOUT_THRESHOLD
+    return direct_ns, pooled_ns, server.fanout.completion.summary()
+
+
+def bench_presence(size: int, churn: int) -> list[tuple[str, int, float]]:
+    """
+    size명 방에 churn명이 들어왔다가 나갈 때 기존 멤버가 받은 줄 수와 걸린 시간: [(모드, 줄 수, ms)]
+    batched는 입장이 다 끝난 뒤, 퇴장이 다 끝난 뒤 한 번씩 요약을 보낸다 (window가 각 단계보다 긴 경우)
+    """
+    saved = server.PRESENCE_BATCH_MEMBERS, server.PRESENCE_MAX_MEMBERS
+    server.presence.start()
+    everyone = size + churn + 1
+    server.FANOUT_THRESHOLD = everyone + 1  # 줄 수를 바로 셀 수 있게 직접 전송
+    results = []
+    for name, batch_members, max_members in (
+        ("immediate", everyone, everyone),
+        ("batched", 1, everyone),
+        ("suppressed", 1, size - 1),
+    ):
+        reset_state()
+        build_room("big", size)
+        members = list(server.rooms["big"])
+        visitors = [make_client(f"visitor_{i}") for i in range(churn)]
+        server.PRESENCE_BATCH_MEMBERS, server.PRESENCE_MAX_MEMBERS = batch_members, max_members
+        server.presence.flush()
+        before = sum(m.sock.sends for m in members)
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for v in visitors:
+                server.process_message(v, "0|JOIN|big")
+            server.presence.flush()
+            for v in visitors:
+                server.process_message(v, "0|LEAVE")
+            server.presence.flush()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        results.append((name, sum(m.sock.sends for m in members) - before, elapsed_ms))
+    server.PRESENCE_BATCH_MEMBERS, server.PRESENCE_MAX_MEMBERS = saved
+    server.FANOUT_THRESHOLD = DEFAULT_FANOUT_THRESHOLD
+    return results
+
+
+def bench_members(size: int, watchers: int, seconds: int, poll: float) -> list[tuple[str, int, int]]:
+    """
+    watchers명이 멤버 목록을 최신으로 유지하는 데 받은 바이트: [(방식, 바이트, 줄 수)]
+    poll은 poll초마다 LIST_USER, watch는 WATCH_MEMBERS 후 MEMBER_WINDOW마다 변경 묶음
+    (입장/퇴장 SYSTEM 알림은 두 방식에 똑같이 가므로 끄고 잰다)
+    """
+    saved = server.PRESENCE_MAX_MEMBERS
+    server.PRESENCE_MAX_MEMBERS = 0
+    window = server.MEMBER_WINDOW
+    ticks_per_second = round(1 / window)
+    results = []
+    for mode in ("poll", "watch"):
+        reset_state()
+        build_room("big", size)
+        viewers = list(server.rooms["big"])[:watchers]
+        visitors = [make_client(f"visitor_{i}") for i in range(seconds)]
+        before = [(v.sock.total, v.sock.sends) for v in viewers]
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == "watch":
+                for v in viewers:
+                    server.process_message(v, "2|WATCH_MEMBERS|big")
+            for tick in range(seconds * ticks_per_second):
+                now = tick * window
+                if tick % ticks_per_second == 0:
+                    # 초마다 한 명 입장, 1초 전에 들어온 사람은 퇴장
+                    second = tick // ticks_per_second
+                    server.process_message(visitors[second], "0|JOIN|big")
+                    if second:
+                        server.process_message(visitors[second - 1], "0|LEAVE")
+                if mode == "watch":
+                    server.flush_member_events()
+                elif abs(now / poll - round(now / poll)) < 1e-9:
+                    for v in viewers:
+                        server.process_message(v, "2|LIST_USER")
+        received = sum(v.sock.total - t for v, (t, _) in zip(viewers, before))
+        lines = sum(v.sock.sends - n for v, (_, n) in zip(viewers, before))
+        results.append((mode, received, lines))
+    server.PRESENCE_MAX_MEMBERS = saved
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--ops", type=int, default=DEFAULT_OPS, help="케이스당 명령 수")
+    parser.add_argument("-k", "--filter", default="", help="이름에 이 문자열이 들어간 케이스만")
+    args = parser.parse_args()
+
+    print(f"{'case':30s} {'ns/op':>10s} {'ops/s':>12s}")
+    for name in CASES:
+        if args.filter and args.filter not in name:
+            continue
+        ns = run_case(name, args.ops)
+        print(f"{name:30s} {ns:10.0f} {1e9 / ns:12.0f}")
+
+    if not args.filter or "filter" in args.filter:
+        ac_ns, naive_ns = bench_filter(min(args.ops, 100_000))
+        print(f"\nfilter per message ({BANNED_WORDS} words, {len(SAMPLE_MESSAGE)} chars): "
+              f"aho-corasick {ac_ns:.0f} ns, naive {naive_ns:.0f} ns")
+
+    if not args.filter or "fanout" in args.filter:
+        direct_ns, pooled_ns, completion = bench_fanout(FANOUT_ROOM, FANOUT_MSGS)
+        print(f"\nfanout {FANOUT_ROOM} members (1/{FANOUT_SLOW_EVERY} slow), sender blocked per message: "
+              f"direct {direct_ns / 1000:.0f} us, worker pool {pooled_ns / 1000:.0f} us")
+        print(f"  pool completion: {completion}")
+
+    if not args.filter or "presence" in args.filter:
+        print(f"\npresence {PRESENCE_ROOM} members, {PRESENCE_CHURN} join+leave, lines received by members:")
+        for mode, lines, ms in bench_presence(PRESENCE_ROOM, PRESENCE_CHURN):
+            print(f"  {mode:10s} {lines:8d} lines {ms:8.1f} ms")
+
+    if not args.filter or "members" in args.filter:
+        print(f"\nmember list {MEMBERS_ROOM} members, {MEMBERS_WATCHERS} viewers, {MEMBERS_SECONDS}s of 1 join+1 leave/s, "
+              f"bytes received by viewers:")
+        for mode, received, lines in bench_members(MEMBERS_ROOM, MEMBERS_WATCHERS, MEMBERS_SECONDS, MEMBERS_POLL):
+            label = f"LIST_USER every {MEMBERS_POLL:g}s" if mode == "poll" else f"WATCH_MEMBERS ({server.MEMBER_WINDOW:g}s)"
+            print(f"  {label:24s} {received:10d} bytes {lines:7d} writes")
+
+
+if pytest is not None:
+    try:
+        import pytest_benchmark  # noqa: F401
+    except ImportError:
+        @pytest.fixture
+        def benchmark():
+            """pytest-benchmark가 없을 때 쓰는 간이 fixture (한 번 실행 후 결과 출력)"""
+            def run(fn, *args):
+                result = fn(*args)
+                print(f"{args[0]}: {result:.0f} ns/op")
+                return result
+            return run
+
+    @pytest.mark.parametrize("name", list(CASES))
+    def test_dispatch(benchmark, name):
+        # 재기 전에 응답이 맞는지부터 본다 (틀린 응답을 빠르게 보내는 회귀도 잡도록)
+        replies = case_replies(name)
+        rest = iter(replies)
+        for expected in EXPECTED[name]:
+            assert any(line.startswith(expected) for line in rest), (expected, replies)
+        if not any(e.startswith("ERROR|") for e in EXPECTED[name]):
+            assert not any(line.startswith("ERROR|") for line in replies), replies
+        ns = benchmark(run_case, name, 20_000)
+        assert ns > 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+재접속 폭주(동시 접속) 벤치마크 스크립트.
+
+사전 조건: 서버가 127.0.0.1:5005에서 실행 중이어야 합니다.
+    python server.py --port 5005 --backlog 4096 --max-connections 20000
+
+한 프로세스에서 논블로킹 connect를 N개(기본 10,000개) 동시에 걸고
+- connect: connect() 호출 ~ TCP 연결 완료
+- ready  : connect() 호출 ~ NICK_OK 수신 (서버가 accept 후 처리 스레드를 띄운 시점)
+분포와 SERVER_FULL/실패 수를 출력합니다. 파일 디스크립터 한도가 N보다 커야 합니다.
+"""
+
+import argparse
+import errno
+import resource
+import selectors
+import socket
+import time
+
+HOST = "127.0.0.1"
+PORT = 5005
+ENCODING = "utf-8"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def report(name: str, values: list[float]):
+    ms = [v * 1000 for v in values]
+    print(
+        f"{name:8s} n={len(ms):6d}  p50={percentile(ms, 50):9.2f}ms  p90={percentile(ms, 90):9.2f}ms  "
+        f"p99={percentile(ms, 99):9.2f}ms  max={max(ms, default=0):9.2f}ms"
+    )
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients + 64)
+    sel = selectors.DefaultSelector()
+    started_at: dict[socket.socket, float] = {}
+    connect_times: list[float] = []
+    ready_times: list[float] = []
+    buffers: dict[socket.socket, str] = {}
+    full = failed = 0
+    tag = int(time.time()) % 100000
+
+    begin = time.perf_counter()
+    for i in range(args.clients):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setblocking(False)
+        err = s.connect_ex((args.host, args.port))
+        if err not in (0, errno.EINPROGRESS):
+            failed += 1
+            s.close()
+            continue
+        started_at[s] = time.perf_counter()
+        sel.register(s, selectors.EVENT_WRITE, ("connecting", i))
+    issued = time.perf_counter() - begin
+
+    deadline = time.perf_counter() + args.timeout
+    pending = len(started_at)
+    while pending and time.perf_counter() < deadline:
+        for key, mask in sel.select(timeout=1.0):
+            s = key.fileobj
+            phase, i = key.data
+            now = time.perf_counter()
+            if phase == "connecting":
+                err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err:
+                    failed += 1
+                    pending -= 1
+                    sel.unregister(s)
+                    s.close()
+                    continue
+                connect_times.append(now - started_at[s])
+                s.send(f"0|NICK|cb{tag}_{i}\n".encode(ENCODING))
+                buffers[s] = ""
+                sel.modify(s, selectors.EVENT_READ, ("reading", i))
+                continue
+
+            try:
+                data = s.recv(4096)
+            except OSError:
+                data = b""
+            buffers[s] += data.decode(ENCODING)
+            if "NICK_OK" in buffers[s]:
+                ready_times.append(now - started_at[s])
+            elif "SERVER_FULL" in buffers[s]:
+                full += 1
+            elif data:
+                continue
+            else:
+                failed += 1
+            pending -= 1
+            sel.unregister(s)
+
+    elapsed = time.perf_counter() - begin
+    print(f"clients={args.clients} issued_in={issued:.2f}s elapsed={elapsed:.2f}s "
+          f"ready={len(ready_times)} server_full={full} failed={failed} timed_out={pending}")
+    report("connect", connect_times)
+    report("ready", ready_times)
+
+    for s in list(started_at):
+        try:
+            s.close()
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@
 11) LIST_ALL 인자 추가 → BAD_FORMAT
 12) 방장 아님 상태에서 DELETE_ROOM → INVALID_STATE
 13) UNKNOWN_SUBTYPE / UNKNOWN_TYPE → 에러 반환
+14) 구독 없이 방 하나만 쓰는 연결이 '|'가 든 ROOM_MSG → (없는 방 NOT_IN_ROOM이 아니라) BAD_FORMAT
 """
 
 import socket
@@ -144,6 +145,11 @@ def main():
         time.sleep(0.2)
         collect()
 
+        # 14) 방 하나만 쓰는 a의 메시지에 '|'가 들어 있음
+        send(a, "1|ROOM_MSG|a|b")
+        time.sleep(0.2)
+        collect()
+
         # 검증
         expect(logs["c"], "ERROR|NEED_NICK", "c join/listall without nick")
         expect(logs["c"], "ERROR|NICK_IN_USE", "c duplicate nick")
@@ -158,6 +164,8 @@ def main():
         expect(logs["b"], "ERROR|INVALID_STATE", "b delete not owner")
         expect(logs["a"], "ERROR|UNKNOWN_SUBTYPE", "a unknown subtype")
         expect(logs["b"], "ERROR|UNKNOWN_TYPE", "b unknown type")
+        expect(logs["a"], "ERROR|BAD_FORMAT|ROOM_MSG requires message", "a single-room msg with '|'")
+        assert not any(line.startswith("ERROR|NOT_IN_ROOM") for line in logs["a"]), logs["a"]
 
         print("=== logs a ===")
         for line in logs["a"]:
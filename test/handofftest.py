@@ -0,0 +1,166 @@
+"""
+무중단 재시작(소켓 넘기기)을 검증하는 테스트 스크립트.
+
+서버를 직접 띄운다 (127.0.0.1:5006, Unix 소켓 /tmp/npchat-handoff-test.sock).
+리눅스 등 SCM_RIGHTS를 지원하는 플랫폼에서만 동작한다.
+
+시나리오:
+1) a가 방 생성, b 입장. a는 줄을 반쯤만 보내 둔다.
+2) 같은 포트로 새 서버를 --takeover로 띄움 → 이전 서버 종료
+3) a가 나머지 줄을 보내고 b가 메시지 전송 → 연결 끊김 없이 둘 다 받음
+4) b의 LIST_USER에 a/b가 그대로 있음 (방 상태 유지)
+5) 새 연결도 새 서버가 받음
+6) d는 넘기기 전부터 끝날 때까지 쉬지 않고 ROOM_MSG를 보냄 → 보낸 줄이 하나도 빠지지 않고 돌아옴
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HOST = "127.0.0.1"
+PORT = 5006
+HANDOFF_PATH = "/tmp/npchat-handoff-test.sock"
+ENCODING = "utf-8"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+
+
+def send(sock: socket.socket, line: str):
+    sock.sendall((line + "\n").encode(ENCODING))
+
+
+def recv_all(sock: socket.socket, delay: float = 0.3):
+    """delay 동안 논블로킹으로 수신한 모든 줄을 리스트로 반환"""
+    sock.setblocking(False)
+    end_time = time.time() + delay
+    buf = b""
+    while time.time() < end_time:
+        try:
+            data = sock.recv(4096)
+            if not data:
+                break
+            buf += data
+        except BlockingIOError:
+            time.sleep(0.01)
+    return [line.strip() for line in buf.decode(ENCODING).split("\n") if line.strip()]
+
+
+def expect(log, needle, who):
+    if not any(needle in line for line in log):
+        raise AssertionError(f"[{who}] '{needle}' not found in {log}")
+
+
+class Streamer:
+    """넘기기 동안 쉬지 않고 보내고, 돌아온 자기 메시지를 따로 읽어 모아 둔다"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.sent = 0
+        self.received = b""
+        self.stop = threading.Event()
+
+    def write(self):
+        while not self.stop.is_set():
+            send(self.sock, f"1|ROOM_MSG|s{self.sent}")
+            self.sent += 1
+            time.sleep(0.001)
+
+    def read(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            self.received += data
+
+    def echoed(self) -> list[str]:
+        return [line.split("|")[3] for line in self.received.decode(ENCODING).split("\n")
+                if line.startswith("ROOM_MSG|stream|d|")]
+
+
+def start_server(*extra) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(PORT), *extra],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+
+
+def main():
+    old = start_server("--handoff-socket", HANDOFF_PATH)
+    new = None
+    time.sleep(0.8)
+    a = socket.create_connection((HOST, PORT))
+    b = socket.create_connection((HOST, PORT))
+    d = socket.create_connection((HOST, PORT))
+    try:
+        send(a, "0|NICK|a")
+        send(a, "0|CREATE_ROOM|handoff")
+        time.sleep(0.2)
+        send(b, "0|NICK|b")
+        send(b, "0|JOIN|handoff")
+        time.sleep(0.2)
+        send(d, "0|NICK|d")
+        send(d, "0|CREATE_ROOM|stream")
+        time.sleep(0.2)
+        recv_all(a)
+        recv_all(b)
+        recv_all(d)
+        d.setblocking(True)
+        streamer = Streamer(d)
+        threads = [threading.Thread(target=streamer.read, daemon=True), threading.Thread(target=streamer.write)]
+        for t in threads:
+            t.start()
+        # 줄을 반만 보낸 상태에서 넘기기 (나머지는 새 서버가 이어 받아야 함)
+        a.sendall("1|ROOM_MSG|넘기기 ".encode(ENCODING))
+
+        new = start_server("--takeover", HANDOFF_PATH)
+        old.wait(timeout=5)
+        time.sleep(0.2)
+        streamer.stop.set()
+        threads[1].join()
+
+        a.sendall("전에 보낸 줄\n".encode(ENCODING))
+        send(b, "1|ROOM_MSG|넘긴 뒤")
+        send(b, "2|LIST_USER")
+        time.sleep(0.3)
+        log_a, log_b = recv_all(a), recv_all(b)
+
+        c = socket.create_connection((HOST, PORT))
+        send(c, "0|NICK|c")
+        log_c = recv_all(c)
+        c.close()
+
+        expect(log_a, "ROOM_MSG|handoff|a|넘기기 전에 보낸 줄", "a partial line completed")
+        expect(log_b, "ROOM_MSG|handoff|a|넘기기 전에 보낸 줄", "b got a's line")
+        expect(log_a, "ROOM_MSG|handoff|b|넘긴 뒤", "a got b's line")
+        expect(log_b, "USER_LIST|handoff|a,b", "room members kept")
+        expect(log_c, "NICK_OK|c", "new connection accepted by new server")
+        assert old.returncode == 0, old.returncode
+        echoed = streamer.echoed()
+        got = set(echoed)
+        missing = [i for i in range(streamer.sent) if f"s{i}" not in got]
+        assert not missing and len(echoed) == streamer.sent, (streamer.sent, len(echoed), missing[:10])
+
+        print("=== a logs ===")
+        for line in log_a:
+            print(line)
+        print("=== b logs ===")
+        for line in log_b:
+            print(line)
+        print("\nhandofftest passed.")
+    finally:
+        a.close()
+        b.close()
+        d.close()
+        for proc in (old, new):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+ROOM_MSG 종단 간 지연 벤치마크 스크립트.
+
+사전 조건: 서버가 127.0.0.1:5005에서 실행 중이어야 합니다.
+    python server.py --port 5005 [--trace-sample 0.1 --admin root]
+
+송신자 여러 명과 수신자 여러 명이 한 방에 들어가고, 모든 소켓이 SRV_TS 기능을
+켭니다. 메시지 본문에 클라이언트 송신 시각을 넣고 서버가 덧붙인 srv_ts와 수신
+시각을 비교해 지연을 두 구간으로 나눕니다.
+
+- inbound : 송신 -> 서버 수신 (송신 측 네트워크/소켓)
+- outbound: 서버 수신 -> 수신자 도착 (서버 처리 + 브로드캐스트 + 수신 측 네트워크)
+
+같은 PC(또는 시계가 동기화된 PC)에서 실행해야 의미가 있습니다.
+"""
+
+import argparse
+import random
+import socket
+import threading
+import time
+
+HOST = "127.0.0.1"
+PORT = 5005
+ENCODING = "utf-8"
+
+
+def send(sock: socket.socket, line: str):
+    sock.sendall((line + "\n").encode(ENCODING))
+
+
+def read_lines(sock: socket.socket):
+    """소켓에서 한 줄씩 읽어 내보내는 제너레이터"""
+    buf = ""
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return
+        buf += data.decode(ENCODING)
+        while "\n" in buf:
+            line, buf = buf.split("\n", 1)
+            yield line.strip()
+
+
+def wait_for(lines, prefix: str):
+    for line in lines:
+        if line.startswith(prefix):
+            return line
+    raise AssertionError(f"connection closed before '{prefix}'")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(len(values) * pct / 100.0))
+    return values[idx]
+
+
+def report(name: str, values: list[float]):
+    ms = [v * 1000 for v in values]
+    print(
+        f"{name:9s} n={len(ms):6d}  p50={percentile(ms, 50):8.3f}ms  "
+        f"p90={percentile(ms, 90):8.3f}ms  p99={percentile(ms, 99):8.3f}ms  max={max(ms, default=0):8.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--senders", type=int, default=2)
+    parser.add_argument("--receivers", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=500, help="송신자당 메시지 수")
+    parser.add_argument("--interval", type=float, default=0.001, help="송신 간격 (초)")
+    args = parser.parse_args()
+
+    room = f"bench_{int(time.time() * 1000) % 100000}_{random.randint(0, 999)}"
+    total = args.senders + args.receivers
+    socks = [socket.create_connection((args.host, args.port)) for _ in range(total)]
+    readers = [read_lines(s) for s in socks]
+
+    for i, (s, lines) in enumerate(zip(socks, readers)):
+        send(s, "0|CAPS|SRV_TS")
+        wait_for(lines, "CAPS_OK")
+        send(s, f"0|NICK|lb{i}_{room}")
+        wait_for(lines, "NICK_OK")
+        send(s, f"0|CREATE_ROOM|{room}" if i == 0 else f"0|JOIN|{room}")
+        wait_for(lines, "CREATE_ROOM_OK" if i == 0 else "JOIN_OK")
+
+    expected = args.senders * args.messages
+    inbound: list[float] = []
+    outbound: list[float] = []
+    samples_lock = threading.Lock()
+
+    def receiver(lines):
+        got = 0
+        for line in lines:
+            parts = line.split("|")
+            if parts[0] != "ROOM_MSG" or not parts[3].startswith("lb:"):
+                continue
+            now = time.time()
+            sent_at = float(parts[3].split(":")[2])
+            srv_ts = float(parts[-1].partition("=")[2])
+            with samples_lock:
+                inbound.append(srv_ts - sent_at)
+                outbound.append(now - srv_ts)
+            got += 1
+            if got >= expected:
+                return
+
+    threads = [threading.Thread(target=receiver, args=(r,), daemon=True) for r in readers]
+    for t in threads:
+        t.start()
+
+    def sender(idx: int, s: socket.socket):
+        for n in range(args.messages):
+            send(s, f"1|ROOM_MSG|lb:{idx}-{n}:{time.time():.6f}")
+            if args.interval:
+                time.sleep(args.interval)
+
+    started = time.time()
+    senders = [threading.Thread(target=sender, args=(i, socks[i])) for i in range(args.senders)]
+    for t in senders:
+        t.start()
+    for t in senders:
+        t.join()
+    for t in threads:
+        t.join(timeout=30)
+    elapsed = time.time() - started
+
+    print(f"room={room} senders={args.senders} receivers={args.receivers} messages={expected} elapsed={elapsed:.2f}s")
+    report("inbound", inbound)
+    report("outbound", outbound)
+    report("total", [a + b for a, b in zip(inbound, outbound)])
+
+    for s in socks:
+        try:
+            send(s, "0|QUIT")
+            s.close()
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+멤버 목록 구독(WATCH_MEMBERS)을 검증하는 테스트 스크립트.
+
+서버를 직접 띄운다 (127.0.0.1:5007, --member-window 0.1).
+
+시나리오:
+1) a가 방 생성 후 WATCH_MEMBERS → MEMBERS|room|0|a|a
+2) b, c 입장, c 퇴장 (한 묶음 안) → c는 상쇄되어 MEMBER_ADD에 b만
+3) a가 나가 방장이 b로 → MEMBER_DEL a + OWNER_CHANGE b, version은 묶음마다 +1
+4) client.py 상태 반영: 변경을 적용한 멤버 목록이 LIST_USER와 같음
+5) version을 건너뛴 줄을 넣으면 client.py가 WATCH_MEMBERS를 다시 보내 전체 목록으로 맞춤
+6) c 입장 후 방장 b가 DELETE_ROOM → 삭제 대신 c에게 위임, MEMBER_DEL b + OWNER_CHANGE c
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import client  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 5007
+ENCODING = "utf-8"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+
+
+def send(sock: socket.socket, line: str):
+    sock.sendall((line + "\n").encode(ENCODING))
+
+
+def recv_all(sock: socket.socket, delay: float = 0.3):
+    """delay 동안 논블로킹으로 수신한 모든 줄을 리스트로 반환"""
+    sock.setblocking(False)
+    end_time = time.time() + delay
+    buf = b""
+    while time.time() < end_time:
+        try:
+            data = sock.recv(4096)
+            if not data:
+                break
+            buf += data
+        except BlockingIOError:
+            time.sleep(0.01)
+    return [line.strip() for line in buf.decode(ENCODING).split("\n") if line.strip()]
+
+
+def expect(log, needle, who):
+    if not any(needle in line for line in log):
+        raise AssertionError(f"[{who}] '{needle}' not found in {log}")
+
+
+def new_state(sock: socket.socket) -> dict:
+    return {
+        "nick": None, "room": None, "subs": [], "active": None, "resume_token": None,
+        "members": {}, "outbox": [], "seq": {}, "caps": None,
+        "sock": sock, "quitting": False, "lock": threading.Lock(),
+    }
+
+
+def main():
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(PORT), "--member-window", "0.1"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+    time.sleep(0.8)
+    w, a, b, c = (socket.create_connection((HOST, PORT)) for _ in range(4))
+    try:
+        send(a, "0|NICK|a")
+        send(a, "0|CREATE_ROOM|watch")
+        time.sleep(0.2)
+        send(w, "0|NICK|w")
+        send(w, "2|WATCH_MEMBERS|watch")
+        log = recv_all(w)
+        expect(log, "MEMBERS|watch|0|a|a", "snapshot")
+        state = new_state(w)
+        client.update_state_batch(log, state)
+
+        send(b, "0|NICK|b")
+        send(c, "0|NICK|c")
+        send(b, "0|JOIN|watch")
+        send(c, "0|JOIN|watch")
+        send(c, "0|LEAVE")
+        time.sleep(0.3)
+        send(a, "0|LEAVE")
+        log = recv_all(w, 0.5)
+        client.update_state_batch(log, state)
+        expect(log, "MEMBER_ADD|watch|1|b", "coalesced join")
+        assert not any(line.startswith("MEMBER_ADD") and "c" in line.split("|")[3] for line in log), log
+        expect(log, "MEMBER_DEL|watch|2|a", "owner left")
+        expect(log, "OWNER_CHANGE|watch|2|b", "owner passed")
+
+        view = state["members"]["watch"]
+        send(b, "2|LIST_USER")
+        listed = recv_all(b)
+        expect(listed, f"USER_LIST|watch|{','.join(view['nicks'])}", "view matches LIST_USER")
+        assert view["owner"] == "b" and view["version"] == 2, view
+
+        # 묶음 3을 놓친 척: version 4가 오면 다시 구독해서 전체 목록을 받는다
+        client.update_state_batch(["MEMBER_ADD|watch|4|ghost"], state)
+        assert view["resync"], view
+        log = recv_all(w)
+        expect(log, "MEMBERS|watch|2|b|b", "resync snapshot")
+        client.update_state_batch(log, state)
+        assert list(state["members"]["watch"]["nicks"]) == ["b"], state["members"]
+
+        # 다른 멤버가 있을 때 DELETE_ROOM은 위임 + 퇴장이므로 퇴장도 기록되어야 한다
+        send(c, "0|JOIN|watch")
+        time.sleep(0.3)
+        send(b, "0|DELETE_ROOM")
+        log = recv_all(w, 0.5)
+        client.update_state_batch(log, state)
+        expect(log, "MEMBER_ADD|watch|3|c", "c joined")
+        expect(log, "MEMBER_DEL|watch|4|b", "owner left by delete")
+        expect(log, "OWNER_CHANGE|watch|4|c", "owner passed by delete")
+        view = state["members"]["watch"]
+        assert list(view["nicks"]) == ["c"] and view["owner"] == "c" and not view["resync"], view
+
+        print("=== watcher logs ===")
+        print("\n".join(log))
+        print("\nmembertest passed.")
+    finally:
+        for s in (w, a, b, c):
+            s.close()
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@
 
 시나리오:
 1) owner가 방 생성, member1/2 입장.
-2) owner가 /delete → 남은 멤버 중 랜덤 1명이 방장 승계, owner는 방 밖으로 나감.
+2) owner가 /delete → 남은 멤버 중 가장 먼저 들어온 1명이 방장 승계, owner는 방 밖으로 나감.
 3) 새 방장이 아닌 멤버가 /leave → 방에 새 방장만 남게 함.
 4) 새 방장이 /delete → 방 삭제 완료.
 5) 이후 모두 방 메시지 시도 → NOT_IN_ROOM 에러 기대.
@@ -0,0 +1,92 @@
+"""
+방 메시지 검색(SEARCH)을 검증하는 테스트 스크립트.
+
+서버를 직접 띄운다 (127.0.0.1:5011).
+
+시나리오:
+1) a가 방 생성 후 "x", "밥먹자 오늘", "회의 세 시" 전송
+2) 한 글자 검색어 "x", "밥"은 부분 문자열로, "회의"는 색인으로 찾음
+3) a가 방을 삭제하고 같은 이름으로 다시 만듦 → 예전 메시지는 한 글자/두 글자 검색 모두 안 나옴
+4) 새 방에서 보낸 메시지는 다시 검색됨
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HOST = "127.0.0.1"
+PORT = 5011
+ENCODING = "utf-8"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+
+
+def send(sock: socket.socket, line: str):
+    sock.sendall((line + "\n").encode(ENCODING))
+
+
+def recv_all(sock: socket.socket, delay: float = 0.3):
+    """delay 동안 논블로킹으로 수신한 모든 줄을 리스트로 반환"""
+    sock.setblocking(False)
+    end_time = time.time() + delay
+    buf = b""
+    while time.time() < end_time:
+        try:
+            data = sock.recv(4096)
+            if not data:
+                break
+            buf += data
+        except BlockingIOError:
+            time.sleep(0.01)
+    return [line.strip() for line in buf.decode(ENCODING).split("\n") if line.strip()]
+
+
+def search(sock: socket.socket, query: str) -> list[str]:
+    """검색 결과 메시지 본문 목록 (최신순)"""
+    send(sock, f"2|SEARCH|{query}")
+    log = recv_all(sock)
+    if not any(line.startswith("SEARCH_END|") for line in log):
+        raise AssertionError(f"no SEARCH_END for '{query}': {log}")
+    return [line.split("|", 4)[4] for line in log if line.startswith("SEARCH_RESULT|")]
+
+
+def main():
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(PORT)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+    time.sleep(0.8)
+    a = socket.create_connection((HOST, PORT))
+    try:
+        send(a, "0|NICK|a")
+        send(a, "0|CREATE_ROOM|find")
+        for msg in ("x", "밥먹자 오늘", "회의 세 시"):
+            send(a, f"1|ROOM_MSG|{msg}")
+        recv_all(a)
+
+        assert search(a, "x") == ["x"]
+        assert search(a, "밥") == ["밥먹자 오늘"]
+        assert search(a, "회의") == ["회의 세 시"]
+
+        # 같은 이름으로 다시 만든 방에서는 지운 방의 메시지가 나오면 안 된다
+        send(a, "0|DELETE_ROOM")
+        send(a, "0|CREATE_ROOM|find")
+        recv_all(a)
+        for query in ("x", "밥", "회의"):
+            hits = search(a, query)
+            assert hits == [], (query, hits)
+
+        send(a, "1|ROOM_MSG|x 다시")
+        recv_all(a)
+        assert search(a, "x") == ["x 다시"]
+
+        print("searchtest passed.")
+    finally:
+        a.close()
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
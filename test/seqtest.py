@@ -0,0 +1,154 @@
+"""
+방 메시지 번호(SEQ)와 FETCH로 빠진 메시지 채우기를 검증하는 테스트 스크립트.
+
+서버를 직접 띄운다 (127.0.0.1:5008, --history-size 5, --fanout-threshold 3).
+
+시나리오:
+1) a가 CAPS|SEQ 후 방 생성, b(번호 기능 없음) 입장
+2) b가 메시지 6개 전송 → a는 seq=1..6, b는 번호 없는 기존 형식
+3) a가 받은 줄 중 seq=3, 4를 잃어버린 것처럼 client.py 상태에 반영 →
+   FETCH|room|3|4 자동 요청, 받은 두 줄은 출력, 이미 받은 번호는 출력 안 함
+4) 보관 한도(5개)를 넘어 밀려난 번호를 FETCH → FETCH_END 개수가 적고 더 기다리지 않음
+5) 본문이 'seq=abc', 'seq=1'인 메시지 → 본문은 그대로 출력, 번호는 서버가 붙인 7, 8로 인식 (FETCH 없음)
+6) 4명이 동시에 쉬지 않고 보냄 (전달 워커 경로) → a가 받는 번호가 건너뛰거나 거꾸로 오지 않음
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import client  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 5008
+ENCODING = "utf-8"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+SENDERS = 4
+BURST = 50
+
+
+def send(sock: socket.socket, line: str):
+    sock.sendall((line + "\n").encode(ENCODING))
+
+
+def recv_all(sock: socket.socket, delay: float = 0.3):
+    """delay 동안 논블로킹으로 수신한 모든 줄을 리스트로 반환"""
+    sock.setblocking(False)
+    end_time = time.time() + delay
+    buf = b""
+    while time.time() < end_time:
+        try:
+            data = sock.recv(4096)
+            if not data:
+                break
+            buf += data
+        except BlockingIOError:
+            time.sleep(0.01)
+    return [line.strip() for line in buf.decode(ENCODING).split("\n") if line.strip()]
+
+
+def expect(log, needle, who):
+    if not any(needle in line for line in log):
+        raise AssertionError(f"[{who}] '{needle}' not found in {log}")
+
+
+def main():
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(PORT), "--history-size", "5", "--fanout-threshold", "3"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+    time.sleep(0.8)
+    a = socket.create_connection((HOST, PORT))
+    b = socket.create_connection((HOST, PORT))
+    try:
+        send(a, "0|CAPS|SEQ")
+        send(a, "0|NICK|a")
+        send(a, "0|CREATE_ROOM|seq")
+        time.sleep(0.2)
+        send(b, "0|NICK|b")
+        send(b, "0|JOIN|seq")
+        time.sleep(0.2)
+        state = {
+            "nick": None, "room": None, "subs": [], "active": None, "resume_token": None,
+            "members": {}, "outbox": [], "seq": {}, "caps": "SEQ",
+            "sock": a, "quitting": False, "lock": threading.Lock(),
+        }
+        client.update_state_batch(recv_all(a), state)
+        recv_all(b)
+
+        for i in range(1, 7):
+            send(b, f"1|ROOM_MSG|m{i}")
+        log_a, log_b = recv_all(a), recv_all(b)
+        expect(log_a, "ROOM_MSG|seq|b|m1|seq=1", "a numbered")
+        expect(log_a, "ROOM_MSG|seq|b|m6|seq=6", "a numbered")
+        assert "ROOM_MSG|seq|b|m1" in log_b, log_b  # 번호 기능을 안 켠 b는 예전 형식
+
+        # seq 3, 4가 버려진 것처럼 반영 → 빈 번호 요청
+        lost = [line for line in log_a if not line.endswith(("seq=3", "seq=4"))]
+        client.update_state_batch(lost, state)
+        assert state["seq"]["seq"]["missing"] == {3, 4}, state["seq"]
+        fetched = recv_all(a)
+        expect(fetched, "ROOM_MSG|seq|b|m3|seq=3", "gap filled")
+        expect(fetched, "FETCH_END|seq|3|4|2", "fetch end")
+        shown = client.update_state_batch(fetched + ["ROOM_MSG|seq|b|m5|seq=5"], state)
+        assert [line for line in shown if line.startswith("ROOM_MSG")] == fetched[:2], shown
+        assert not state["seq"]["seq"]["missing"], state["seq"]
+
+        # 보관은 최근 5개(2..6)뿐 → 1은 못 받고 더 기다리지 않음
+        send(a, "2|FETCH|seq|1|2")
+        evicted = recv_all(a)
+        expect(evicted, "FETCH_END|seq|1|2|1", "evicted number skipped")
+        send(a, "2|FETCH|other|1|2")
+        expect(recv_all(a), "ERROR|NOT_IN_ROOM", "fetch outside room")
+
+        # 본문이 번호 필드처럼 생겨도 떼는 것은 서버가 붙인 마지막 필드 하나뿐
+        send(b, "1|ROOM_MSG|seq=abc")
+        send(b, "1|ROOM_MSG|seq=1")
+        lookalike = recv_all(a)
+        assert lookalike == ["ROOM_MSG|seq|b|seq=abc|seq=7", "ROOM_MSG|seq|b|seq=1|seq=8"], lookalike
+        shown = client.update_state_batch(lookalike, state)
+        assert shown == lookalike, shown
+        assert state["seq"]["seq"] == {"last": 8, "missing": set()}, state["seq"]
+        assert client.format_server_line(lookalike[0], "SEQ") == "[seq] b: seq=abc"
+        assert client.format_server_line(lookalike[1], "SEQ") == "[seq] b: seq=1"
+        assert not any(line.startswith("FETCH_END") for line in recv_all(a))
+
+        # 동시에 보내도 번호 순서대로 도착해야 빈 번호 요청(FETCH)이 생기지 않는다
+        senders = [socket.create_connection((HOST, PORT)) for _ in range(SENDERS)]
+        for i, sock in enumerate(senders):
+            send(sock, f"0|NICK|s{i}")
+            send(sock, "0|JOIN|seq")
+        time.sleep(0.3)
+        recv_all(a)
+
+        def burst(sock: socket.socket, i: int):
+            sock.sendall("".join(f"1|ROOM_MSG|s{i}-{j}\n" for j in range(BURST)).encode(ENCODING))
+
+        threads = [threading.Thread(target=burst, args=(sock, i)) for i, sock in enumerate(senders)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        burst_log = recv_all(a, 1.5)
+        seqs = [int(line.rsplit("seq=", 1)[1]) for line in burst_log if line.startswith("ROOM_MSG|seq|")]
+        assert seqs == list(range(9, 9 + SENDERS * BURST)), seqs
+        for sock in senders:
+            sock.close()
+
+        print("=== a fetched ===")
+        print("\n".join(fetched + evicted))
+        print("\nseqtest passed.")
+    finally:
+        a.close()
+        b.close()
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
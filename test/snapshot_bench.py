@@ -0,0 +1,94 @@
+"""
+스냅샷 저장/복원 시간 벤치마크 (서버 없이 프로세스 안에서 실행).
+
+방 N개(기본 100,000개)와 재접속 토큰 M개를 server 모듈 전역 상태에 채운 뒤
+1) 락을 잡고 있는 시간(복사 구간)
+2) 전체 스냅샷 저장 시간과 파일 크기
+3) 빈 상태에서 복원하는 시간
+을 측정합니다.
+
+    python test/snapshot_bench.py --rooms 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import server  # noqa: E402
+
+
+class TimedLock:
+    """server.lock 대신 끼워 넣어 락 보유 시간을 잰다"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.held = 0.0
+        self._acquired_at = 0.0
+
+    def __enter__(self):
+        self.inner.acquire()
+        self._acquired_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.held += time.perf_counter() - self._acquired_at
+        self.inner.release()
+
+
+def fill_state(num_rooms: int, num_tokens: int):
+    server.rooms.clear()
+    server.room_owner.clear()
+    server.owned_rooms.clear()
+    server.resume_tokens.clear()
+    expires_at = time.time() + 3600
+    for i in range(num_rooms):
+        room = f"room_{i}"
+        server.rooms[room] = {}
+        server.set_room_owner(room, f"user_{i % (num_rooms // 2 + 1)}")
+    for i in range(num_tokens):
+        server.resume_tokens[f"token_{i:08d}"] = (f"user_{i}", f"room_{i % num_rooms}", expires_at, i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=100_000)
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fill_state(args.rooms, args.tokens)
+    path = os.path.join(tempfile.mkdtemp(prefix="npchat-snap-"), "state.snap")
+    original_lock = server.lock
+
+    for n in range(args.repeat):
+        timed = TimedLock(original_lock)
+        server.lock = timed
+        started = time.perf_counter()
+        size = server.take_snapshot(path)
+        save_ms = (time.perf_counter() - started) * 1000
+        server.lock = original_lock
+
+        server.rooms.clear()
+        server.room_owner.clear()
+        server.owned_rooms.clear()
+        server.resume_tokens.clear()
+        started = time.perf_counter()
+        restored = server.restore_snapshot(path)
+        restore_ms = (time.perf_counter() - started) * 1000
+
+        assert restored == args.rooms, (restored, args.rooms)
+        assert len(server.room_owner) == args.rooms
+        print(
+            f"run {n + 1}: rooms={args.rooms} tokens={args.tokens} size={size / 1024:.1f}KiB "
+            f"lock_held={timed.held * 1000:.2f}ms save={save_ms:.1f}ms restore={restore_ms:.1f}ms"
+        )
+
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
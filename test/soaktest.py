@@ -0,0 +1,252 @@
+"""
+장시간 돌려 메모리/스레드/상태 표가 계속 자라지 않는지 보는 soak 테스트 스크립트.
+
+서버를 직접 띄운다 (127.0.0.1:5010). 재접속 토큰 유효 시간과 빈 방 정리 주기를 초 단위로
+줄여(--resume-ttl, --room-reclaim-interval) 몇 시간 운영할 상태 변화를 몇 분에 몰아 넣는다.
+
+- 워커 --workers개가 접속 → NICK → CREATE_ROOM/JOIN/SUB/LEAVE/DELETE_ROOM/ROOM_MSG/
+  WATCH_MEMBERS를 무작위로 몇 묶음 보내고 → QUIT 또는 그냥 끊기(재접속 토큰이 남음)를 반복
+- 관리자 연결이 --sample초마다 2|STATS|state 로 RSS, 스레드 수, rooms/room_owner/
+  clients_by_* 등 표 크기를 기록
+- 판정 1 (증가): 처음 1/4(워밍업)을 뺀 구간의 앞 1/3 평균보다 뒤 1/3 평균이 허용치 이상 크면 실패
+- 판정 2 (회수): 워커를 멈추고 토큰 만료 + 정리 주기가 지난 뒤 방/토큰/연결 표가 비고
+  스레드 수가 시작할 때 수준으로 돌아와야 함
+
+    python test/soaktest.py                     # 60초
+    python test/soaktest.py --duration 7200     # 2시간
+"""
+
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+HOST = "127.0.0.1"
+PORT = 5010
+ENCODING = "utf-8"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+ADMIN = "soak"
+
+RESUME_TTL = 2.0        # 실제 기본값 60초
+RECLAIM_INTERVAL = 0.5  # 실제 기본값 30초
+
+# 판정에 쓰는 항목: 표 크기는 동시 접속 수에 비례해 흔들리므로 워커 수 기준 여유를 준다
+TABLES = ("rooms", "room_owner", "owned_rooms", "room_seq", "room_order", "clients_by_sock", "clients_by_nick",
+          "resume_tokens", "member_watch_rooms", "history_rooms")
+COLUMNS = ("rss_kb", "threads", "rooms", "room_owner", "clients_by_sock", "clients_by_nick",
+           "resume_tokens", "history_rooms")
+
+
+def send(sock: socket.socket, line: str):
+    sock.sendall((line + "\n").encode(ENCODING))
+
+
+def read_until(sock: socket.socket, prefix: str, buf: bytearray, timeout: float = 5.0) -> list[str]:
+    """prefix로 시작하는 줄까지 읽어 그 사이 줄 목록 반환 (남은 바이트는 buf에)"""
+    lines = []
+    deadline = time.monotonic() + timeout
+    while True:
+        while b"\n" in buf:
+            raw, _, rest = bytes(buf).partition(b"\n")
+            buf[:] = rest
+            line = raw.decode(ENCODING, "replace").strip()
+            lines.append(line)
+            if line.startswith(prefix):
+                return lines
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"no '{prefix}' within {timeout}s")
+        sock.settimeout(left)
+        data = sock.recv(65536)
+        if not data:
+            raise ConnectionError("server closed connection")
+        buf += data
+
+
+class Churn:
+    """워커 스레드들이 공유하는 상태 (만든 방 이름, 카운터)"""
+
+    def __init__(self, actions: int, rounds: int):
+        self.actions = actions
+        self.rounds = rounds
+        self.stop = threading.Event()
+        self.known_rooms: deque[str] = deque(maxlen=256)
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.commands = 0
+        self.failures = 0
+
+    def pick_room(self) -> str | None:
+        with self.lock:
+            return random.choice(self.known_rooms) if self.known_rooms else None
+
+    def batch(self, worker: int, session: int, round_: int) -> list[str]:
+        lines = []
+        for j in range(random.randint(1, self.actions)):
+            roll = random.random()
+            room = self.pick_room()
+            if roll < 0.2 or room is None:
+                name = f"r{worker}_{session}_{round_}_{j}"
+                with self.lock:
+                    self.known_rooms.append(name)
+                lines.append(f"0|CREATE_ROOM|{name}")
+            elif roll < 0.4:
+                lines.append(f"0|JOIN|{room}")
+            elif roll < 0.5:
+                lines.append(f"0|SUB|{room}")
+            elif roll < 0.65:
+                lines.append("0|LEAVE")
+            elif roll < 0.75:
+                lines.append("0|DELETE_ROOM")
+            elif roll < 0.95:
+                lines.append(f"1|ROOM_MSG|soak {worker}-{session}-{j}")
+            else:
+                lines.append(f"2|WATCH_MEMBERS|{room}")
+        # 모든 명령에 응답이 오지는 않으므로 CAPS 응답을 묶음 끝 표시로 쓴다
+        lines.append("0|CAPS|SEQ")
+        return lines
+
+    def run_worker(self, worker: int):
+        session = 0
+        while not self.stop.is_set():
+            session += 1
+            try:
+                sock = socket.create_connection((HOST, PORT), timeout=5.0)
+            except OSError:
+                with self.lock:
+                    self.failures += 1
+                time.sleep(0.1)
+                continue
+            buf = bytearray()
+            try:
+                send(sock, f"0|NICK|w{worker}_{session}")
+                for round_ in range(random.randint(1, self.rounds)):
+                    lines = self.batch(worker, session, round_)
+                    sock.sendall("".join(line + "\n" for line in lines).encode(ENCODING))
+                    read_until(sock, "CAPS_OK", buf)
+                    with self.lock:
+                        self.commands += len(lines)
+                if random.random() < 0.5:
+                    send(sock, "0|QUIT")
+                    read_until(sock, "SYSTEM|INFO|Bye", buf)
+                # 나머지 절반은 그냥 끊어서 재접속 토큰을 남긴다
+            except (OSError, TimeoutError, ConnectionError):
+                with self.lock:
+                    self.failures += 1
+            finally:
+                sock.close()
+            with self.lock:
+                self.sessions += 1
+
+
+def read_state(sock: socket.socket, buf: bytearray) -> dict[str, int]:
+    send(sock, "2|STATS|state")
+    values = {}
+    for line in read_until(sock, "STATS_END|state", buf):
+        parts = line.split("|")
+        if len(parts) == 4 and parts[0] == "STATS" and parts[3].isdigit():
+            values[parts[2]] = int(parts[3])
+    return values
+
+
+def mean(values: list[int]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def check_growth(samples: list[dict[str, int]], workers: int, rss_slack_kb: int) -> list[str]:
+    """워밍업 이후 앞 1/3 평균 대비 뒤 1/3 평균이 허용치를 넘게 늘어난 항목 목록"""
+    steady = samples[len(samples) // 4:]
+    third = len(steady) // 3
+    if third == 0:
+        return []
+    head, tail = steady[:third], steady[-third:]
+    allowances = {key: workers * 4 for key in TABLES}
+    allowances["threads"] = workers * 2 + 4
+    allowances["rss_kb"] = rss_slack_kb
+    problems = []
+    for key, slack in allowances.items():
+        before = mean([s.get(key, 0) for s in head])
+        after = mean([s.get(key, 0) for s in tail])
+        if after > before * 1.2 + slack:
+            problems.append(f"{key}: {before:.0f} -> {after:.0f}")
+    return problems
+
+
+def print_sample(elapsed: float, churn: Churn, values: dict[str, int]):
+    cols = "  ".join(f"{key}={values.get(key, 0)}" for key in COLUMNS)
+    print(f"[{elapsed:7.1f}s] sessions={churn.sessions} {cols}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=60.0, help="부하를 거는 시간 (초)")
+    parser.add_argument("--workers", type=int, default=16, help="동시에 접속/해제를 반복하는 연결 수")
+    parser.add_argument("--actions", type=int, default=8, help="한 묶음 최대 명령 수")
+    parser.add_argument("--rounds", type=int, default=3, help="연결당 최대 묶음 수")
+    parser.add_argument("--sample", type=float, default=2.0, help="STATS|state 조회 주기 (초)")
+    parser.add_argument("--rss-slack-mb", type=float, default=16.0, help="RSS 증가 허용치 (MB)")
+    args = parser.parse_args()
+
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(PORT), "--admin", ADMIN,
+         "--resume-ttl", str(RESUME_TTL), "--room-reclaim-interval", str(RECLAIM_INTERVAL),
+         "--member-window", "0.05", "--presence-window", "0.2"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+    time.sleep(0.8)
+    admin = socket.create_connection((HOST, PORT))
+    admin_buf = bytearray()
+    churn = Churn(args.actions, args.rounds)
+    workers = [threading.Thread(target=churn.run_worker, args=(i,), daemon=True) for i in range(args.workers)]
+    try:
+        send(admin, f"0|NICK|{ADMIN}")
+        read_until(admin, "NICK_OK", admin_buf)
+        baseline = read_state(admin, admin_buf)
+        print_sample(0.0, churn, baseline)
+
+        started = time.monotonic()
+        for t in workers:
+            t.start()
+        samples = []
+        while time.monotonic() - started < args.duration:
+            time.sleep(args.sample)
+            values = read_state(admin, admin_buf)
+            samples.append(values)
+            print_sample(time.monotonic() - started, churn, values)
+        churn.stop.set()
+        for t in workers:
+            t.join(timeout=10)
+
+        # 남은 토큰이 만료되고 정리 주기가 두 번 돌 때까지 기다린다
+        time.sleep(RESUME_TTL + RECLAIM_INTERVAL * 4)
+        final = read_state(admin, admin_buf)
+        print_sample(time.monotonic() - started, churn, final)
+        print(f"\nsessions={churn.sessions} commands={churn.commands} failures={churn.failures}")
+
+        problems = check_growth(samples, args.workers, int(args.rss_slack_mb * 1024))
+        for key in TABLES:
+            # 관리자 연결 하나만 남아야 한다
+            expected = 1 if key in ("clients_by_sock", "clients_by_nick") else 0
+            if final.get(key, 0) != expected:
+                problems.append(f"{key} not reclaimed after churn: {final.get(key, 0)} (expected {expected})")
+        if final.get("threads", 0) > baseline.get("threads", 0) + 2:
+            problems.append(f"threads not reclaimed: {baseline.get('threads')} -> {final.get('threads')}")
+        if churn.failures > churn.sessions // 100:
+            problems.append(f"too many failed sessions: {churn.failures}/{churn.sessions}")
+        if problems:
+            raise AssertionError("unbounded growth:\n  " + "\n  ".join(problems))
+        print("soaktest passed.")
+    finally:
+        churn.stop.set()
+        admin.close()
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+소켓 옵션 프로파일 비교 스크립트 (localhost).
+
+프로파일마다 서버를 직접 띄우고 (127.0.0.1:5009, --socket-profile), 같은 프로파일을 쓰는
+client.BotPool로 방 --rooms개에 --room-size명씩 넣어 --msg-size 바이트 메시지를 보낸다.
+방마다 BotPool 하나를 스레드로 돌리고, 방 생성용 연결은 방장으로 남아 받은 줄을 버린다.
+
+- delivered/s : 모든 봇이 받은 ROOM_MSG 줄 수 / 걸린 시간
+- p50/p99     : 보낸 ROOM_MSG가 자기에게 돌아오기까지 (BotPool 응답 지연, log2 버킷 상한)
+
+기본은 이름 있는 프로파일 (default, latency, throughput, mobile)이고, --grid를 주면
+sndbuf/rcvbuf x nodelay x recv_size 조합도 돌린다. 마지막에 처리량과 p99가 가장 좋은
+설정을 알려 준다. 로컬 루프백이라 실제 망과 수치는 다르고, 방 크기/메시지 크기 조합별
+상대 비교용이다.
+
+    python test/sockopt_sweep.py --rooms 4 --room-size 20 --msg-size 512
+    python test/sockopt_sweep.py --grid --messages 100
+"""
+
+import argparse
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import client  # noqa: E402
+import sockopts  # noqa: E402
+from metrics import Histogram  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 5009
+ENCODING = "utf-8"
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+
+GRID_BUFFERS = (0, 64 << 10, 1 << 20)
+GRID_RECV = (1024, 1 << 16)
+
+
+def grid_specs() -> list[str]:
+    specs = []
+    for buf, nodelay, recv in itertools.product(GRID_BUFFERS, (0, 1), GRID_RECV):
+        specs.append(f"sndbuf={buf},rcvbuf={buf},nodelay={nodelay},recv_size={recv}")
+    return specs
+
+
+def start_server(spec: str, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(port), "--socket-profile", spec],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+def discard(sock: socket.socket):
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+
+
+def run_profile(spec: str, args) -> dict:
+    profile = sockopts.parse_profile(spec)
+    proc = start_server(spec, args.port)
+    owners = []
+    try:
+        for r in range(args.rooms):
+            sock = sockopts.connect((HOST, args.port), profile)
+            sock.sendall(f"0|NICK|owner{r}\n0|CREATE_ROOM|sweep{r}\n".encode(ENCODING))
+            owners.append(sock)
+            threading.Thread(target=discard, args=(sock,), daemon=True).start()
+        time.sleep(0.2)
+
+        delivered = [0]
+        count_lock = threading.Lock()
+
+        def on_line(conn, line):
+            if line.startswith("ROOM_MSG|"):
+                with count_lock:
+                    delivered[0] += 1
+
+        body = "x" * args.msg_size
+        pools = []
+        for r in range(args.rooms):
+            script = [f"0|NICK|s{r}_{{i}}", f"0|JOIN|sweep{r}"] + [f"1|ROOM_MSG|{body}"] * args.messages
+            pool = client.BotPool(HOST, args.port, script, args.rate, on_line=on_line, profile=profile)
+            pool.connect(args.room_size)
+            pools.append(pool)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=pool.run) for pool in pools]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        latency = Histogram()
+        for pool in pools:
+            hist = pool.latency.get("1|ROOM_MSG")
+            if hist is None:
+                continue
+            # 같은 버킷 구조이므로 합쳐서 분위수를 낸다
+            for idx, n in enumerate(hist.buckets):
+                latency.buckets[idx] += n
+            latency.count += hist.count
+            latency.total_us += hist.total_us
+            latency.max_us = max(latency.max_us, hist.max_us)
+        return {
+            "spec": spec,
+            "profile": sockopts.describe(profile),
+            "delivered": delivered[0],
+            "rate": delivered[0] / elapsed if elapsed else 0.0,
+            "p50": latency.percentile(50) / 1000,
+            "p99": latency.percentile(99) / 1000,
+            "errors": sum(pool.errors for pool in pools),
+        }
+    finally:
+        for sock in owners:
+            sock.close()
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--profiles", default=",".join(sockopts.PROFILES),
+                        help="돌려 볼 프로파일 이름 (콤마 구분)")
+    parser.add_argument("--spec", action="append", default=[],
+                        help="추가로 돌려 볼 --socket-profile 값 (여러 번 줄 수 있음)")
+    parser.add_argument("--grid", action="store_true", help="sndbuf/rcvbuf x nodelay x recv_size 조합도 돌림")
+    parser.add_argument("--rooms", type=int, default=4)
+    parser.add_argument("--room-size", type=int, default=10, help="방마다 봇 수")
+    parser.add_argument("--msg-size", type=int, default=64, help="ROOM_MSG 본문 바이트")
+    parser.add_argument("--messages", type=int, default=200, help="봇마다 보내는 메시지 수")
+    parser.add_argument("--rate", type=float, default=50.0, help="봇마다 초당 명령 수 (0이면 최대 속도)")
+    args = parser.parse_args()
+
+    specs = [name for name in args.profiles.split(",") if name] + args.spec
+    if args.grid:
+        specs += grid_specs()
+
+    print(f"rooms={args.rooms} room_size={args.room_size} msg_size={args.msg_size} "
+          f"messages={args.messages} rate={args.rate}")
+    results = []
+    for spec in specs:
+        result = run_profile(spec, args)
+        results.append(result)
+        print(f"{spec:60s} delivered/s={result['rate']:9.0f}  p50={result['p50']:7.2f}ms  "
+              f"p99={result['p99']:7.2f}ms  errors={result['errors']}")
+
+    best_rate = max(results, key=lambda r: r["rate"])
+    best_p99 = min(results, key=lambda r: (r["p99"], -r["rate"]))
+    print(f"\nbest throughput: {best_rate['spec']} ({best_rate['rate']:.0f} lines/s)"
+          f"  -> --socket-profile {best_rate['profile']}")
+    print(f"best p99       : {best_p99['spec']} ({best_p99['p99']:.2f}ms)"
+          f"  -> --socket-profile {best_p99['profile']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# wordfilter.py
+"""
+금칙어 마스킹 필터 (Aho-Corasick)
+
+금칙어 수천 개를 메시지마다 하나씩 `in`으로 찾으면 O(단어 수 x 길이)이다.
+단어 목록으로 오토마톤을 한 번 만들어 두면 메시지 길이에 비례하는 시간에
+모든 금칙어 위치를 찾을 수 있다. 찾은 구간은 '*'로 가린다.
+
+WordFilter는 파일에서 목록을 읽어 오토마톤을 만들고, reload() 시 새 오토마톤을
+백그라운드에서 만든 뒤 참조만 바꿔 끼우므로 필터링이 멈추지 않는다.
+"""
+
+import threading
+from collections import deque
+
+MASK_CHAR = "*"
+
+
+class AhoCorasick:
+    """금칙어 목록으로 만든 불변 오토마톤 (여러 스레드에서 동시에 읽어도 안전)"""
+
+    def __init__(self, words):
+        # 노드 i: goto[i] = {문자: 다음 노드}, fail[i] = 실패 링크,
+        # out[i] = 이 노드에서 끝나는 금칙어 중 가장 긴 길이 (실패 링크 쪽 포함)
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.out: list[int] = [0]
+        self.size = 0
+        for word in words:
+            self._add(word.lower())
+        self._build()
+
+    def _add(self, word: str):
+        if not word:
+            return
+        node = 0
+        for ch in word:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(0)
+            node = nxt
+        if len(word) > self.out[node]:
+            self.out[node] = len(word)
+        self.size += 1
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                if self.out[self.fail[nxt]] > self.out[nxt]:
+                    self.out[nxt] = self.out[self.fail[nxt]]
+
+    def mask(self, text: str) -> str:
+        """금칙어 구간을 MASK_CHAR로 바꾼 문자열 (없으면 원문 그대로)"""
+        if self.size == 0:
+            return text
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # 소문자 변환으로 길이가 바뀌는 특수 문자가 있으면 원문 기준으로 찾는다
+            lowered = text
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        spans = None
+        for i, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            length = out[node]
+            if length:
+                if spans is None:
+                    spans = []
+                spans.append((i + 1 - length, i + 1))
+        if spans is None:
+            return text
+        chars = list(text)
+        for start, end in spans:
+            for j in range(start, end):
+                chars[j] = MASK_CHAR
+        return "".join(chars)
+
+
+def load_words(path: str) -> list[str]:
+    """한 줄에 하나씩, 빈 줄과 '#' 주석은 무시"""
+    with open(path, encoding="utf-8") as f:
+        return [w.strip() for w in f if w.strip() and not w.lstrip().startswith("#")]
+
+
+class WordFilter:
+    """파일 기반 금칙어 필터. 메시지 필터 파이프라인에 함수처럼 끼워 쓴다"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.automaton = AhoCorasick(load_words(path))
+        self._reload_lock = threading.Lock()
+
+    def __call__(self, text: str) -> str:
+        return self.automaton.mask(text)
+
+    def reload(self) -> int:
+        """목록을 다시 읽어 새 오토마톤으로 교체하고 단어 수를 반환"""
+        with self._reload_lock:
+            automaton = AhoCorasick(load_words(self.path))
+            # 참조 대입은 원자적이라 필터링 중인 스레드는 이전/새 오토마톤 중 하나를 끝까지 쓴다
+            self.automaton = automaton
+            return automaton.size
+
+    def reload_async(self, done=None):
+        """백그라운드 스레드에서 reload (done(단어 수 또는 예외) 콜백)"""
+        def run():
+            try:
+                result = self.reload()
+            except Exception as e:
+                result = e
+            if done is not None:
+                done(result)
+        threading.Thread(target=run, name="wordfilter-reload", daemon=True).start()